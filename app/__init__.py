@@ -1,11 +1,5 @@
-from flask import Flask, session
+from flask import Flask
 from pymongo import MongoClient
-from pymongo.collection import Collection
-from flask_session import Session
-from flask_session.sessions import MongoDBSessionInterface, want_bytes
-import types
-import os
-from datetime import datetime, timedelta, timezone
 
 
 # Global MongoDB client
@@ -27,117 +21,28 @@ def create_app(config_name='default'):
     # Load configuration
     from config import config
     app.config.from_object(config[config_name])
-
-    # Compatibility patch: pymongo 4 removed Collection.update used by Flask-Session
-    if not hasattr(Collection, 'update'):
-        def _legacy_update(self, spec, document, upsert=False, multi=False, **kwargs):
-            # Flask-Session on PyMongo 4 passes full replacement docs (no $ operators)
-            # If the doc contains $ operators, delegate to update_one/update_many
-            has_operator = any(key.startswith('$') for key in document.keys())
-
-            if has_operator:
-                if multi:
-                    return self.update_many(spec, document, upsert=upsert, **kwargs)
-                return self.update_one(spec, document, upsert=upsert, **kwargs)
-
-            # Replacement-style: use replace_one with upsert to match legacy behavior
-            return self.replace_one(spec, document, upsert=upsert, **kwargs)
-
-        Collection.update = _legacy_update
     
+    # Take client addresses from trusted reverse proxies
+    if app.config['TRUSTED_PROXY_COUNT']:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        count = app.config['TRUSTED_PROXY_COUNT']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=count, x_proto=count)
+
     # Initialize MongoDB
     init_db(app)
     
-    # Initialize Flask-Session
-    app.config['SESSION_MONGODB'] = mongo_client
-    app.config['SESSION_MONGODB_DB'] = app.config['DB_NAME']
-    app.config['SESSION_MONGODB_COLLECTION'] = 'sessions'
-    Session(app)
-
-    # Patch MongoDBSessionInterface to ensure cookie value is str (not bytes)
-    if isinstance(app.session_interface, MongoDBSessionInterface):
-        original_save = app.session_interface.save_session
-
-        def _patched_save_session(self, app_ctx, session_obj, response):
-            domain = self.get_cookie_domain(app_ctx)
-            path = self.get_cookie_path(app_ctx)
-            store_id = self.key_prefix + session_obj.sid
-            if not session_obj:
-                if session_obj.modified:
-                    self.store.remove({'id': store_id})
-                    response.delete_cookie(app_ctx.config["SESSION_COOKIE_NAME"],
-                                           domain=domain, path=path)
-                return
-
-            conditional_cookie_kwargs = {}
-            httponly = self.get_cookie_httponly(app_ctx)
-            secure = self.get_cookie_secure(app_ctx)
-            if hasattr(self, "get_cookie_samesite"):
-                conditional_cookie_kwargs["samesite"] = self.get_cookie_samesite(app_ctx)
-            expires = self.get_expiration_time(app_ctx, session_obj)
-            val = self.serializer.dumps(dict(session_obj))
-            self.store.update({'id': store_id},
-                              {'id': store_id,
-                               'val': val,
-                               'expiration': expires}, True)
-            if self.use_signer:
-                session_id = self._get_signer(app_ctx).sign(want_bytes(session_obj.sid))
-                if isinstance(session_id, bytes):
-                    session_id = session_id.decode()
-            else:
-                session_id = session_obj.sid
-            response.set_cookie(app_ctx.config["SESSION_COOKIE_NAME"], session_id,
-                                expires=expires, httponly=httponly,
-                                domain=domain, path=path, secure=secure,
-                                **conditional_cookie_kwargs)
-
-        app.session_interface.save_session = types.MethodType(_patched_save_session, app.session_interface)
-
-        # Also patch open_session to handle None expiration values
-        original_open = app.session_interface.open_session
-
-        def _patched_open_session(self, app_ctx, request):
-            s_id = request.cookies.get(app_ctx.config["SESSION_COOKIE_NAME"])
-            if not s_id:
-                s_id = self._generate_sid()
-                return self.session_class(sid=s_id, permanent=self.permanent)
-            if self.use_signer:
-                signer = self._get_signer(app_ctx)
-                try:
-                    s_id = signer.unsign(want_bytes(s_id))
-                    # Ensure s_id is a string, not bytes
-                    if isinstance(s_id, bytes):
-                        s_id = s_id.decode('utf-8')
-                except Exception:
-                    s_id = self._generate_sid()
-                    return self.session_class(sid=s_id, permanent=self.permanent)
-            
-            # Ensure s_id is string before concatenation
-            if isinstance(s_id, bytes):
-                s_id = s_id.decode('utf-8')
-            
-            store_id = self.key_prefix + s_id
-            document = self.store.find_one({"id": store_id})
-            
-            # CRITICAL FIX: Check if document exists AND has a non-None expiration before comparing
-            if document:
-                expiration = document.get("expiration")
-                # If expiration is None or is in the past, delete the session
-                # MongoDB stores naive UTC datetimes, so compare with naive datetime
-                if expiration is None or expiration <= datetime.utcnow():
-                    self.store.delete_one({"id": store_id})
-                    s_id = self._generate_sid()
-                    return self.session_class(sid=s_id, permanent=self.permanent)
-                
-                val = document.get("val")
-                data = self.serializer.loads(want_bytes(val))
-                return self.session_class(data, sid=s_id)
-            
-            # No document found, create new session
-            s_id = self._generate_sid()
-            return self.session_class(sid=s_id, permanent=self.permanent)
-
-        app.session_interface.open_session = types.MethodType(_patched_open_session, app.session_interface)
+    # Resolve fingerprinted static assets
+    from app.utils.assets import init_assets
+    init_assets(app)
+    
+    # Size process-local caches
+    init_caches(app)
+    
+    # Configure password hashing
+    init_passwords(app)
+    
+    # Initialize sessions
+    init_sessions(app)
     
     # Register blueprints
     register_blueprints(app)
@@ -145,15 +50,16 @@ def create_app(config_name='default'):
     # Register error handlers
     register_error_handlers(app)
     
+    # Register CLI commands
+    from app.cli import register_commands
+    register_commands(app)
+    
     # Context processors
     @app.context_processor
     def inject_user():
         """Make current user available in all templates"""
-        from flask import session as flask_session
-        from app.models.user import User
-        user_id = flask_session.get('user_id') if flask_session else None
-        user = User.get_by_id(user_id) if user_id else None
-        return {'current_user': user}
+        from app.utils.auth import get_current_user
+        return {'current_user': get_current_user()}
     
     @app.context_processor
     def inject_company():
@@ -170,21 +76,89 @@ def create_app(config_name='default'):
 
 
 def init_db(app):
-    """Initialize MongoDB connection"""
+    """Initialize MongoDB connection
+    
+    Indexes are declared on the models and reconciled at deploy time with
+    `flask db ensure-indexes`; set ENSURE_INDEXES_ON_STARTUP to do it here.
+    """
     global mongo_client, db
-    mongo_client = MongoClient(app.config['MONGO_URI'])
+    
+    event_listeners = []
+    if app.config['QUERY_PLAN_CHECK']:
+        from app.utils.query_plans import query_recorder
+        event_listeners.append(query_recorder)
+    if app.config['DB_METRICS']:
+        from app.utils.query_metrics import query_metrics
+        event_listeners.append(query_metrics)
+    
+    mongo_client = MongoClient(app.config['MONGO_URI'], event_listeners=event_listeners)
     db = mongo_client[app.config['DB_NAME']]
     
-    # Create indexes
-    db.users.create_index('email', unique=True)
-    db.clients.create_index('company_name')
-    db.invoices.create_index('invoice_no', unique=True)
-    db.invoices.create_index('client_id')
-    db.products.create_index('name')
+    if app.config['ENSURE_INDEXES_ON_STARTUP']:
+        from app.utils.indexes import ensure_indexes
+        ensure_indexes(app, db)
+    
+    if app.config['QUERY_PLAN_CHECK']:
+        from app.utils.query_plans import init_query_plan_check
+        init_query_plan_check(app, mongo_client)
+    
+    if app.config['DB_METRICS']:
+        # Registered last so its after_request runs before the plan check's explains
+        from app.utils.query_metrics import init_query_metrics
+        init_query_metrics(app)
     
     app.db = db
 
 
+def init_sessions(app):
+    """Install the configured session backend
+    
+    SESSION_TYPE 'mongodb' stores sessions server-side; 'cookie' keeps
+    Flask's signed, stateless cookie sessions (no database access).
+    """
+    if app.config['SESSION_TYPE'] == 'cookie':
+        return
+    
+    from app.utils.sessions import MongoSessionInterface
+    interface = MongoSessionInterface(
+        db[app.config['SESSION_MONGODB_COLLECTION']],
+        key_prefix=app.config['SESSION_KEY_PREFIX'],
+        use_signer=app.config['SESSION_USE_SIGNER'],
+        permanent=app.config['SESSION_PERMANENT'],
+        refresh_after=app.config['SESSION_REFRESH_AFTER'],
+        cache_size=app.config['SESSION_CACHE_SIZE'],
+        cache_ttl=app.config['SESSION_CACHE_TTL']
+    )
+    app.session_interface = interface
+
+
+def init_caches(app):
+    """Configure process-local model caches"""
+    from app.models.user import User
+    from app.models.product import Product
+    from app.models.coupon import Coupon
+    from app.utils.page_cache import page_cache, content_version
+    
+    User.cache.configure(maxsize=app.config['USER_CACHE_SIZE'],
+                         ttl=app.config['USER_CACHE_TTL'])
+    Product.cache.configure(maxsize=app.config['PRODUCT_CACHE_SIZE'],
+                            ttl=app.config['PRODUCT_CACHE_TTL'])
+    Coupon.cache.configure(maxsize=app.config['COUPON_CACHE_SIZE'],
+                           ttl=app.config['COUPON_CACHE_TTL'])
+    page_cache.configure(maxsize=app.config['PUBLIC_PAGE_CACHE_SIZE'],
+                         ttl=app.config['PUBLIC_PAGE_CACHE_TTL'],
+                         version=content_version(app))
+
+
+def init_passwords(app):
+    """Configure bcrypt cost and the password hashing pool"""
+    from app.utils.passwords import password_hasher
+    
+    password_hasher.configure(rounds=app.config['BCRYPT_ROUNDS'],
+                              workers=app.config['PASSWORD_HASH_WORKERS'],
+                              max_pending=app.config['PASSWORD_HASH_MAX_PENDING'])
+
+
 def register_blueprints(app):
     """Register all blueprints"""
     from app.routes.public import public_bp
@@ -193,6 +167,7 @@ def register_blueprints(app):
     from app.routes.invoices import invoices_bp
     from app.routes.clients import clients_bp
     from app.routes.products import products_bp
+    from app.routes.reports import reports_bp
     
     app.register_blueprint(public_bp)
     app.register_blueprint(auth_bp)
@@ -200,6 +175,7 @@ def register_blueprints(app):
     app.register_blueprint(invoices_bp, url_prefix='/invoices')
     app.register_blueprint(clients_bp, url_prefix='/clients')
     app.register_blueprint(products_bp, url_prefix='/products')
+    app.register_blueprint(reports_bp, url_prefix='/reports')
 
 
 def register_error_handlers(app):
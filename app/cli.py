@@ -0,0 +1,145 @@
+import click
+from flask.cli import AppGroup
+
+
+invoices_cli = AppGroup('invoices', help='Invoice maintenance commands.')
+db_cli = AppGroup('db', help='Database maintenance commands.')
+assets_cli = AppGroup('assets', help='Front-end asset commands.')
+
+
+@invoices_cli.command('bulk-create')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--issue', is_flag=True, help='Issue invoices instead of creating drafts.')
+@click.option('--workers', type=int, default=None, help='Insert threads (default BULK_INVOICE_WORKERS).')
+@click.option('--chunk-size', type=int, default=None, help='Invoices per insert_many (default BULK_INVOICE_CHUNK_SIZE).')
+def bulk_create(path, issue, workers, chunk_size):
+    """Create invoices from a CSV or JSON batch file"""
+    from app.services.bulk_invoice_service import BulkInvoiceService
+    
+    with open(path, encoding='utf-8-sig') as f:
+        content = f.read()
+    
+    try:
+        if path.lower().endswith('.csv'):
+            records = BulkInvoiceService.parse_csv(content)
+        else:
+            records = BulkInvoiceService.parse_json(content)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    
+    with click.progressbar(length=len(records), label='Creating invoices') as bar:
+        result = BulkInvoiceService.run(records, issue=issue, workers=workers,
+                                        chunk_size=chunk_size, progress=bar.update)
+    
+    click.echo(f"Created {result['succeeded']} of {result['total']} invoices")
+    for error in result['errors']:
+        click.echo(f"  {error['ref']} (row {error['row']}): {error['error']}", err=True)
+
+
+@invoices_cli.command('prune-pdf-cache')
+@click.option('--days', type=int, default=None, help='Keep PDFs served within this many days (default PDF_CACHE_MAX_AGE_DAYS).')
+def prune_pdf_cache(days):
+    """Delete cached invoice PDFs that have not been served recently"""
+    from app.services.pdf_service import PdfService
+    
+    click.echo(f'Deleted {PdfService.prune_cache(days)} cached PDFs')
+
+
+@db_cli.command('ensure-indexes')
+@click.option('--prune', is_flag=True, help='Drop indexes that no model declares.')
+@click.option('--dry-run', is_flag=True, help='Only show what would change.')
+def ensure_indexes(prune, dry_run):
+    """Create, rebuild or drop indexes to match the model declarations"""
+    from flask import current_app
+    from app import get_db
+    from app.utils.indexes import ensure_indexes as reconcile
+    
+    actions = reconcile(current_app, get_db(), prune=prune, dry_run=dry_run)
+    changed = [a for a in actions if a['action'] != 'ok']
+    for action in changed:
+        click.echo(f"{action['action']:>10}  {action['collection']}.{action['name']}")
+    if any(a['action'] == 'undeclared' for a in changed):
+        click.echo('Undeclared indexes are kept; pass --prune to drop them.')
+    verb = 'would change' if dry_run else 'changed'
+    click.echo(f"{len(changed)} {verb}, {len(actions) - len(changed)} up to date")
+
+
+@db_cli.command('reindex-search')
+def reindex_search():
+    """Rebuild client and product search keys (after changing search rules)"""
+    from app.models.client import Client
+    from app.models.product import Product
+    
+    click.echo(f'Reindexed {Client.reindex_search()} clients')
+    click.echo(f'Reindexed {Product.reindex_search()} products')
+
+
+@db_cli.command('migrate-coupon-redemptions')
+def migrate_coupon_redemptions():
+    """Move coupons' embedded used_by lists into the coupon_redemptions ledger"""
+    from app.models.coupon import Coupon
+    
+    coupons, added = Coupon.migrate_redemptions()
+    click.echo(f'Migrated {coupons} coupons ({added} redemptions added)')
+
+
+@db_cli.command('seed')
+@click.option('--size', type=click.Choice(['1k', '100k', '1m']), default='1k', show_default=True,
+              help='Dataset preset.')
+@click.option('--clients', type=int, default=None, help='Override the preset client count.')
+@click.option('--products', type=int, default=None, help='Override the preset product count.')
+@click.option('--invoices', type=int, default=None, help='Override the preset invoice count.')
+@click.option('--users', type=int, default=20, show_default=True,
+              help='Largest clients given a login (client<N>@seed.test).')
+@click.option('--password', default='seed-password', show_default=True, help='Password of seeded logins.')
+@click.option('--seed', 'random_seed', type=int, default=42, show_default=True, help='Random seed.')
+@click.option('--workers', type=int, default=8, show_default=True, help='Invoice creation threads.')
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation.')
+def seed(size, clients, products, invoices, users, password, random_seed, workers, yes):
+    """Fill the database with a synthetic dataset for load testing"""
+    from flask import current_app
+    from app.services.seed_service import SeedService
+    
+    counts = dict(SeedService.SIZES[size])
+    for key, value in (('clients', clients), ('products', products), ('invoices', invoices)):
+        if value is not None:
+            counts[key] = value
+    
+    if not yes:
+        click.confirm(
+            f"Add {counts['invoices']} invoices, {counts['clients']} clients and "
+            f"{counts['products']} products to database {current_app.config['DB_NAME']}?",
+            abort=True
+        )
+    
+    with click.progressbar(length=counts['invoices'], label='Creating invoices') as bar:
+        created = SeedService.run(users=users, password=password, seed=random_seed,
+                                  workers=workers, progress=bar.update, **counts)
+    
+    click.echo(', '.join(f'{count} {name}' for name, count in created.items()))
+    click.echo(f'Log in as {SeedService.OWNER_EMAIL} or {SeedService.client_email(0)} '
+               f'with password {password!r}')
+
+
+@assets_cli.command('build')
+def build_assets():
+    """Build the purged, minified, fingerprinted CSS bundle and its fonts"""
+    from flask import current_app
+    from app.utils.assets import AssetBuildError, build_assets as build
+    
+    try:
+        result = build(current_app)
+    except AssetBuildError as e:
+        raise click.ClickException(str(e))
+    for name, path in sorted(result['manifest'].items()):
+        click.echo(f'{name:>40}  {path}')
+    click.echo(f"{result['icons']} icons kept")
+    if not result['subsetted']:
+        click.echo('fontTools/brotli not installed; fonts were copied without subsetting', err=True)
+
+
+def register_commands(app):
+    """Register CLI command groups"""
+    app.cli.add_command(invoices_cli)
+    app.cli.add_command(db_cli)
+    app.cli.add_command(assets_cli)
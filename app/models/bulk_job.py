@@ -0,0 +1,82 @@
+from datetime import datetime, timezone
+from bson import ObjectId
+from app import get_db
+
+
+class BulkJob:
+    """Progress record for a background bulk operation"""
+    
+    STATUS_PENDING = 'PENDING'
+    STATUS_RUNNING = 'RUNNING'
+    STATUS_COMPLETED = 'COMPLETED'
+    STATUS_FAILED = 'FAILED'
+    
+    # Per-row errors kept on the job document
+    MAX_ERRORS = 1000
+    
+    @staticmethod
+    def create(kind, total, created_by=None):
+        """Create new job"""
+        job_data = {
+            'kind': kind,
+            'status': BulkJob.STATUS_PENDING,
+            'total': total,
+            'processed': 0,
+            'succeeded': 0,
+            'failed': 0,
+            'errors': [],
+            'result': None,
+            'created_by': created_by,
+            'created_at': datetime.now(timezone.utc),
+            'started_at': None,
+            'finished_at': None
+        }
+        
+        db = get_db()
+        result = db.bulk_jobs.insert_one(job_data)
+        return str(result.inserted_id)
+    
+    @staticmethod
+    def get_by_id(job_id):
+        """Get job by ID"""
+        if not job_id:
+            return None
+        try:
+            db = get_db()
+            return db.bulk_jobs.find_one({'_id': ObjectId(job_id)})
+        except:
+            return None
+    
+    @staticmethod
+    def start(job_id):
+        """Mark job as running"""
+        db = get_db()
+        db.bulk_jobs.update_one(
+            {'_id': ObjectId(job_id)},
+            {'$set': {'status': BulkJob.STATUS_RUNNING,
+                      'started_at': datetime.now(timezone.utc)}}
+        )
+    
+    @staticmethod
+    def record_progress(job_id, processed=0, succeeded=0, failed=0, errors=None):
+        """Add processed/succeeded/failed counts and row errors"""
+        update_data = {'$inc': {'processed': processed,
+                                'succeeded': succeeded,
+                                'failed': failed}}
+        if errors:
+            update_data['$push'] = {'errors': {'$each': errors,
+                                               '$slice': BulkJob.MAX_ERRORS}}
+        
+        db = get_db()
+        db.bulk_jobs.update_one({'_id': ObjectId(job_id)}, update_data)
+    
+    @staticmethod
+    def finish(job_id, status=STATUS_COMPLETED, result=None):
+        """Mark job as finished"""
+        db = get_db()
+        db.bulk_jobs.update_one(
+            {'_id': ObjectId(job_id)},
+            {'$set': {'status': status,
+                      'result': result,
+                      'finished_at': datetime.now(timezone.utc)}}
+        )
@@ -1,11 +1,28 @@
 from datetime import datetime, timezone
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel, ReturnDocument, UpdateOne
 from app import get_db
+from app.utils import search
+from app.utils.query_plans import FULL_SCAN
 
 
 class Client:
     """Client model"""
     
+    COLLECTION = 'clients'
+    INDEXES = [
+        # Active listings/search/counts, sorted by name
+        IndexModel([('is_active', ASCENDING), ('company_name', ASCENDING)]),
+        IndexModel([('company_name', ASCENDING)]),
+        IndexModel([('contact_email', ASCENDING)]),
+        # Word prefixes maintained on write, see app.utils.search
+        IndexModel([('search_prefixes', ASCENDING), ('is_active', ASCENDING)]),
+        IndexModel([('search_name', ASCENDING), ('is_active', ASCENDING)]),
+    ]
+    
+    # Searchable fields, most relevant first
+    SEARCH_FIELDS = ('company_name', 'contact_person', 'gstin')
+    
     @staticmethod
     def create(company_name, gstin, billing_address, contact_person=None, 
                contact_email=None, contact_phone=None):
@@ -20,6 +37,7 @@ class Client:
             'is_active': True,
             'created_at': datetime.now(timezone.utc)
         }
+        client_data.update(Client.search_keys(client_data))
         
         db = get_db()
         result = db.clients.insert_one(client_data)
@@ -36,6 +54,24 @@ class Client:
         except:
             return None
     
+    @staticmethod
+    def get_many(client_ids):
+        """Get several clients by ID in one $in query
+        
+        Returns:
+            dict: {str(id): document} for the IDs that exist
+        """
+        object_ids = []
+        for client_id in set(client_ids):
+            try:
+                object_ids.append(ObjectId(client_id))
+            except Exception:
+                continue
+        if not object_ids:
+            return {}
+        db = get_db()
+        return {str(doc['_id']): doc for doc in db.clients.find({'_id': {'$in': object_ids}})}
+    
     @staticmethod
     def get_all(active_only=True):
         """Get all clients"""
@@ -53,10 +89,24 @@ class Client:
             update_data['contact_email'] = update_data['contact_email'].lower()
         
         db = get_db()
-        db.clients.update_one(
+        if not any(field in update_data for field in Client.SEARCH_FIELDS):
+            db.clients.update_one(
+                {'_id': ObjectId(client_id)},
+                {'$set': update_data}
+            )
+            return
+        
+        client = db.clients.find_one_and_update(
             {'_id': ObjectId(client_id)},
-            {'$set': update_data}
+            {'$set': update_data},
+            projection={field: 1 for field in Client.SEARCH_FIELDS},
+            return_document=ReturnDocument.AFTER
         )
+        if client:
+            db.clients.update_one(
+                {'_id': client['_id']},
+                {'$set': Client.search_keys(client)}
+            )
     
     @staticmethod
     def deactivate(client_id):
@@ -68,10 +118,37 @@ class Client:
         )
     
     @staticmethod
-    def search(query):
-        """Search clients by company name"""
+    def search_keys(client):
+        """search_prefixes and search_name for a client document"""
+        return search.search_keys(*(client.get(field) for field in Client.SEARCH_FIELDS))
+    
+    @staticmethod
+    def search(query, limit=search.DEFAULT_LIMIT):
+        """Search active clients by name, contact person or GSTIN
+        
+        Matches clients with a word starting with each query word, ranked
+        by relevance. Names equal to or starting with the query are always
+        considered; see search.find_candidates().
+        """
+        db = get_db()
+        candidates = search.find_candidates(db.clients, query, is_active=True)
+        return search.rank(candidates, query, Client.SEARCH_FIELDS, limit)
+    
+    @staticmethod
+    def reindex_search(batch_size=500):
+        """Rebuild search_prefixes and search_name for every client, returning the count"""
         db = get_db()
-        return list(db.clients.find({
-            'company_name': {'$regex': query, '$options': 'i'},
-            'is_active': True
-        }).sort('company_name', 1))
+        projection = {field: 1 for field in Client.SEARCH_FIELDS}
+        updates = []
+        count = 0
+        for client in db.clients.find({}, projection, comment=FULL_SCAN).batch_size(batch_size):
+            updates.append(UpdateOne({'_id': client['_id']},
+                                     {'$set': Client.search_keys(client)}))
+            if len(updates) >= batch_size:
+                db.clients.bulk_write(updates, ordered=False)
+                count += len(updates)
+                updates = []
+        if updates:
+            db.clients.bulk_write(updates, ordered=False)
+            count += len(updates)
+        return count
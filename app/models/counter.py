@@ -0,0 +1,74 @@
+import os
+import threading
+from pymongo import ReturnDocument
+from app import get_db
+
+
+class Counter:
+    """Atomic named sequences backed by the counters collection"""
+
+    # Per-process pre-allocated blocks: {name: [next_value, last_value]}
+    _blocks = {}
+    _seeded = set()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def reserve(name, count=1):
+        """Atomically reserve `count` consecutive values and return the first"""
+        db = get_db()
+        counter = db.counters.find_one_and_update(
+            {'_id': name},
+            {'$inc': {'seq': count}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return counter['seq'] - count + 1
+
+    @staticmethod
+    def current(name):
+        """Read the current value of a sequence (0 if never used)"""
+        db = get_db()
+        counter = db.counters.find_one({'_id': name})
+        return counter['seq'] if counter else 0
+
+    @staticmethod
+    def next(name, block_size=1):
+        """Get next value, served from a pre-allocated block when block_size > 1
+
+        Blocks trade strict ordering across workers for one round trip per
+        block; values left in a block when the process exits are skipped.
+        """
+        if block_size <= 1:
+            return Counter.reserve(name)
+
+        with Counter._lock:
+            block = Counter._blocks.get(name)
+            if not block or block[0] > block[1]:
+                first = Counter.reserve(name, block_size)
+                block = [first, first + block_size - 1]
+                Counter._blocks[name] = block
+            value = block[0]
+            block[0] += 1
+            return value
+
+    @staticmethod
+    def ensure_seeded(name, seed_fn):
+        """Raise a new counter to seed_fn() once, e.g. to continue legacy numbering
+
+        The check runs once per process; $max makes concurrent seeding safe.
+        """
+        if name in Counter._seeded:
+            return
+        db = get_db()
+        if not db.counters.find_one({'_id': name}, {'_id': 1}):
+            db.counters.update_one(
+                {'_id': name},
+                {'$max': {'seq': seed_fn()}},
+                upsert=True
+            )
+        Counter._seeded.add(name)
+
+
+# Forked workers must not hand out numbers from the parent's blocks
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=Counter._blocks.clear)
@@ -1,6 +1,10 @@
 from datetime import datetime, timezone
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from app import get_db
+from app.utils.cache import TTLCache
+from app.utils.query_plans import FULL_SCAN
+from app.models.coupon_redemption import CouponRedemption
 
 
 class Coupon:
@@ -9,6 +13,23 @@ class Coupon:
     TYPE_PERCENTAGE = 'PERCENTAGE'
     TYPE_FIXED = 'FIXED'
     
+    COLLECTION = 'coupons'
+    INDEXES = [
+        IndexModel([('code', ASCENDING), ('is_active', ASCENDING)]),
+        IndexModel([('created_at', DESCENDING)]),
+    ]
+    
+    # Process-local coupon-by-code cache, configured from COUPON_CACHE_* in
+    # create_app. Writes invalidate the local copy; other workers may serve
+    # usage counts up to the TTL old, which is fine for validation since
+    # redemption is recorded on the database at settlement.
+    cache = TTLCache(maxsize=1024, ttl=30)
+    # Cached marker for codes that matched no active coupon
+    _NOT_FOUND = object()
+    
+    # Legacy embedded redemption list, superseded by CouponRedemption
+    EXCLUDE_LEGACY = {'used_by': 0}
+    
     @staticmethod
     def create(code, description, discount_value, discount_type=TYPE_PERCENTAGE, 
                max_uses=None, used_count=0, is_active=True, valid_from=None, 
@@ -25,13 +46,13 @@ class Coupon:
             'valid_from': valid_from,
             'valid_until': valid_until,
             'min_amount': float(min_amount) if min_amount else None,
-            'used_by': [],
             'created_at': datetime.now(timezone.utc),
             'updated_at': datetime.now(timezone.utc)
         }
         
         db = get_db()
         result = db.coupons.insert_one(coupon_data)
+        Coupon.invalidate_cache(coupon_data['code'])
         return str(result.inserted_id)
     
     @staticmethod
@@ -47,19 +68,42 @@ class Coupon:
     
     @staticmethod
     def get_by_code(code):
-        """Get coupon by code"""
-        db = get_db()
-        return db.coupons.find_one({'code': code.upper(), 'is_active': True})
+        """Get active coupon by code, served from the coupon cache when fresh"""
+        if not code:
+            return None
+        key = code.upper()
+        coupon = Coupon.cache.get(key)
+        if coupon is None:
+            db = get_db()
+            coupon = db.coupons.find_one(
+                {'code': key, 'is_active': True}, Coupon.EXCLUDE_LEGACY
+            ) or Coupon._NOT_FOUND
+            Coupon.cache.set(key, coupon)
+        if coupon is Coupon._NOT_FOUND:
+            return None
+        # Hand out a copy so callers can't mutate the cached document
+        return dict(coupon)
+    
+    @staticmethod
+    def invalidate_cache(*codes):
+        """Drop cached copies of coupons after they change"""
+        for code in codes:
+            if code:
+                Coupon.cache.delete(code.upper())
     
     @staticmethod
     def get_all():
         """Get all coupons"""
         db = get_db()
-        return list(db.coupons.find().sort('created_at', -1))
+        return list(db.coupons.find({}, Coupon.EXCLUDE_LEGACY).sort('created_at', -1))
     
     @staticmethod
     def validate_coupon(code, amount, user_id=None):
-        """Validate coupon and return discount details"""
+        """Validate coupon and return discount details
+        
+        A valid result carries the coupon's view under 'coupon' so callers
+        need no second lookup.
+        """
         coupon = Coupon.get_by_code(code)
         
         if not coupon:
@@ -68,10 +112,6 @@ class Coupon:
         if not coupon.get('is_active'):
             return {'valid': False, 'error': 'Coupon is inactive'}
         
-        # Check if user has already used this coupon (one-time use per user)
-        if user_id and user_id in coupon.get('used_by', []):
-            return {'valid': False, 'error': 'You have already used this coupon code'}
-        
         # Check max uses (use used_count with safe default)
         if coupon.get('max_uses') and coupon.get('used_count', 0) >= coupon.get('max_uses'):
             return {'valid': False, 'error': 'Coupon usage limit exceeded'}
@@ -99,6 +139,11 @@ class Coupon:
         if coupon.get('min_amount') and amount < coupon['min_amount']:
             return {'valid': False, 'error': f'Minimum purchase amount: ₹{coupon["min_amount"]}'}
         
+        # Check if user has already used this coupon (one-time use per user);
+        # an indexed point lookup, however many redemptions the coupon has
+        if user_id and CouponRedemption.exists(coupon['_id'], user_id):
+            return {'valid': False, 'error': 'You have already used this coupon code'}
+        
         # Calculate discount
         if coupon['discount_type'] == Coupon.TYPE_PERCENTAGE:
             discount = (amount * coupon['discount_value']) / 100
@@ -113,7 +158,24 @@ class Coupon:
             'code': coupon['code'],
             'discount': discount,
             'final_amount': amount - discount,
-            'coupon_id': str(coupon['_id'])
+            'coupon_id': str(coupon['_id']),
+            'coupon': Coupon.to_view(coupon)
+        }
+    
+    @staticmethod
+    def to_view(coupon):
+        """Public fields of a coupon for routes and the checkout UI"""
+        return {
+            'id': str(coupon['_id']),
+            'code': coupon['code'],
+            'description': coupon.get('description'),
+            'discount_type': coupon['discount_type'],
+            'discount_value': coupon['discount_value'],
+            'min_amount': coupon.get('min_amount'),
+            'max_uses': coupon.get('max_uses'),
+            'used_count': coupon.get('used_count', 0),
+            'valid_from': coupon.get('valid_from'),
+            'valid_until': coupon.get('valid_until')
         }
     
     @staticmethod
@@ -122,31 +184,98 @@ class Coupon:
         db = get_db()
         kwargs['updated_at'] = datetime.now(timezone.utc)
         
-        result = db.coupons.update_one(
+        before = db.coupons.find_one_and_update(
             {'_id': ObjectId(coupon_id)},
-            {'$set': kwargs}
+            {'$set': kwargs},
+            projection={'code': 1}
         )
-        return result.modified_count > 0
+        if not before:
+            return False
+        Coupon.invalidate_cache(before['code'], kwargs.get('code'))
+        return True
     
     @staticmethod
-    def increment_use(coupon_id, user_id=None):
-        """Increment coupon usage count and track user"""
+    def consume(coupon_id, user_id=None, session=None):
+        """Redeem a coupon, enforcing per-user use, max_uses and validity dates atomically
+        
+        The redemption row's unique (coupon_id, user_id) index rejects a
+        second use by the same user; a single conditional find_one_and_update
+        then takes one use only while the coupon is active, in date and under
+        max_uses, so concurrent checkouts cannot oversubscribe it.
+        
+        Raises:
+            ValueError: if the coupon cannot be redeemed
+        """
+        if user_id and not CouponRedemption.record(coupon_id, user_id, session=session):
+            raise ValueError('You have already used this coupon code')
+        
+        now = datetime.now(timezone.utc)
         db = get_db()
-        update_data = {'$inc': {'used_count': 1}, '$set': {'updated_at': datetime.now(timezone.utc)}}
+        coupon = db.coupons.find_one_and_update(
+            {
+                '_id': ObjectId(coupon_id),
+                'is_active': True,
+                '$and': [
+                    # max_uses of None/0 means unlimited
+                    {'$or': [
+                        {'max_uses': {'$in': [None, 0]}},
+                        {'$expr': {'$lt': [{'$ifNull': ['$used_count', 0]}, '$max_uses']}}
+                    ]},
+                    {'$or': [{'valid_from': None}, {'valid_from': {'$lte': now}}]},
+                    {'$or': [{'valid_until': None}, {'valid_until': {'$gte': now}}]}
+                ]
+            },
+            {'$inc': {'used_count': 1}, '$set': {'updated_at': now}},
+            projection={'code': 1},
+            session=session
+        )
+        if not coupon:
+            if user_id:
+                CouponRedemption.delete(coupon_id, user_id, session=session)
+            raise ValueError('Coupon is no longer available')
         
-        # Add user to used_by list if user_id is provided
+        Coupon.invalidate_cache(coupon['code'])
+    
+    @staticmethod
+    def release(coupon_id, user_id=None, session=None):
+        """Undo consume() when the purchase it was redeemed for fails"""
         if user_id:
-            update_data['$addToSet'] = {'used_by': user_id}
+            CouponRedemption.delete(coupon_id, user_id, session=session)
         
-        result = db.coupons.update_one(
-            {'_id': ObjectId(coupon_id)},
-            update_data
+        db = get_db()
+        coupon = db.coupons.find_one_and_update(
+            {'_id': ObjectId(coupon_id), 'used_count': {'$gt': 0}},
+            {'$inc': {'used_count': -1}, '$set': {'updated_at': datetime.now(timezone.utc)}},
+            projection={'code': 1},
+            session=session
         )
-        return result.modified_count > 0
+        if coupon:
+            Coupon.invalidate_cache(coupon['code'])
+    
+    @staticmethod
+    def migrate_redemptions():
+        """Move embedded used_by lists into the coupon_redemptions ledger
+        
+        Returns:
+            tuple: (coupons migrated, redemptions added)
+        """
+        db = get_db()
+        coupons = 0
+        added = 0
+        for coupon in db.coupons.find({'used_by': {'$exists': True}}, {'code': 1, 'used_by': 1},
+                                      comment=FULL_SCAN):
+            added += CouponRedemption.import_legacy(coupon['_id'], coupon.get('used_by') or [])
+            db.coupons.update_one({'_id': coupon['_id']}, {'$unset': {'used_by': ''}})
+            Coupon.invalidate_cache(coupon['code'])
+            coupons += 1
+        return coupons, added
     
     @staticmethod
     def delete(coupon_id):
         """Delete coupon"""
         db = get_db()
-        result = db.coupons.delete_one({'_id': ObjectId(coupon_id)})
-        return result.deleted_count > 0
+        coupon = db.coupons.find_one_and_delete({'_id': ObjectId(coupon_id)}, projection={'code': 1})
+        if not coupon:
+            return False
+        Coupon.invalidate_cache(coupon['code'])
+        return True
@@ -0,0 +1,74 @@
+from datetime import datetime, timezone
+from bson import ObjectId
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from app import get_db
+
+
+class CouponRedemption:
+    """Ledger of coupon uses, one document per (coupon, user)"""
+    
+    COLLECTION = 'coupon_redemptions'
+    INDEXES = [
+        # Enforces one redemption per user and makes the check a point lookup
+        IndexModel([('coupon_id', ASCENDING), ('user_id', ASCENDING)], unique=True),
+    ]
+    
+    @staticmethod
+    def record(coupon_id, user_id, session=None):
+        """Record a redemption
+        
+        Returns:
+            bool: False if the user had already redeemed the coupon
+        """
+        db = get_db()
+        try:
+            db.coupon_redemptions.insert_one({
+                'coupon_id': ObjectId(coupon_id),
+                'user_id': str(user_id),
+                'created_at': datetime.now(timezone.utc)
+            }, session=session)
+        except DuplicateKeyError:
+            return False
+        return True
+    
+    @staticmethod
+    def exists(coupon_id, user_id):
+        """Whether a user has redeemed a coupon"""
+        db = get_db()
+        return db.coupon_redemptions.find_one(
+            {'coupon_id': ObjectId(coupon_id), 'user_id': str(user_id)},
+            {'_id': 1}
+        ) is not None
+    
+    @staticmethod
+    def delete(coupon_id, user_id, session=None):
+        """Remove a redemption, e.g. when the consuming write did not go through"""
+        db = get_db()
+        db.coupon_redemptions.delete_one(
+            {'coupon_id': ObjectId(coupon_id), 'user_id': str(user_id)},
+            session=session
+        )
+    
+    @staticmethod
+    def import_legacy(coupon_id, user_ids, batch_size=1000):
+        """Copy a coupon's embedded used_by list into the ledger, skipping existing rows
+        
+        Returns:
+            int: number of redemptions added
+        """
+        db = get_db()
+        now = datetime.now(timezone.utc)
+        user_ids = list(user_ids)
+        added = 0
+        for start in range(0, len(user_ids), batch_size):
+            result = db.coupon_redemptions.bulk_write([
+                UpdateOne(
+                    {'coupon_id': ObjectId(coupon_id), 'user_id': str(user_id)},
+                    {'$setOnInsert': {'created_at': now}},
+                    upsert=True
+                )
+                for user_id in user_ids[start:start + batch_size]
+            ], ordered=False)
+            added += result.upserted_count
+        return added
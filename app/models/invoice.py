@@ -1,6 +1,14 @@
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
+from pymongo.errors import BulkWriteError
 from app import get_db
+from app.models.invoice_stats import InvoiceStats
+from app.models.counter import Counter
+from app.utils import money
+from app.utils.query_plans import FULL_SCAN
+import calendar
+import re
 
 
 class Invoice:
@@ -10,12 +18,56 @@ class Invoice:
     STATUS_ISSUED = 'ISSUED'
     STATUS_PAID = 'PAID'
     
+    COLLECTION = 'invoices'
+    INDEXES = [
+        IndexModel([('invoice_no', ASCENDING)], unique=True),
+        # Keyset pages on (created_at, _id), optionally by status and/or client
+        IndexModel([('created_at', DESCENDING), ('_id', DESCENDING)]),
+        IndexModel([('status', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)]),
+        IndexModel([('client_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)]),
+        IndexModel([('client_id', ASCENDING), ('status', ASCENDING),
+                    ('created_at', DESCENDING), ('_id', DESCENDING)]),
+        # Date-range tax reports
+        IndexModel([('issue_date', ASCENDING)]),
+    ]
+    
+    # Financial years roll over on 1 April, Indian time
+    IST = timezone(timedelta(hours=5, minutes=30))
+    
+    # Fields needed by list views (invoice list, dashboards, client view)
+    LIST_PROJECTION = {
+        'invoice_no': 1,
+        'client_id': 1,
+        'status': 1,
+        'total': 1,
+        'issue_date': 1,
+        'due_date': 1,
+        'created_at': 1,
+        'merged_into': 1,
+        'snapshot.client.company_name': 1
+    }
+    
+    DEFAULT_PAGE_SIZE = 25
+    MAX_PAGE_SIZE = 100
+    
     @staticmethod
     def create(invoice_no, client_id, items, subtotal, tax_breakup, 
                total, status=STATUS_DRAFT, snapshot=None, issue_date=None, 
                due_date=None):
         """Create new invoice"""
-        invoice_data = {
+        invoice_data = Invoice.build_document(
+            invoice_no, client_id, items, subtotal, tax_breakup, total,
+            status=status, snapshot=snapshot, issue_date=issue_date,
+            due_date=due_date
+        )
+        return Invoice.insert(invoice_data)
+    
+    @staticmethod
+    def build_document(invoice_no, client_id, items, subtotal, tax_breakup,
+                       total, status=STATUS_DRAFT, snapshot=None, issue_date=None,
+                       due_date=None):
+        """Build an invoice document without inserting it"""
+        return {
             'invoice_no': invoice_no,
             'client_id': ObjectId(client_id),
             'items': items,
@@ -30,11 +82,44 @@ class Invoice:
             'created_at': datetime.now(timezone.utc),
             'updated_at': datetime.now(timezone.utc)
         }
-        
+    
+    @staticmethod
+    def insert(invoice_data):
+        """Insert a fully built invoice document"""
         db = get_db()
         result = db.invoices.insert_one(invoice_data)
+        InvoiceStats.record_insert([invoice_data])
         return str(result.inserted_id)
     
+    @staticmethod
+    def create_many(invoice_docs):
+        """Insert built invoice documents with one unordered insert_many
+        
+        A failing document does not stop the rest of the batch.
+        
+        Returns:
+            tuple: ({index: invoice_id}, {index: error message})
+        """
+        if not invoice_docs:
+            return {}, {}
+        
+        db = get_db()
+        errors = {}
+        try:
+            db.invoices.insert_many(invoice_docs, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get('writeErrors', []):
+                errors[write_error['index']] = write_error.get('errmsg', 'Write failed')
+        
+        # insert_many assigns _id to every document before sending the batch
+        inserted = {
+            index: str(doc['_id'])
+            for index, doc in enumerate(invoice_docs)
+            if index not in errors
+        }
+        InvoiceStats.record_insert([invoice_docs[index] for index in inserted])
+        return inserted, errors
+    
     @staticmethod
     def get_by_id(invoice_id):
         """Get invoice by ID"""
@@ -53,16 +138,254 @@ class Invoice:
         return db.invoices.find_one({'invoice_no': invoice_no})
     
     @staticmethod
-    def get_all(status=None, client_id=None):
-        """Get all invoices with optional filters"""
-        db = get_db()
+    def build_query(status=None, client_id=None, exclude_merged=False):
+        """Build invoice filter from optional status/client"""
         query = {}
         if status:
             query['status'] = status
         if client_id:
             query['client_id'] = ObjectId(client_id)
+        if exclude_merged:
+            # Matches documents where merged_into is missing or null
+            query['merged_into'] = None
+        return query
+    
+    @staticmethod
+    def iter_all(status=None, client_id=None, projection=None, batch_size=500):
+        """Stream invoices newest first without loading them all into memory"""
+        db = get_db()
+        query = Invoice.build_query(status, client_id)
+        return db.invoices.find(query, projection).sort(
+            [('created_at', -1), ('_id', -1)]
+        ).batch_size(batch_size)
+    
+    @staticmethod
+    def get_all(status=None, client_id=None, projection=None):
+        """Get all invoices with optional filters"""
+        return list(Invoice.iter_all(status, client_id, projection))
+    
+    @staticmethod
+    def encode_cursor(invoice):
+        """Encode an invoice's (created_at, _id) sort key as a page cursor"""
+        created_at = invoice['created_at']
+        millis = calendar.timegm(created_at.utctimetuple()) * 1000 + created_at.microsecond // 1000
+        return f"{millis}-{invoice['_id']}"
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        """Decode a page cursor, returning (created_at, _id) or None if invalid"""
+        try:
+            millis, invoice_id = cursor.split('-', 1)
+            created_at = datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(milliseconds=int(millis))
+            return created_at, ObjectId(invoice_id)
+        except Exception:
+            return None
+    
+    @staticmethod
+    def get_page(status=None, client_id=None, after=None, limit=DEFAULT_PAGE_SIZE,
+                 projection=None, exclude_merged=False):
+        """Get one page of invoices, newest first
+        
+        Uses keyset pagination on (created_at, _id), so each page costs the
+        same regardless of how deep into the collection it is.
         
-        return list(db.invoices.find(query).sort('created_at', -1))
+        Returns:
+            tuple: (invoices, next_cursor) - next_cursor is None on the last page
+        """
+        limit = max(1, min(int(limit), Invoice.MAX_PAGE_SIZE))
+        query = Invoice.build_query(status, client_id, exclude_merged)
+        
+        position = Invoice.decode_cursor(after) if after else None
+        if position:
+            created_at, last_id = position
+            query['$or'] = [
+                {'created_at': {'$lt': created_at}},
+                {'created_at': created_at, '_id': {'$lt': last_id}}
+            ]
+        
+        db = get_db()
+        # Fetch one extra document to know whether another page exists
+        invoices = list(db.invoices.find(
+            query, projection or Invoice.LIST_PROJECTION
+        ).sort([('created_at', -1), ('_id', -1)]).limit(limit + 1))
+        
+        next_cursor = None
+        if len(invoices) > limit:
+            invoices = invoices[:limit]
+            next_cursor = Invoice.encode_cursor(invoices[-1])
+        
+        return invoices, next_cursor
+    
+    @staticmethod
+    def get_status_totals(client_id=None, exclude_merged=False):
+        """Count and sum invoice totals per status in one aggregation
+        
+        Returns:
+            dict: {status: {'count': int, 'total': float}}
+        """
+        db = get_db()
+        pipeline = [
+            {'$match': Invoice.build_query(client_id=client_id, exclude_merged=exclude_merged)},
+            {'$group': {'_id': '$status', 'count': {'$sum': 1}, 'total': {'$sum': '$total'}}}
+        ]
+        return {
+            row['_id']: {'count': row['count'], 'total': row['total']}
+            for row in db.invoices.aggregate(pipeline)
+        }
+    
+    @staticmethod
+    def _to_units_expr(value, scale):
+        """Expression for int(round(value * scale)), as money.to_paise() converts"""
+        return {'$toLong': {'$round': [{'$multiply': [value, scale]}, 0]}}
+    
+    @staticmethod
+    def _div_round_expr(numerator, denominator):
+        """Expression for money.div_round(): integer division, halves away from zero"""
+        # (2|n| + d) // 2d, with the remainder taken off first so the division is exact
+        doubled = {'$add': [{'$multiply': [{'$abs': '$$n'}, 2]}, denominator]}
+        magnitude = {'$toLong': {'$divide': [
+            {'$subtract': [doubled, {'$mod': [doubled, 2 * denominator]}]}, 2 * denominator
+        ]}}
+        return {'$let': {'vars': {'n': numerator}, 'in': {
+            '$cond': [{'$lt': ['$$n', 0]}, {'$subtract': [0, magnitude]}, magnitude]
+        }}}
+    
+    @staticmethod
+    def aggregate_gst(start, end, company_state_code=None, rounding=money.ROUND_PER_RATE):
+        """Issued and paid invoices with start <= issue_date < end, totalled per HSN, tax rate and B2B/B2C
+        
+        Amounts are integer paise worked out as app/utils/money.py does, so
+        each invoice's tax per rate follows the rounding policy. Where an
+        invoice has its GST lines frozen in the snapshot, those figures are
+        used. An invoice's tax at a rate is shared between its HSNs by their
+        own rounded tax; any paisa of difference goes to the lowest HSN, so
+        the report adds up to the invoices as issued.
+        
+        Invoices issued before the GST split was frozen into snapshots are
+        treated as inter-state when the client GSTIN's state code differs
+        from company_state_code. Merged invoices only re-bill their
+        originals, which are counted instead.
+        
+        Returns:
+            cursor: {'_id': {'hsn', 'basis_points', 'b2b'}, 'lines', 'quantity',
+                'taxable', 'igst', 'cgst', 'sgst'} (amounts in paise) ordered
+                B2B first, then by HSN and rate
+        """
+        money.check_rounding(rounding)
+        per_line = rounding == money.ROUND_PER_LINE
+        to_units = Invoice._to_units_expr
+        div_round = Invoice._div_round_expr
+        
+        gstin = {'$ifNull': ['$snapshot.client.gstin', '']}
+        b2b = {'$gt': [gstin, '']}
+        if company_state_code:
+            legacy_inter_state = {'$and': [b2b, {'$ne': [{'$substrCP': [gstin, 0, 2]}, company_state_code]}]}
+        else:
+            legacy_inter_state = False
+        
+        # money.split_tax() of $tax; sgst is what is left after these
+        split = {
+            'cgst': {'$cond': ['$inter_state', 0, div_round('$tax', 2)]},
+            'igst': {'$cond': ['$inter_state', '$tax', 0]}
+        }
+        sgst = {'$subtract': [{'$subtract': ['$tax', '$cgst']}, '$igst']}
+        
+        line_fields = {
+            'b2b': 1,
+            'inter_state': 1,
+            'gst_lines': 1,
+            'hsn': {'$ifNull': ['$items.hsn', '']},
+            'quantity': '$items.quantity',
+            'basis_points': to_units({'$ifNull': ['$items.tax_rate', 0]}, 100),
+            'amount': div_round({'$multiply': [to_units('$items.rate', 100),
+                                               to_units('$items.quantity', 1000)]}, 1000)
+        }
+        part_group = {
+            '_id': {'invoice': '$_id', 'basis_points': '$basis_points', 'hsn': '$hsn'},
+            'b2b': {'$first': '$b2b'},
+            'inter_state': {'$first': '$inter_state'},
+            'gst_lines': {'$first': '$gst_lines'},
+            'lines': {'$sum': 1},
+            'quantity': {'$sum': '$quantity'},
+            'taxable': {'$sum': '$amount'}
+        }
+        # per_line sums the lines' rounded tax, per_rate rounds tax on the sum
+        if per_line:
+            part_group['tax'] = {'$sum': '$line_tax'}
+        tax = '$tax' if per_line else div_round({'$multiply': ['$taxable', '$_id.basis_points']}, 10000)
+        frozen_line = {'$arrayElemAt': [{'$filter': {
+            'input': {'$ifNull': ['$gst_lines', []]},
+            'as': 'line',
+            'cond': {'$eq': [to_units('$$line.tax_rate', 100), '$_id.basis_points']}
+        }}, 0]}
+        
+        def frozen_or(component, computed):
+            return {'$cond': [{'$ifNull': ['$frozen', False]}, to_units(f'$frozen.{component}', 100), computed]}
+        
+        def share(component):
+            # A part's own figure, plus the invoice's remainder on the lowest HSN
+            return {'$add': [f'$parts.{component}', {'$cond': [
+                {'$eq': ['$parts.hsn', '$first_hsn']},
+                {'$subtract': [f'${component}', f'$parts_{component}']}, 0
+            ]}]}
+        
+        db = get_db()
+        pipeline = [
+            {'$match': {
+                'issue_date': {'$gte': start, '$lt': end},
+                'status': {'$in': [Invoice.STATUS_ISSUED, Invoice.STATUS_PAID]},
+                'merged_from': None
+            }},
+            {'$project': {
+                'items': 1,
+                'b2b': b2b,
+                'inter_state': {'$ifNull': ['$snapshot.gst.place_of_supply.inter_state', legacy_inter_state]},
+                'gst_lines': '$snapshot.gst.lines'
+            }},
+            {'$unwind': '$items'},
+            {'$project': line_fields},
+        ]
+        if per_line:
+            pipeline.append({'$addFields': {
+                'line_tax': div_round({'$multiply': ['$amount', '$basis_points']}, 10000)
+            }})
+        pipeline += [
+            # One part per invoice, rate and HSN, taxed as if on its own
+            {'$group': part_group},
+            {'$addFields': {'tax': tax}},
+            {'$addFields': split},
+            {'$addFields': {'sgst': sgst}},
+            # The invoice's figures per rate: frozen, or by the rounding policy
+            {'$group': {
+                '_id': {'invoice': '$_id.invoice', 'basis_points': '$_id.basis_points'},
+                'b2b': {'$first': '$b2b'},
+                'inter_state': {'$first': '$inter_state'},
+                'gst_lines': {'$first': '$gst_lines'},
+                'first_hsn': {'$min': '$_id.hsn'},
+                'taxable': {'$sum': '$taxable'},
+                'tax': {'$sum': '$tax'},
+                'parts_cgst': {'$sum': '$cgst'},
+                'parts_sgst': {'$sum': '$sgst'},
+                'parts_igst': {'$sum': '$igst'},
+                'parts': {'$push': {'hsn': '$_id.hsn', 'lines': '$lines', 'quantity': '$quantity',
+                                    'taxable': '$taxable', 'cgst': '$cgst', 'sgst': '$sgst', 'igst': '$igst'}}
+            }},
+            {'$addFields': {'tax': tax, 'frozen': frozen_line}},
+            {'$addFields': {'cgst': frozen_or('cgst', split['cgst']), 'igst': frozen_or('igst', split['igst'])}},
+            {'$addFields': {'sgst': frozen_or('sgst', sgst)}},
+            {'$unwind': '$parts'},
+            {'$group': {
+                '_id': {'hsn': '$parts.hsn', 'basis_points': '$_id.basis_points', 'b2b': '$b2b'},
+                'lines': {'$sum': '$parts.lines'},
+                'quantity': {'$sum': '$parts.quantity'},
+                'taxable': {'$sum': '$parts.taxable'},
+                'igst': {'$sum': share('igst')},
+                'cgst': {'$sum': share('cgst')},
+                'sgst': {'$sum': share('sgst')}
+            }},
+            {'$sort': {'_id.b2b': -1, '_id.hsn': 1, '_id.basis_points': 1}}
+        ]
+        return db.invoices.aggregate(pipeline, allowDiskUse=True)
     
     @staticmethod
     def update(invoice_id, **kwargs):
@@ -77,10 +400,26 @@ class Invoice:
             update_data['total'] = float(update_data['total'])
         
         db = get_db()
-        db.invoices.update_one(
+        if 'status' not in update_data and 'total' not in update_data:
+            db.invoices.update_one(
+                {'_id': ObjectId(invoice_id)},
+                {'$set': update_data}
+            )
+            return
+        
+        # Status/total changes feed the materialized stats
+        before = db.invoices.find_one_and_update(
             {'_id': ObjectId(invoice_id)},
-            {'$set': update_data}
+            {'$set': update_data},
+            projection={'status': 1, 'total': 1},
+            return_document=ReturnDocument.BEFORE
         )
+        if before:
+            InvoiceStats.record_change(
+                before,
+                update_data.get('status', before['status']),
+                update_data.get('total', before.get('total', 0))
+            )
     
     @staticmethod
     def update_status(invoice_id, status, paid_on=None):
@@ -93,36 +432,156 @@ class Invoice:
             update_data['paid_on'] = paid_on
         
         db = get_db()
-        db.invoices.update_one(
+        before = db.invoices.find_one_and_update(
             {'_id': ObjectId(invoice_id)},
-            {'$set': update_data}
+            {'$set': update_data},
+            projection={'status': 1, 'total': 1},
+            return_document=ReturnDocument.BEFORE
         )
+        if before:
+            InvoiceStats.record_change(before, status, before.get('total', 0))
+    
+    @staticmethod
+    def get_statuses(invoice_ids, client_id, session=None):
+        """Status and total of a client's invoices, keyed by ID string"""
+        object_ids = []
+        for invoice_id in set(invoice_ids):
+            try:
+                object_ids.append(ObjectId(invoice_id))
+            except Exception:
+                continue
+        if not object_ids:
+            return {}
+        db = get_db()
+        return {
+            str(doc['_id']): doc
+            for doc in db.invoices.find(
+                {'_id': {'$in': object_ids}, 'client_id': ObjectId(client_id)},
+                {'status': 1, 'total': 1, 'paid_on': 1},
+                session=session
+            )
+        }
+    
+    @staticmethod
+    def mark_paid_many(invoice_ids, client_id, paid_on, session=None):
+        """Mark a client's ISSUED invoices PAID with one update_many
+        
+        Stats are left to the caller, which knows the pre-update statuses.
+        
+        Returns:
+            int: number of invoices that moved to PAID
+        """
+        db = get_db()
+        result = db.invoices.update_many(
+            {
+                '_id': {'$in': [ObjectId(invoice_id) for invoice_id in invoice_ids]},
+                'client_id': ObjectId(client_id),
+                'status': Invoice.STATUS_ISSUED
+            },
+            {'$set': {
+                'status': Invoice.STATUS_PAID,
+                'paid_on': paid_on,
+                'updated_at': datetime.now(timezone.utc)
+            }},
+            session=session
+        )
+        return result.modified_count
     
     @staticmethod
     def delete(invoice_id):
         """Delete invoice (only if draft)"""
         db = get_db()
-        db.invoices.delete_one({
-            '_id': ObjectId(invoice_id),
-            'status': Invoice.STATUS_DRAFT
-        })
+        deleted = db.invoices.find_one_and_delete(
+            {
+                '_id': ObjectId(invoice_id),
+                'status': Invoice.STATUS_DRAFT
+            },
+            projection={'status': 1, 'total': 1}
+        )
+        if deleted:
+            InvoiceStats.record_delete(deleted)
     
     @staticmethod
-    def get_next_invoice_no(prefix='INV'):
-        """Generate next invoice number"""
+    def get_dashboard_summary(recent_limit=10):
+        """Per-status counts/totals and the most recent invoices in one round trip
+        
+        Returns:
+            dict: {'by_status': {status: {'count', 'total'}}, 'recent': [invoice, ...]}
+        """
         db = get_db()
-        last_invoice = db.invoices.find_one(
-            {'invoice_no': {'$regex': f'^{prefix}'}},
-            sort=[('invoice_no', -1)]
-        )
+        pipeline = [
+            {'$facet': {
+                'by_status': [
+                    {'$group': {'_id': '$status', 'count': {'$sum': 1}, 'total': {'$sum': '$total'}}}
+                ],
+                'recent': [
+                    {'$sort': {'created_at': -1, '_id': -1}},
+                    {'$limit': recent_limit},
+                    {'$project': Invoice.LIST_PROJECTION}
+                ]
+            }}
+        ]
+        # Reads every invoice by design; only used to rebuild InvoiceStats
+        result = next(db.invoices.aggregate(pipeline, comment=FULL_SCAN))
+        return {
+            'by_status': {
+                row['_id']: {'count': row['count'], 'total': row['total']}
+                for row in result['by_status']
+            },
+            'recent': result['recent']
+        }
+    
+    @staticmethod
+    def financial_year(when=None):
+        """Indian financial year label (April-March) for a date, e.g. '26-27'"""
+        when = (when or datetime.now(timezone.utc)).astimezone(Invoice.IST)
+        start_year = when.year if when.month >= 4 else when.year - 1
+        return f"{start_year % 100:02d}-{(start_year + 1) % 100:02d}"
+    
+    @staticmethod
+    def format_invoice_no(prefix, number, financial_year=None):
+        """Format a sequence value as an invoice number"""
+        if financial_year:
+            return f"{prefix}/{financial_year}/{number:05d}"
+        return f"{prefix}{number:05d}"
+    
+    @staticmethod
+    def _number_series(prefix, financial_year=None):
+        """Counter name for an invoice number series, seeded from legacy numbers"""
+        if financial_year:
+            return f"invoice_no:{prefix}:{financial_year}"
+        
+        name = f"invoice_no:{prefix}"
         
-        if last_invoice:
-            last_no = last_invoice['invoice_no'].replace(prefix, '')
+        def legacy_max():
+            db = get_db()
+            last_invoice = db.invoices.find_one(
+                {'invoice_no': {'$regex': f'^{re.escape(prefix)}[0-9]+$'}},
+                sort=[('invoice_no', -1)]
+            )
+            if not last_invoice:
+                return 0
             try:
-                next_no = int(last_no) + 1
-            except:
-                next_no = 1
-        else:
-            next_no = 1
+                return int(last_invoice['invoice_no'][len(prefix):])
+            except ValueError:
+                return 0
         
-        return f"{prefix}{next_no:05d}"
+        Counter.ensure_seeded(name, legacy_max)
+        return name
+    
+    @staticmethod
+    def get_next_invoice_no(prefix='INV', financial_year=None, block_size=1):
+        """Allocate next invoice number from the atomic counter"""
+        series = Invoice._number_series(prefix, financial_year)
+        number = Counter.next(series, block_size)
+        return Invoice.format_invoice_no(prefix, number, financial_year)
+    
+    @staticmethod
+    def allocate_invoice_nos(count, prefix='INV', financial_year=None):
+        """Allocate `count` consecutive invoice numbers in one round trip"""
+        series = Invoice._number_series(prefix, financial_year)
+        first = Counter.reserve(series, count)
+        return [
+            Invoice.format_invoice_no(prefix, number, financial_year)
+            for number in range(first, first + count)
+        ]
@@ -0,0 +1,106 @@
+from datetime import datetime, timezone, timedelta
+from app import get_db
+
+
+class InvoiceStats:
+    """Materialized per-status invoice counts and totals
+
+    A single document in the stats collection, kept current by $inc
+    updates from the Invoice model so dashboards never scan invoices.
+    It is rebuilt from a full aggregation when missing or older than
+    the allowed age, which also corrects any drift.
+    """
+
+    DOC_ID = 'invoices'
+
+    @staticmethod
+    def get(max_age=None):
+        """Get stats document, or None if missing or due for a rebuild
+
+        Returns:
+            dict: {'count': int, 'by_status': {status: {'count', 'total'}}}
+        """
+        db = get_db()
+        stats = db.stats.find_one({'_id': InvoiceStats.DOC_ID})
+        if not stats:
+            return None
+
+        if max_age:
+            rebuilt_at = stats.get('rebuilt_at')
+            if rebuilt_at.tzinfo is None:
+                rebuilt_at = rebuilt_at.replace(tzinfo=timezone.utc)
+            if datetime.now(timezone.utc) - rebuilt_at > timedelta(seconds=max_age):
+                return None
+
+        return stats
+
+    @staticmethod
+    def save(by_status):
+        """Replace stats with freshly aggregated per-status figures"""
+        db = get_db()
+        stats = {
+            '_id': InvoiceStats.DOC_ID,
+            'count': sum(row['count'] for row in by_status.values()),
+            'by_status': by_status,
+            'rebuilt_at': datetime.now(timezone.utc)
+        }
+        db.stats.replace_one({'_id': InvoiceStats.DOC_ID}, stats, upsert=True)
+        return stats
+
+    @staticmethod
+    def _apply(increments):
+        """Apply $inc deltas; a missing document is left for the next rebuild"""
+        increments = {k: v for k, v in increments.items() if v}
+        if not increments:
+            return
+        db = get_db()
+        db.stats.update_one({'_id': InvoiceStats.DOC_ID}, {'$inc': increments})
+
+    @staticmethod
+    def record_insert(invoices):
+        """Account for newly inserted invoices"""
+        increments = {}
+        for invoice in invoices:
+            status = invoice['status']
+            increments['count'] = increments.get('count', 0) + 1
+            key = f'by_status.{status}'
+            increments[f'{key}.count'] = increments.get(f'{key}.count', 0) + 1
+            increments[f'{key}.total'] = increments.get(f'{key}.total', 0) + float(invoice.get('total', 0))
+        InvoiceStats._apply(increments)
+
+    @staticmethod
+    def record_change(before, status, total):
+        """Account for an invoice moving status and/or changing total"""
+        old_status = before['status']
+        old_total = float(before.get('total', 0))
+        increments = {}
+        if old_status != status:
+            increments[f'by_status.{old_status}.count'] = -1
+            increments[f'by_status.{status}.count'] = 1
+        increments[f'by_status.{old_status}.total'] = -old_total
+        increments[f'by_status.{status}.total'] = increments.get(f'by_status.{status}.total', 0) + float(total)
+        InvoiceStats._apply(increments)
+
+    @staticmethod
+    def record_status_change(befores, status):
+        """Account for several invoices moving to one status, totals unchanged"""
+        increments = {}
+        for before in befores:
+            old_status = before['status']
+            if old_status == status:
+                continue
+            total = float(before.get('total', 0))
+            for key, sign in ((f'by_status.{old_status}', -1), (f'by_status.{status}', 1)):
+                increments[f'{key}.count'] = increments.get(f'{key}.count', 0) + sign
+                increments[f'{key}.total'] = increments.get(f'{key}.total', 0) + sign * total
+        InvoiceStats._apply(increments)
+
+    @staticmethod
+    def record_delete(invoice):
+        """Account for a deleted invoice"""
+        status = invoice['status']
+        InvoiceStats._apply({
+            'count': -1,
+            f'by_status.{status}.count': -1,
+            f'by_status.{status}.total': -float(invoice.get('total', 0))
+        })
@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+from pymongo import ASCENDING, IndexModel, UpdateOne
+from app import get_db
+
+
+class LoginAttempt:
+    """Failed login counters per IP and per email, in fixed time windows"""
+    
+    COLLECTION = 'login_attempts'
+    INDEXES = [
+        # Counters disappear once their window is over
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0),
+    ]
+    
+    @staticmethod
+    def _keys(ip_address, email, window):
+        """Counter IDs for the current window: {kind: _id}"""
+        index = int(datetime.now(timezone.utc).timestamp() // window)
+        keys = {}
+        if ip_address:
+            keys['ip'] = f'ip:{ip_address}:{index}'
+        if email:
+            keys['email'] = f'email:{email.lower()}:{index}'
+        return keys
+    
+    @staticmethod
+    def is_blocked(ip_address, email, max_per_ip, max_per_email, window):
+        """Whether this IP or email has used up its failures for the window"""
+        keys = LoginAttempt._keys(ip_address, email, window)
+        if not keys:
+            return False
+        limits = {keys.get('ip'): max_per_ip, keys.get('email'): max_per_email}
+        db = get_db()
+        for counter in db.login_attempts.find({'_id': {'$in': list(keys.values())}}):
+            if counter['count'] >= limits[counter['_id']]:
+                return True
+        return False
+    
+    @staticmethod
+    def record_failure(ip_address, email, window):
+        """Count a failed login against both the IP and the email"""
+        keys = LoginAttempt._keys(ip_address, email, window)
+        if not keys:
+            return
+        now = datetime.now(timezone.utc)
+        window_end = datetime.fromtimestamp(
+            (int(now.timestamp() // window) + 1) * window, timezone.utc
+        )
+        db = get_db()
+        db.login_attempts.bulk_write([
+            UpdateOne(
+                {'_id': key},
+                {'$inc': {'count': 1}, '$setOnInsert': {'expires_at': window_end}},
+                upsert=True
+            )
+            for key in keys.values()
+        ], ordered=False)
+    
+    @staticmethod
+    def reset(email, window):
+        """Clear an email's failures after a successful login"""
+        keys = LoginAttempt._keys(None, email, window)
+        if keys:
+            db = get_db()
+            db.login_attempts.delete_one({'_id': keys['email']})
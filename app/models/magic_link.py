@@ -1,6 +1,8 @@
 from datetime import datetime, timezone, timedelta
 from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
 from app import get_db
+import hashlib
 import secrets
 import string
 
@@ -8,12 +10,34 @@ import string
 class MagicLink:
     """Magic login link model for passwordless client access"""
     
+    COLLECTION = 'magic_links'
+    INDEXES = [
+        IndexModel([('token_hash', ASCENDING)], unique=True,
+                   partialFilterExpression={'token_hash': {'$exists': True}}),
+        # Plain-text tokens of links created before hashing
+        IndexModel([('token', ASCENDING)], unique=True,
+                   partialFilterExpression={'token': {'$exists': True}}),
+        IndexModel([('client_id', ASCENDING), ('created_at', DESCENDING)]),
+        # Links are purged once they expire, used or not
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0),
+    ]
+    
     @staticmethod
     def generate_token():
         """Generate a secure random token"""
         # Generate a 32-character URL-safe token
         return ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(32))
     
+    @staticmethod
+    def hash_token(token):
+        """SHA-256 of a token; only the hash is stored"""
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def _token_query(token):
+        """Match a link by hashed token, or by plain token for legacy links"""
+        return {'$or': [{'token_hash': MagicLink.hash_token(token)}, {'token': token}]}
+    
     @staticmethod
     def create(client_id, expires_in_hours=24, created_by=None):
         """
@@ -25,14 +49,15 @@ class MagicLink:
             created_by: User ID of who created the link (owner)
         
         Returns:
-            dict: The created magic link document with token
+            dict: The created magic link document, plus the plain token
+            (which is not stored)
         """
         token = MagicLink.generate_token()
         now = datetime.now(timezone.utc)
         expires_at = now + timedelta(hours=expires_in_hours)
         
         magic_link_data = {
-            'token': token,
+            'token_hash': MagicLink.hash_token(token),
             'client_id': str(client_id),
             'created_by': created_by,
             'created_at': now,
@@ -45,14 +70,17 @@ class MagicLink:
         db = get_db()
         result = db.magic_links.insert_one(magic_link_data)
         magic_link_data['_id'] = result.inserted_id
+        magic_link_data['token'] = token
         
         return magic_link_data
     
     @staticmethod
     def get_by_token(token):
         """Get magic link by token"""
+        if not token:
+            return None
         db = get_db()
-        return db.magic_links.find_one({'token': token})
+        return db.magic_links.find_one(MagicLink._token_query(token))
     
     @staticmethod
     def validate_token(token):
@@ -93,7 +121,7 @@ class MagicLink:
         """Mark a magic link as used"""
         db = get_db()
         result = db.magic_links.update_one(
-            {'token': token},
+            MagicLink._token_query(token),
             {
                 '$set': {
                     'used': True,
@@ -104,6 +132,44 @@ class MagicLink:
         )
         return result.modified_count > 0
     
+    @staticmethod
+    def consume(token, ip_address=None):
+        """Validate and use a magic link in one find_one_and_update
+        
+        Only an unused, unexpired link matches, so a link can be used once
+        even under concurrent requests. The failure path does one more read
+        to say why.
+        
+        Returns:
+            dict: {'valid': bool, 'client_id': str, 'error': str}
+        """
+        if not token:
+            return {'valid': False, 'error': 'Invalid or expired link'}
+        
+        now = datetime.now(timezone.utc)
+        db = get_db()
+        magic_link = db.magic_links.find_one_and_update(
+            {
+                **MagicLink._token_query(token),
+                'used': False,
+                'expires_at': {'$gt': now}
+            },
+            {'$set': {'used': True, 'used_at': now, 'ip_address': ip_address}},
+            projection={'client_id': 1}
+        )
+        if magic_link:
+            return {
+                'valid': True,
+                'client_id': magic_link['client_id'],
+                'magic_link_id': str(magic_link['_id'])
+            }
+        
+        # Explain the failure; never report success without having consumed
+        result = MagicLink.validate_token(token)
+        if result['valid']:
+            return {'valid': False, 'error': 'Invalid or expired link'}
+        return result
+    
     @staticmethod
     def get_all_for_client(client_id):
         """Get all magic links for a client (for audit trail)"""
@@ -112,7 +178,7 @@ class MagicLink:
     
     @staticmethod
     def delete_expired():
-        """Delete expired magic links (cleanup task)"""
+        """Delete expired magic links (the TTL index on expires_at normally does this)"""
         db = get_db()
         now = datetime.now(timezone.utc)
         result = db.magic_links.delete_many({'expires_at': {'$lt': now}})
@@ -123,7 +189,7 @@ class MagicLink:
         """Revoke a magic link before it expires"""
         db = get_db()
         result = db.magic_links.update_one(
-            {'token': token},
+            MagicLink._token_query(token),
             {
                 '$set': {
                     'used': True,
@@ -0,0 +1,119 @@
+from datetime import datetime, timezone, timedelta
+from pymongo import ASCENDING, DESCENDING, IndexModel, ReturnDocument
+from app import get_db
+import uuid
+
+
+class PaymentRequest:
+    """Pending client payment (checkout) model"""
+    
+    STATUS_PENDING = 'PENDING'
+    STATUS_COMPLETED = 'COMPLETED'
+    STATUS_CANCELLED = 'CANCELLED'
+    
+    COLLECTION = 'payment_requests'
+    INDEXES = [
+        # Pending requests are purged once expires_at passes
+        IndexModel([('expires_at', ASCENDING)], expireAfterSeconds=0),
+        IndexModel([('client_id', ASCENDING), ('status', ASCENDING), ('created_at', DESCENDING)]),
+    ]
+    
+    @staticmethod
+    def create(client_id, client_name, invoice_ids, subtotal, final_amount,
+               coupon_code=None, coupon_discount=0, coupon_id=None,
+               owner_phone=None, created_by=None, expires_in_hours=24):
+        """Create new pending payment request
+        
+        Pending requests carry expires_at and are purged by its TTL index;
+        completed requests drop it and are kept.
+        """
+        now = datetime.now(timezone.utc)
+        payment_data = {
+            '_id': str(uuid.uuid4()),
+            'client_id': client_id,
+            'client_name': client_name,
+            'invoice_ids': invoice_ids,
+            'subtotal': subtotal,
+            'coupon_code': coupon_code,
+            'coupon_discount': coupon_discount,
+            'coupon_id': coupon_id,
+            'final_amount': final_amount,
+            'owner_phone': owner_phone,
+            'status': PaymentRequest.STATUS_PENDING,
+            'created_by': created_by,
+            'created_at': now,
+            'expires_at': now + timedelta(hours=expires_in_hours),
+            'completed_at': None
+        }
+        
+        db = get_db()
+        db.payment_requests.insert_one(payment_data)
+        return payment_data['_id']
+    
+    @staticmethod
+    def get_by_id(payment_id, client_id=None):
+        """Get payment request by ID, optionally scoped to a client"""
+        if not payment_id:
+            return None
+        query = {'_id': payment_id}
+        if client_id:
+            query['client_id'] = client_id
+        db = get_db()
+        return db.payment_requests.find_one(query)
+    
+    @staticmethod
+    def mark_completed(payment_id, client_id=None, session=None):
+        """Move a pending request to COMPLETED
+        
+        Returns:
+            dict: the request as it was while pending, or None if it was
+            missing, expired or already completed
+        """
+        query = {
+            '_id': payment_id,
+            'status': PaymentRequest.STATUS_PENDING,
+            'expires_at': {'$gt': datetime.now(timezone.utc)}
+        }
+        if client_id:
+            query['client_id'] = client_id
+        
+        db = get_db()
+        return db.payment_requests.find_one_and_update(
+            query,
+            {
+                '$set': {
+                    'status': PaymentRequest.STATUS_COMPLETED,
+                    'completed_at': datetime.now(timezone.utc)
+                },
+                '$unset': {'expires_at': ''}
+            },
+            return_document=ReturnDocument.BEFORE,
+            session=session
+        )
+    
+    @staticmethod
+    def reopen(payment):
+        """Put a request returned by mark_completed back to PENDING"""
+        db = get_db()
+        db.payment_requests.update_one(
+            {'_id': payment['_id'], 'status': PaymentRequest.STATUS_COMPLETED},
+            {'$set': {
+                'status': PaymentRequest.STATUS_PENDING,
+                'completed_at': None,
+                'expires_at': payment['expires_at']
+            }}
+        )
+    
+    @staticmethod
+    def cancel(payment_id, client_id=None):
+        """Cancel a pending request"""
+        query = {'_id': payment_id, 'status': PaymentRequest.STATUS_PENDING}
+        if client_id:
+            query['client_id'] = client_id
+        
+        db = get_db()
+        result = db.payment_requests.update_one(
+            query,
+            {'$set': {'status': PaymentRequest.STATUS_CANCELLED}}
+        )
+        return result.modified_count > 0
@@ -1,11 +1,36 @@
 from datetime import datetime, timezone
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel, ReturnDocument, UpdateOne
 from app import get_db
+from app.models.counter import Counter
+from app.utils.cache import TTLCache
+from app.utils import search
+from app.utils.query_plans import FULL_SCAN
 
 
 class Product:
     """Product model"""
     
+    COLLECTION = 'products'
+    INDEXES = [
+        # Active listings/search/counts, sorted by name
+        IndexModel([('is_active', ASCENDING), ('name', ASCENDING)]),
+        IndexModel([('name', ASCENDING)]),
+        # Word prefixes maintained on write, see app.utils.search
+        IndexModel([('search_prefixes', ASCENDING), ('is_active', ASCENDING)]),
+        IndexModel([('search_name', ASCENDING), ('is_active', ASCENDING)]),
+    ]
+    
+    # Searchable fields, most relevant first
+    SEARCH_FIELDS = ('name', 'hsn')
+    
+    # Process-local catalog cache, configured from PRODUCT_CACHE_* in create_app.
+    # Entries are discarded whenever the shared catalog version moves, so a
+    # product changed in one worker is never served stale by another.
+    cache = TTLCache(maxsize=5000, ttl=300)
+    CATALOG_VERSION = 'product_catalog'
+    _cache_version = None
+    
     @staticmethod
     def create(name, description, hsn, rate, tax_rate):
         """Create new product"""
@@ -18,9 +43,11 @@ class Product:
             'is_active': True,
             'created_at': datetime.now(timezone.utc)
         }
+        product_data.update(Product.search_keys(product_data))
         
         db = get_db()
         result = db.products.insert_one(product_data)
+        Product.invalidate_cache(result.inserted_id)
         return str(result.inserted_id)
     
     @staticmethod
@@ -34,6 +61,60 @@ class Product:
         except:
             return None
     
+    @staticmethod
+    def get_many(product_ids):
+        """Get several products by ID, from the catalog cache where possible
+        
+        Costs one catalog version check plus at most one $in query.
+        
+        Returns:
+            dict: {str(id): document} for the IDs that exist
+        """
+        keys = {str(product_id) for product_id in product_ids if product_id}
+        if not keys:
+            return {}
+        
+        Product._sync_cache()
+        products = {}
+        missing = []
+        for key in keys:
+            product = Product.cache.get(key)
+            if product is None:
+                missing.append(key)
+            else:
+                products[key] = product
+        
+        object_ids = []
+        for key in missing:
+            try:
+                object_ids.append(ObjectId(key))
+            except Exception:
+                continue
+        if object_ids:
+            db = get_db()
+            for product in db.products.find({'_id': {'$in': object_ids}}):
+                key = str(product['_id'])
+                Product.cache.set(key, product)
+                products[key] = product
+        
+        # Hand out copies so callers can't mutate cached documents
+        return {key: dict(product) for key, product in products.items()}
+    
+    @staticmethod
+    def _sync_cache():
+        """Drop cached products if any worker has changed the catalog"""
+        version = Counter.current(Product.CATALOG_VERSION)
+        if version != Product._cache_version:
+            Product.cache.clear()
+            Product._cache_version = version
+    
+    @staticmethod
+    def invalidate_cache(product_id=None):
+        """Bump the shared catalog version after a product changes"""
+        Counter.reserve(Product.CATALOG_VERSION)
+        if product_id:
+            Product.cache.delete(str(product_id))
+    
     @staticmethod
     def get_all(active_only=True):
         """Get all products"""
@@ -58,10 +139,24 @@ class Product:
         
         if update_data:
             db = get_db()
-            db.products.update_one(
-                {'_id': ObjectId(product_id)},
-                {'$set': update_data}
-            )
+            if any(field in update_data for field in Product.SEARCH_FIELDS):
+                product = db.products.find_one_and_update(
+                    {'_id': ObjectId(product_id)},
+                    {'$set': update_data},
+                    projection={field: 1 for field in Product.SEARCH_FIELDS},
+                    return_document=ReturnDocument.AFTER
+                )
+                if product:
+                    db.products.update_one(
+                        {'_id': product['_id']},
+                        {'$set': Product.search_keys(product)}
+                    )
+            else:
+                db.products.update_one(
+                    {'_id': ObjectId(product_id)},
+                    {'$set': update_data}
+                )
+            Product.invalidate_cache(product_id)
     
     @staticmethod
     def deactivate(product_id):
@@ -71,18 +166,40 @@ class Product:
             {'_id': ObjectId(product_id)},
             {'$set': {'is_active': False}}
         )
+        Product.invalidate_cache(product_id)
+    
+    @staticmethod
+    def search_keys(product):
+        """search_prefixes and search_name for a product document"""
+        return search.search_keys(*(product.get(field) for field in Product.SEARCH_FIELDS))
     
     @staticmethod
-    def search(query):
-        """Search products by name"""
+    def search(query, limit=search.DEFAULT_LIMIT):
+        """Search active products by name or HSN code
+        
+        Matches products with a word starting with each query word, ranked
+        by relevance. Names equal to or starting with the query are always
+        considered; see search.find_candidates().
+        """
         db = get_db()
-        return list(db.products.find({
-            'name': {'$regex': query, '$options': 'i'},
-            'is_active': True
-        }).sort('name', 1))
-
+        candidates = search.find_candidates(db.products, query, is_active=True)
+        return search.rank(candidates, query, Product.SEARCH_FIELDS, limit)
+    
     @staticmethod
-    def get_all():
-        """Get all products"""
+    def reindex_search(batch_size=500):
+        """Rebuild search_prefixes and search_name for every product, returning the count"""
         db = get_db()
-        return list(db.products.find().sort('name', 1))
\ No newline at end of file
+        projection = {field: 1 for field in Product.SEARCH_FIELDS}
+        updates = []
+        count = 0
+        for product in db.products.find({}, projection, comment=FULL_SCAN).batch_size(batch_size):
+            updates.append(UpdateOne({'_id': product['_id']},
+                                     {'$set': Product.search_keys(product)}))
+            if len(updates) >= batch_size:
+                db.products.bulk_write(updates, ordered=False)
+                count += len(updates)
+                updates = []
+        if updates:
+            db.products.bulk_write(updates, ordered=False)
+            count += len(updates)
+        return count
@@ -1,7 +1,9 @@
 from datetime import datetime, timezone
 from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
 from app import get_db
-import bcrypt
+from app.utils.cache import TTLCache
+from app.utils.passwords import password_hasher
 
 
 class User:
@@ -10,10 +12,21 @@ class User:
     ROLE_OWNER = 'OWNER'
     ROLE_CLIENT = 'CLIENT'
     
+    COLLECTION = 'users'
+    INDEXES = [
+        IndexModel([('email', ASCENDING)], unique=True),
+        # Only client users carry a client_id; owners store null
+        IndexModel([('client_id', ASCENDING)],
+                   partialFilterExpression={'client_id': {'$type': 'objectId'}}),
+    ]
+    
+    # Process-local identity cache, configured from USER_CACHE_* in create_app
+    cache = TTLCache(maxsize=1024, ttl=30)
+    
     @staticmethod
     def create(name, email, password, role, client_id=None):
         """Create new user"""
-        password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        password_hash = password_hasher.hash(password)
         
         user_data = {
             'name': name,
@@ -40,6 +53,45 @@ class User:
         except:
             return None
     
+    @staticmethod
+    def get_cached(user_id):
+        """Get user by ID, served from the identity cache when fresh"""
+        if not user_id:
+            return None
+        key = str(user_id)
+        user = User.cache.get(key)
+        if user is None:
+            user = User.get_by_id(key)
+            if user is None:
+                return None
+            User.cache.set(key, user)
+        # Hand out a copy so callers can't mutate the cached document
+        return dict(user)
+    
+    @staticmethod
+    def invalidate_cache(user_id):
+        """Drop cached copy of a user after it changes"""
+        if user_id:
+            User.cache.delete(str(user_id))
+    
+    @staticmethod
+    def get_many(user_ids):
+        """Get several users by ID in one $in query
+        
+        Returns:
+            dict: {str(id): document} for the IDs that exist
+        """
+        object_ids = []
+        for user_id in set(user_ids):
+            try:
+                object_ids.append(ObjectId(user_id))
+            except Exception:
+                continue
+        if not object_ids:
+            return {}
+        db = get_db()
+        return {str(doc['_id']): doc for doc in db.users.find({'_id': {'$in': object_ids}})}
+    
     @staticmethod
     def get_by_email(email):
         """Get user by email"""
@@ -52,31 +104,69 @@ class User:
         db = get_db()
         return db.users.find_one({'client_id': ObjectId(client_id)})
     
+    @staticmethod
+    def get_with_client(client_id):
+        """Get a client's user with its client document joined in one query
+        
+        Returns:
+            dict: the user with the client under 'client' (None if the
+            client is missing), or None if there is no such user
+        """
+        db = get_db()
+        users = list(db.users.aggregate([
+            {'$match': {'client_id': ObjectId(client_id)}},
+            {'$limit': 1},
+            {'$lookup': {
+                'from': 'clients',
+                'localField': 'client_id',
+                'foreignField': '_id',
+                'as': 'client'
+            }},
+            {'$addFields': {'client': {'$arrayElemAt': ['$client', 0]}}}
+        ]))
+        return users[0] if users else None
+    
     @staticmethod
     def verify_password(user, password):
         """Verify user password"""
         if not user or not password:
             return False
-        return bcrypt.checkpw(password.encode('utf-8'), user['password_hash'])
+        return password_hasher.verify(password, user['password_hash'])
     
     @staticmethod
     def update_password(user_id, new_password):
         """Update user password"""
-        password_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt())
+        password_hash = password_hasher.hash(new_password)
         db = get_db()
         db.users.update_one(
             {'_id': ObjectId(user_id)},
             {'$set': {'password_hash': password_hash}}
         )
+        User.invalidate_cache(user_id)
     
     @staticmethod
     def authenticate(email, password):
-        """Authenticate user"""
+        """Authenticate user
+        
+        A hash made at an outdated bcrypt cost is replaced on success.
+        """
         user = User.get_by_email(email)
         if user and user['is_active'] and User.verify_password(user, password):
+            if password_hasher.needs_rehash(user['password_hash']):
+                User.rehash_password(user, password)
             return user
         return None
     
+    @staticmethod
+    def rehash_password(user, password):
+        """Store a hash at the configured cost, unless the password changed meanwhile"""
+        db = get_db()
+        db.users.update_one(
+            {'_id': user['_id'], 'password_hash': user['password_hash']},
+            {'$set': {'password_hash': password_hasher.hash(password)}}
+        )
+        User.invalidate_cache(user['_id'])
+    
     @staticmethod
     def deactivate(user_id):
         """Deactivate user"""
@@ -85,6 +175,7 @@ class User:
             {'_id': ObjectId(user_id)},
             {'$set': {'is_active': False}}
         )
+        User.invalidate_cache(user_id)
     
     @staticmethod
     def is_owner(user):
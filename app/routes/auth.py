@@ -1,7 +1,9 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app
 from app.models.user import User
 from app.models.magic_link import MagicLink
 from app.models.client import Client
+from app.models.login_attempt import LoginAttempt
+from app.utils.passwords import PasswordHasherBusy
 from app import get_db
 from bson import ObjectId
 
@@ -107,8 +109,23 @@ def login():
             flash('Email and password are required', 'error')
             return render_template('auth/login.html')
         
-        user = User.authenticate(email, password)
+        # Refuse before hashing so credential stuffing can't burn CPU
+        config = current_app.config
+        window = config['LOGIN_THROTTLE_WINDOW']
+        if LoginAttempt.is_blocked(request.remote_addr, email,
+                                   config['LOGIN_MAX_FAILURES_PER_IP'],
+                                   config['LOGIN_MAX_FAILURES_PER_EMAIL'], window):
+            flash(f'Too many failed login attempts. Please try again in {window // 60} minutes.', 'error')
+            return render_template('auth/login.html'), 429
+        
+        try:
+            user = User.authenticate(email, password)
+        except PasswordHasherBusy as e:
+            flash(str(e), 'error')
+            return render_template('auth/login.html'), 503
+        
         if user:
+            LoginAttempt.reset(email, window)
             session['user_id'] = str(user['_id'])
             session['user_role'] = user['role']
             session.permanent = True
@@ -116,6 +133,7 @@ def login():
             flash(f'Welcome back, {user["name"]}!', 'success')
             return redirect(url_for('dashboard.index'))
         else:
+            LoginAttempt.record_failure(request.remote_addr, email, window)
             flash('Invalid email or password', 'error')
     
     return render_template('auth/login.html')
@@ -137,28 +155,22 @@ def magic_login(token):
         flash('You are already logged in', 'info')
         return redirect(url_for('dashboard.index'))
     
-    # Validate the token
-    validation = MagicLink.validate_token(token)
+    # Validate and use the token in one atomic update
+    validation = MagicLink.consume(token, request.remote_addr)
     
     if not validation['valid']:
         flash(validation['error'], 'error')
         return redirect(url_for('auth.login'))
     
-    # Get the client
-    client = Client.get_by_id(validation['client_id'])
-    if not client:
-        flash('Client account not found', 'error')
-        return redirect(url_for('auth.login'))
-    
-    # Get the user account for this client
-    user = User.get_by_client_id(validation['client_id'])
+    # Get the client's user account with the client joined in
+    user = User.get_with_client(validation['client_id'])
     if not user:
         flash('User account not found for this client', 'error')
         return redirect(url_for('auth.login'))
     
-    # Mark the magic link as used
-    ip_address = request.remote_addr
-    MagicLink.mark_as_used(token, ip_address)
+    if not user.get('client'):
+        flash('Client account not found', 'error')
+        return redirect(url_for('auth.login'))
     
     # Log the user in
     session['user_id'] = str(user['_id'])
@@ -35,12 +35,13 @@ def view_client(client_id):
     
     # Get client's invoices
     from app.models.invoice import Invoice
-    invoices = Invoice.get_all(client_id=client_id)
+    invoices, next_cursor = Invoice.get_page(client_id=client_id)
     
     return render_template('clients/view.html', 
                          client=client, 
                          user=user, 
-                         invoices=invoices)
+                         invoices=invoices,
+                         has_more_invoices=next_cursor is not None)
 
 
 @clients_bp.route('/create', methods=['GET', 'POST'])
@@ -2,6 +2,7 @@ from flask import Blueprint, render_template, session, request, redirect, url_fo
 from app.utils.auth import login_required, get_current_user, owner_required
 from app.models.user import User
 from app.models.invoice import Invoice
+from app.models.invoice_stats import InvoiceStats
 from app.models.coupon import Coupon
 from app.utils.permissions import filter_client_invoices
 from flask import current_app
@@ -29,27 +30,27 @@ def render_owner_dashboard(user):
     db = current_app.db
     total_clients = db.clients.count_documents({'is_active': True})
     total_products = db.products.count_documents({'is_active': True})
-    total_invoices = db.invoices.count_documents({})
-    draft_invoices = db.invoices.count_documents({'status': Invoice.STATUS_DRAFT})
-    issued_invoices = db.invoices.count_documents({'status': Invoice.STATUS_ISSUED})
-    paid_invoices = db.invoices.count_documents({'status': Invoice.STATUS_PAID})
-
-    recent_invoices = Invoice.get_all()[:10]
-
-    pipeline = [
-        {'$match': {'status': Invoice.STATUS_PAID}},
-        {'$group': {'_id': None, 'total': {'$sum': '$total'}}}
-    ]
-    revenue_result = list(db.invoices.aggregate(pipeline))
-    total_revenue = revenue_result[0]['total'] if revenue_result else 0
+    
+    # Materialized stats; fall back to a single $facet pass when missing/stale
+    stats = InvoiceStats.get(max_age=current_app.config['INVOICE_STATS_MAX_AGE'])
+    if stats:
+        recent_invoices, _ = Invoice.get_page(limit=10)
+    else:
+        summary = Invoice.get_dashboard_summary(recent_limit=10)
+        stats = InvoiceStats.save(summary['by_status'])
+        recent_invoices = summary['recent']
+    
+    by_status = stats['by_status']
+    empty = {'count': 0, 'total': 0}
+    total_invoices = stats['count']
+    draft_invoices = by_status.get(Invoice.STATUS_DRAFT, empty)['count']
+    issued_invoices = by_status.get(Invoice.STATUS_ISSUED, empty)['count']
+    paid_invoices = by_status.get(Invoice.STATUS_PAID, empty)['count']
+    
+    total_revenue = by_status.get(Invoice.STATUS_PAID, empty)['total']
     
     # Calculate pending amount (issued invoices)
-    pending_pipeline = [
-        {'$match': {'status': Invoice.STATUS_ISSUED}},
-        {'$group': {'_id': None, 'total': {'$sum': '$total'}}}
-    ]
-    pending_result = list(db.invoices.aggregate(pending_pipeline))
-    pending_amount = pending_result[0]['total'] if pending_result else 0
+    pending_amount = by_status.get(Invoice.STATUS_ISSUED, empty)['total']
     
     return render_template('dashboard/owner.html',
                          total_clients=total_clients,
@@ -67,19 +68,21 @@ def render_client_dashboard(user):
     """Render client dashboard"""
     client_id = user.get('client_id')
     
-    # Get client's invoices
-    all_invoices = Invoice.get_all(client_id=str(client_id))
+    # Statistics are computed server-side, excluding invoices that have
+    # been merged into another invoice
+    totals = Invoice.get_status_totals(client_id=str(client_id), exclude_merged=True)
+    issued = totals.get(Invoice.STATUS_ISSUED, {'count': 0, 'total': 0})
+    paid = totals.get(Invoice.STATUS_PAID, {'count': 0, 'total': 0})
     
-    # Filter out merged invoices (those that have been merged into another invoice)
-    invoices = [inv for inv in all_invoices if not inv.get('merged_into')]
+    total_invoices = sum(row['count'] for row in totals.values())
+    issued_invoices = issued['count']
+    paid_invoices = paid['count']
     
-    # Calculate statistics
-    total_invoices = len(invoices)
-    issued_invoices = len([inv for inv in invoices if inv['status'] == Invoice.STATUS_ISSUED])
-    paid_invoices = len([inv for inv in invoices if inv['status'] == Invoice.STATUS_PAID])
+    total_amount = issued['total'] + paid['total']
+    pending_amount = issued['total']
     
-    total_amount = sum(inv['total'] for inv in invoices if inv['status'] in [Invoice.STATUS_ISSUED, Invoice.STATUS_PAID])
-    pending_amount = sum(inv['total'] for inv in invoices if inv['status'] == Invoice.STATUS_ISSUED)
+    # Only the most recent page is listed; the full history lives in the invoice list
+    invoices, _ = Invoice.get_page(client_id=str(client_id), exclude_merged=True)
     
     return render_template('dashboard/client.html',
                          total_invoices=total_invoices,
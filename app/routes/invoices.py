@@ -1,14 +1,20 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, jsonify, current_app, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, jsonify, current_app, session, make_response, send_file
 from app.utils.auth import login_required, owner_required, get_current_user
 from app.models.invoice import Invoice
 from app.models.client import Client
 from app.models.product import Product
 from app.models.coupon import Coupon
 from app.services.invoice_service import InvoiceService
+from app.services.bulk_invoice_service import BulkInvoiceService
+from app.services.pdf_service import PdfService
+from app.services.settlement_service import SettlementService
+from app.models.bulk_job import BulkJob
+from app.models.payment_request import PaymentRequest
 from app.utils.permissions import can_view_invoice, can_edit_invoice, can_delete_invoice
+from app.utils.loader import get_loader
 from datetime import datetime, timezone
-from app import get_db
 from bson import ObjectId
+import io
 import uuid
 
 invoices_bp = Blueprint('invoices', __name__)
@@ -29,7 +35,13 @@ def list_invoices():
     if User.is_client(user):
         client_id = str(user['client_id'])
     
-    invoices = Invoice.get_all(status=status, client_id=client_id)
+    # Keyset pagination
+    after = request.args.get('after')
+    per_page = request.args.get('per_page', Invoice.DEFAULT_PAGE_SIZE, type=int)
+    per_page = max(1, min(per_page, Invoice.MAX_PAGE_SIZE))
+    
+    invoices, next_cursor = Invoice.get_page(status=status, client_id=client_id,
+                                             after=after, limit=per_page)
     
     # Get clients for filter
     clients = Client.get_all() if User.is_owner(user) else []
@@ -38,7 +50,10 @@ def list_invoices():
                          invoices=invoices, 
                          clients=clients,
                          current_status=status,
-                         current_client=client_id)
+                         current_client=client_id,
+                         per_page=per_page,
+                         is_first_page=not after,
+                         next_cursor=next_cursor)
 
 
 @invoices_bp.route('/<invoice_id>')
@@ -115,6 +130,68 @@ def create_invoice():
                          products=products)
 
 
+@invoices_bp.route('/bulk', methods=['POST'])
+@owner_required
+def bulk_create_invoices():
+    """Start a bulk invoice generation job from a CSV/JSON batch"""
+    user = get_current_user()
+    upload = request.files.get('file')
+    
+    try:
+        if upload:
+            content = upload.read().decode('utf-8-sig')
+            if upload.filename.lower().endswith('.csv'):
+                records = BulkInvoiceService.parse_csv(content)
+            else:
+                records = BulkInvoiceService.parse_json(content)
+            issue = request.form.get('issue') in ('1', 'true', 'on')
+        else:
+            payload = request.get_json(silent=True)
+            if payload is None:
+                return jsonify({'success': False, 'message': 'Upload a CSV/JSON file or post JSON records'}), 400
+            records = BulkInvoiceService.parse_json(payload)
+            issue = isinstance(payload, dict) and bool(payload.get('issue'))
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if not records:
+        return jsonify({'success': False, 'message': 'Batch is empty'}), 400
+    
+    max_records = current_app.config['BULK_INVOICE_MAX_RECORDS']
+    if len(records) > max_records:
+        return jsonify({'success': False, 'message': f'Batch exceeds {max_records} invoices'}), 400
+    
+    job_id = BulkInvoiceService.start_job(records, issue=issue, created_by=str(user['_id']))
+    
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status_url': url_for('invoices.bulk_job_status', job_id=job_id)
+    }), 202
+
+
+@invoices_bp.route('/bulk/<job_id>')
+@owner_required
+def bulk_job_status(job_id):
+    """Report progress of a bulk invoice job"""
+    job = BulkJob.get_by_id(job_id)
+    
+    if not job:
+        return jsonify({'success': False, 'message': 'Job not found'}), 404
+    
+    return jsonify({
+        'success': True,
+        'job_id': str(job['_id']),
+        'status': job['status'],
+        'total': job['total'],
+        'processed': job['processed'],
+        'succeeded': job['succeeded'],
+        'failed': job['failed'],
+        'errors': job['errors'],
+        'result': job['result']
+    })
+
+
 @invoices_bp.route('/<invoice_id>/edit', methods=['GET', 'POST'])
 @owner_required
 def edit_invoice(invoice_id):
@@ -160,7 +237,8 @@ def edit_invoice(invoice_id):
     
     # GET request
     client = Client.get_by_id(str(invoice['client_id']))
-    products = Product.get_all()
+    # Deactivated products stay selectable for lines that already use them
+    products = Product.get_all(active_only=False)
     
     return render_template('invoices/edit.html', 
                          invoice=invoice, 
@@ -241,32 +319,60 @@ def print_invoice(invoice_id):
     if not can_view_invoice(user, invoice):
         abort(403)
     
-    # Get client from snapshot if issued, otherwise get current
-    if invoice['status'] in [Invoice.STATUS_ISSUED, Invoice.STATUS_PAID] and invoice.get('snapshot'):
-        client = invoice['snapshot']['client']
-        company_info = {
-            'name': invoice['snapshot']['company_name'],
-            'gstin': invoice['snapshot']['company_gstin'],
-            'address': invoice['snapshot']['company_address'],
-            'email': invoice['snapshot']['company_email'],
-            'phone': invoice['snapshot']['company_phone']
-        }
+    if not PdfService.is_immutable(invoice):
+        return PdfService.render_html(invoice)
+    
+    # Issued/paid invoices never change, so revalidation skips rendering
+    etag = PdfService.cache_key(invoice)
+    if etag in request.if_none_match:
+        response = make_response('', 304)
     else:
-        # For draft invoices or merged invoices without snapshot
-        client = Client.get_by_id(str(invoice['client_id']))
-        from flask import current_app
-        company_info = {
-            'name': current_app.config['COMPANY_NAME'],
-            'gstin': current_app.config['COMPANY_GSTIN'],
-            'address': current_app.config['COMPANY_ADDRESS'],
-            'email': current_app.config['COMPANY_EMAIL'],
-            'phone': current_app.config['COMPANY_PHONE']
-        }
-    
-    return render_template('invoices/invoice_v1.html', 
-                         invoice=invoice, 
-                         client=client,
-                         company_info=company_info)
+        response = make_response(PdfService.render_html(invoice))
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+@invoices_bp.route('/<invoice_id>/pdf')
+@login_required
+def download_invoice_pdf(invoice_id):
+    """Download invoice as PDF"""
+    user = get_current_user()
+    invoice = Invoice.get_by_id(invoice_id)
+    
+    if not invoice:
+        abort(404)
+    
+    if not can_view_invoice(user, invoice):
+        abort(403)
+    
+    download_name = f"{invoice['invoice_no']}.pdf".replace('/', '-')
+    
+    try:
+        if not PdfService.is_immutable(invoice):
+            return send_file(io.BytesIO(PdfService.render_pdf(invoice)),
+                             mimetype='application/pdf',
+                             download_name=download_name)
+        
+        etag = PdfService.cache_key(invoice)
+        if etag in request.if_none_match:
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+        
+        # send_file handles If-None-Match and Range requests against the cached file
+        response = send_file(PdfService.get_cached_pdf(invoice),
+                             mimetype='application/pdf',
+                             download_name=download_name,
+                             etag=etag,
+                             conditional=True)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+    except RuntimeError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('invoices.print_invoice', invoice_id=invoice_id))
 
 
 @invoices_bp.route('/payments/summary')
@@ -279,15 +385,18 @@ def payment_summary():
     # Get pending invoices for client
     if User.is_client(user):
         client_id = str(user['client_id'])
-        invoices = Invoice.get_all(status=Invoice.STATUS_ISSUED, client_id=client_id)
+        invoices = Invoice.get_all(status=Invoice.STATUS_ISSUED, client_id=client_id,
+                                   projection=Invoice.LIST_PROJECTION)
     else:
         # Owner can see all pending invoices
-        invoices = Invoice.get_all(status=Invoice.STATUS_ISSUED)
+        invoices = Invoice.get_all(status=Invoice.STATUS_ISSUED,
+                                   projection=Invoice.LIST_PROJECTION)
     
-    # Populate client data for each invoice
+    # Populate client data for each invoice with one batched lookup
+    clients = get_loader('client').load_many(inv['client_id'] for inv in invoices if 'client_id' in inv)
     for invoice in invoices:
         if 'client_id' in invoice:
-            invoice['client'] = Client.get_by_id(str(invoice['client_id']))
+            invoice['client'] = clients.get(str(invoice['client_id']))
     
     # Calculate totals
     total_amount = sum(inv.get('total', 0) for inv in invoices)
@@ -320,7 +429,7 @@ def validate_coupon():
     
     # Format response for frontend
     if result['valid']:
-        coupon = Coupon.get_by_code(code)
+        coupon = result['coupon']
         discount_type = coupon['discount_type']
         discount_amount = result['discount']
         
@@ -351,7 +460,6 @@ def process_payment():
     """Process payment - create payment request and redirect to confirmation"""
     from app.models.user import User
     from bson import ObjectId
-    import uuid
     
     user = get_current_user()
     
@@ -392,28 +500,30 @@ def process_payment():
             result = Coupon.validate_coupon(coupon_code, amount, user_id=user_id)
             if result['valid']:
                 coupon_discount = result['discount']
-                coupon = Coupon.get_by_code(coupon_code)
-                coupon_id = str(coupon['_id'])
+                coupon_id = result['coupon_id']
             else:
                 return jsonify({'success': False, 'message': result.get('error', 'Invalid coupon')}), 400
         
         final_amount = max(0, amount - coupon_discount)
         
-        # Store payment request in session
-        payment_id = str(uuid.uuid4())
-        session[f'payment_{payment_id}'] = {
-            'client_id': client_id,
-            'client_name': client.get('company_name', client.get('name', 'Client')),
-            'invoice_ids': [str(inv['_id']) for inv in invoices],
-            'subtotal': amount,
-            'coupon_code': coupon_code,
-            'coupon_discount': coupon_discount,
-            'coupon_id': coupon_id,
-            'final_amount': final_amount,
-            'created_at': datetime.now(),
-            'owner_phone': current_app.config.get('COMPANY_PHONE', '9876543210')
-        }
-        session.modified = True
+        # Store payment request in its own collection
+        payment_id = PaymentRequest.create(
+            client_id=client_id,
+            client_name=client.get('company_name', client.get('name', 'Client')),
+            invoice_ids=[str(inv['_id']) for inv in invoices],
+            subtotal=amount,
+            coupon_code=coupon_code,
+            coupon_discount=coupon_discount,
+            coupon_id=coupon_id,
+            final_amount=final_amount,
+            owner_phone=current_app.config.get('COMPANY_PHONE', '9876543210'),
+            created_by=str(user['_id']),
+            expires_in_hours=current_app.config['PAYMENT_REQUEST_TTL_HOURS']
+        )
+        
+        # Drop payment requests older releases kept in the session
+        for key in [key for key in session.keys() if key.startswith('payment_')]:
+            session.pop(key, None)
         
         return jsonify({
             'success': True,
@@ -425,13 +535,22 @@ def process_payment():
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+def _payment_client_scope():
+    """Client users may only see their own payment requests; owners see all"""
+    from app.models.user import User
+    user = get_current_user()
+    if User.is_owner(user):
+        return None
+    return str(user.get('client_id'))
+
+
 @invoices_bp.route('/payments/confirm/<payment_id>')
 @login_required
 def payment_confirmation(payment_id):
     """Show payment confirmation with UPI QR code"""
-    payment_data = session.get(f'payment_{payment_id}')
+    payment_data = PaymentRequest.get_by_id(payment_id, client_id=_payment_client_scope())
     
-    if not payment_data:
+    if not payment_data or payment_data['status'] != PaymentRequest.STATUS_PENDING:
         flash('Payment request not found or expired', 'error')
         return redirect(url_for('invoices.list_invoices'))
     
@@ -457,26 +576,37 @@ def payment_confirmation(payment_id):
 def payment_success():
     """Show payment success page (when owner marks as paid)"""
     payment_id = request.args.get('payment_id')
-    payment_data = session.get(f'payment_{payment_id}')
     
-    if not payment_data:
+    # Completes the request and pays its invoices at most once
+    try:
+        settlement = SettlementService.settle(payment_id, client_id=_payment_client_scope())
+    except ValueError as e:
+        flash(str(e), 'error')
+        return redirect(url_for('invoices.payment_confirmation', payment_id=payment_id))
+    
+    if not settlement:
         flash('Payment request not found', 'error')
         return redirect(url_for('invoices.list_invoices'))
     
-    # Mark invoices as paid
-    for invoice_id in payment_data.get('invoice_ids', []):
-        Invoice.update(invoice_id, status=Invoice.STATUS_PAID, paid_at=datetime.now(timezone.utc))
-    
-    # Increment coupon usage if applied (with user_id)
-    if payment_data.get('coupon_id'):
-        user_id = payment_data.get('client_id')
-        Coupon.increment_use(payment_data['coupon_id'], user_id=user_id)
-    
-    # Clear from session
-    session.pop(f'payment_{payment_id}', None)
-    session.modified = True
-    
-    return render_template('invoices/payment_success.html', payment_data=payment_data)
+    payment_data = settlement['payment']
+    if settlement['paid'] < len(settlement['outcomes']):
+        flash(f"{len(settlement['outcomes']) - settlement['paid']} invoice(s) were already paid or no longer payable", 'warning')
+    
+    payment = {
+        'client_id': payment_data['client_id'],
+        'client_name': payment_data['client_name'],
+        'invoice_count': settlement['paid'],
+        'subtotal': payment_data['subtotal'],
+        'discount': payment_data.get('coupon_discount') or 0,
+        'coupon_code': payment_data.get('coupon_code'),
+        'final_amount': payment_data['final_amount']
+    }
+    
+    return render_template('invoices/payment_success.html',
+                         payment_data=payment_data,
+                         payment=payment,
+                         outcomes=settlement['outcomes'],
+                         now=datetime.now)
 
 
 @invoices_bp.route('/merge', methods=['GET', 'POST'])
@@ -521,8 +651,6 @@ def merge_invoices():
                 flash('Both invoices must belong to the same client', 'error')
                 return redirect(url_for('invoices.merge_invoices'))
             
-            client = Client.get_by_id(client_id_1)
-            
             # Calculate merged amount
             if custom_amount:
                 merged_amount = float(custom_amount)
@@ -539,10 +667,9 @@ def merge_invoices():
                 coupon_result = Coupon.validate_coupon(coupon_code, merged_amount, user_id=client_id_1)
                 if coupon_result['valid']:
                     coupon_discount = coupon_result['discount']
-                    coupon = Coupon.get_by_code(coupon_code)
-                    coupon_id = str(coupon['_id'])
-                    discount_type = coupon['discount_type']
-                    discount_value = coupon['discount_value']
+                    coupon_id = coupon_result['coupon_id']
+                    discount_type = coupon_result['coupon']['discount_type']
+                    discount_value = coupon_result['coupon']['discount_value']
                 else:
                     flash(f'Invalid coupon: {coupon_result.get("error", "Unknown error")}', 'error')
                     return redirect(url_for('invoices.merge_invoices'))
@@ -550,7 +677,7 @@ def merge_invoices():
             final_amount = max(0, merged_amount - coupon_discount)
             
             # Generate new invoice number for merged invoice
-            new_invoice_number = Invoice.get_next_invoice_no('INV')
+            new_invoice_number = InvoiceService.next_invoice_no()
             
             # Create merged invoice
             merged_invoice = {
@@ -586,18 +713,23 @@ def merge_invoices():
                 'updated_at': datetime.now(timezone.utc)
             }
             
-            # Insert merged invoice
-            db = get_db()
-            result = db.invoices.insert_one(merged_invoice)
-            merged_invoice_id = str(result.inserted_id)
-            
-            # Mark original invoices as paid (since they're merged) and point to merged invoice
-            Invoice.update(invoice_id_1, status=Invoice.STATUS_PAID, paid_at=datetime.now(timezone.utc), merged_into=merged_invoice_id)
-            Invoice.update(invoice_id_2, status=Invoice.STATUS_PAID, paid_at=datetime.now(timezone.utc), merged_into=merged_invoice_id)
-            
-            # Increment coupon usage if applied
+            # Redeem the coupon first; this fails if it ran out meanwhile
             if coupon_id:
-                Coupon.increment_use(coupon_id, user_id=client_id_1)
+                Coupon.consume(coupon_id, user_id=client_id_1)
+            
+            try:
+                # Insert merged invoice
+                merged_invoice_id = Invoice.insert(merged_invoice)
+                
+                # Mark original invoices as paid (since they're merged) and point to merged invoice
+                paid_on = datetime.now(timezone.utc)
+                Invoice.update(invoice_id_1, status=Invoice.STATUS_PAID, paid_on=paid_on, merged_into=merged_invoice_id)
+                Invoice.update(invoice_id_2, status=Invoice.STATUS_PAID, paid_on=paid_on, merged_into=merged_invoice_id)
+            except Exception:
+                # Give the client their redemption back
+                if coupon_id:
+                    Coupon.release(coupon_id, user_id=client_id_1)
+                raise
             
             flash(f'Invoices merged successfully! New invoice #{new_invoice_number} created with combined amount ₹{final_amount:.2f}', 'success')
             return redirect(url_for('invoices.view_invoice', invoice_id=merged_invoice_id))
@@ -608,16 +740,17 @@ def merge_invoices():
     
     # GET request - show merge form
     # Get all issued invoices
-    issued_invoices = Invoice.get_all(status=Invoice.STATUS_ISSUED)
+    issued_invoices = Invoice.get_all(status=Invoice.STATUS_ISSUED,
+                                      projection=Invoice.LIST_PROJECTION)
     
     # Group by client
+    clients = get_loader('client').load_many(inv['client_id'] for inv in issued_invoices)
     invoices_by_client = {}
     for inv in issued_invoices:
         client_id = str(inv['client_id'])
-        client = Client.get_by_id(client_id)
         if client_id not in invoices_by_client:
             invoices_by_client[client_id] = {
-                'client': client,
+                'client': clients.get(client_id),
                 'invoices': []
             }
         invoices_by_client[client_id]['invoices'].append(inv)
@@ -14,7 +14,7 @@ def list_products():
     if search_query:
         products = Product.search(search_query)
     else:
-        products = Product.get_all()
+        products = Product.get_all(active_only=False)
     
     return render_template('products/list.html', products=products, search_query=search_query)
 
@@ -1,23 +1,24 @@
 from flask import Blueprint, render_template
-from app.models.product import Product
+from app.utils.page_cache import cached_page
 
 public_bp = Blueprint('public', __name__)
 
 
 @public_bp.route('/')
+@cached_page
 def index():
     """Public landing page"""
-    products = Product.get_all()
-    # print(products)
-    return render_template('public/index.html', products=products)
+    return render_template('public/index.html')
 
 
 @public_bp.route('/about')
+@cached_page
 def about():
     """About page"""
     return render_template('public/about.html')
 
 @public_bp.route('/infrastructure')
+@cached_page
 def infrastructure():
     """Infrastructure page"""
     return render_template('public/infrastructure.html')
@@ -25,12 +26,14 @@ def infrastructure():
 
 @public_bp.route('/free-invoice-maker')
 @public_bp.route('/invoice-maker')
+@cached_page
 def free_invoice_maker():
     """Free invoice maker page"""
     return render_template('public/free_invoice_maker.html')
 
 
 @public_bp.route('/contactus')
+@cached_page
 def contact():
     """Contact page"""
     return render_template('public/contact.html')
@@ -38,6 +41,7 @@ def contact():
 
 @public_bp.route('/careers')
 @public_bp.route('/carrers')
+@cached_page
 def careers():
     """Careers page"""
     return render_template('public/careers.html')
\ No newline at end of file
@@ -0,0 +1,36 @@
+from flask import Blueprint, Response, render_template, request, redirect, url_for, flash, stream_with_context
+from app.utils.auth import owner_required
+from app.services.report_service import ReportService
+
+reports_bp = Blueprint('reports', __name__)
+
+
+@reports_bp.route('/gst')
+@owner_required
+def gst_report():
+    """GST summary by HSN, tax rate and B2B/B2C; ?format=csv or json downloads it"""
+    try:
+        start, last_day = ReportService.parse_period(request.args.get('from'), request.args.get('to'))
+    except ValueError as e:
+        flash(f'Invalid report period: {str(e)}', 'error')
+        return redirect(url_for('reports.gst_report'))
+    
+    output = request.args.get('format', 'html')
+    filename = f"gst-report_{start:%Y-%m-%d}_{last_day:%Y-%m-%d}"
+    rows = ReportService.gst_rows(start, last_day)
+    
+    # Downloads stream as the aggregation cursor is read
+    if output == 'csv':
+        return Response(stream_with_context(ReportService.csv_lines(rows)), mimetype='text/csv',
+                        headers={'Content-Disposition': f'attachment; filename={filename}.csv'})
+    if output == 'json':
+        return Response(stream_with_context(ReportService.json_chunks(rows, start, last_day)),
+                        mimetype='application/json',
+                        headers={'Content-Disposition': f'attachment; filename={filename}.json'})
+    
+    rows = list(rows)
+    return render_template('reports/gst.html',
+                         rows=rows,
+                         totals=ReportService.totals(rows),
+                         start=start,
+                         last_day=last_day)
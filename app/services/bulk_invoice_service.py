@@ -0,0 +1,241 @@
+import csv
+import io
+import json
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import current_app
+from app.models.invoice import Invoice
+from app.models.client import Client
+from app.models.product import Product
+from app.models.bulk_job import BulkJob
+from app.services.invoice_service import InvoiceService
+from app.services.tax_service import TaxService
+
+
+class BulkInvoiceService:
+    """Service for generating many invoices from one CSV/JSON batch"""
+
+    # Largest quantity accepted on a line
+    MAX_QUANTITY = 1000000
+
+    @staticmethod
+    def parse_json(data):
+        """Parse JSON batch: [{'client_id', 'items': [{'product_id', 'quantity'}], 'ref'?}]
+
+        Accepts a JSON string, a list, or {'records': [...]}.
+        """
+        if isinstance(data, (str, bytes)):
+            try:
+                data = json.loads(data)
+            except ValueError:
+                raise ValueError('Batch is not valid JSON')
+        if isinstance(data, dict):
+            data = data.get('records')
+        if not isinstance(data, list):
+            raise ValueError('Batch must be a list of records')
+
+        records = []
+        for index, entry in enumerate(data, start=1):
+            if not isinstance(entry, dict):
+                entry = {}
+            client_id = entry.get('client_id')
+            items = entry.get('items') or []
+            records.append({
+                'row': index,
+                'ref': str(entry.get('ref') or f'record {index}'),
+                'client_id': str(client_id) if client_id is not None else '',
+                # prepare() reports a non-list as a row error
+                'items': items if isinstance(items, list) else None
+            })
+        return records
+
+    @staticmethod
+    def parse_csv(text):
+        """Parse CSV batch with columns client_id, product_id, quantity[, invoice_ref]
+
+        Lines sharing client_id and invoice_ref become one invoice.
+        """
+        reader = csv.DictReader(io.StringIO(text))
+        required = {'client_id', 'product_id', 'quantity'}
+        if not reader.fieldnames or not required.issubset(reader.fieldnames):
+            raise ValueError('CSV must have client_id, product_id and quantity columns')
+
+        records = {}
+        for line_no, row in enumerate(reader, start=2):
+            client_id = (row.get('client_id') or '').strip()
+            invoice_ref = (row.get('invoice_ref') or '').strip()
+            key = (client_id, invoice_ref)
+            if key not in records:
+                records[key] = {
+                    'row': line_no,
+                    'ref': invoice_ref or f'line {line_no}',
+                    'client_id': client_id,
+                    'items': []
+                }
+            records[key]['items'].append({
+                'product_id': (row.get('product_id') or '').strip(),
+                'quantity': (row.get('quantity') or '').strip()
+            })
+        return list(records.values())
+
+    @staticmethod
+    def prepare(records, issue=False):
+        """Validate records against pre-loaded client/product maps and build documents
+
+        Returns:
+            tuple: ([(record, invoice_doc)], [row error])
+        """
+        clients = Client.get_many(r['client_id'] for r in records if r['client_id'])
+        products = Product.get_many(
+            item.get('product_id') for r in records for item in r['items'] or []
+            if isinstance(item, dict)
+        )
+        # Like the create form, only active products can be invoiced
+        products = {product_id: product for product_id, product in products.items() if product.get('is_active')}
+
+        valid = []
+        errors = []
+        for record in records:
+            try:
+                client = clients.get(str(record['client_id']))
+                if not client or not client.get('is_active'):
+                    raise ValueError(f"Client {record['client_id']} not found")
+
+                if not isinstance(record['items'], list):
+                    raise ValueError('Items must be a list')
+
+                items_data = []
+                for item in record['items']:
+                    try:
+                        quantity = float(item['quantity'])
+                    except (KeyError, TypeError, ValueError):
+                        quantity = math.nan
+                    if not math.isfinite(quantity):
+                        raise ValueError('Each item needs a numeric quantity')
+                    if quantity <= 0:
+                        raise ValueError('Quantities must be greater than zero')
+                    if quantity > BulkInvoiceService.MAX_QUANTITY:
+                        raise ValueError(f'Quantities cannot exceed {BulkInvoiceService.MAX_QUANTITY:,}')
+                    items_data.append({'product_id': item.get('product_id'), 'quantity': quantity})
+                if not items_data:
+                    raise ValueError('At least one item is required')
+
+                items = InvoiceService.build_items(items_data, products)
+                valid.append((record, client, items))
+            except ValueError as e:
+                errors.append({'row': record['row'], 'ref': record['ref'], 'error': str(e)})
+
+        # Issued invoices split GST by place of supply; drafts are split at issue
+        supplies = [InvoiceService.place_of_supply(client) if issue else None for _, client, _ in valid]
+        inter_state = [supply['inter_state'] for supply in supplies] if issue else None
+
+        # One array pass over every line of the batch
+        all_totals = TaxService.calculate_batch_totals((items for _, _, items in valid), inter_state=inter_state)
+        prepared = []
+        for (record, client, items), totals, supply in zip(valid, all_totals, supplies):
+            issue_fields = InvoiceService.build_issue_fields(client, totals, supply) if issue else {}
+            invoice_doc = Invoice.build_document(
+                invoice_no=None,
+                client_id=record['client_id'],
+                items=items,
+                subtotal=totals['subtotal'],
+                tax_breakup=totals['tax_breakup'],
+                total=totals['total'],
+                **issue_fields
+            )
+            prepared.append((record, invoice_doc))
+
+        return prepared, errors
+
+    @staticmethod
+    def run(records, issue=False, workers=None, chunk_size=None, progress=None, job_id=None):
+        """Create invoices for a parsed batch
+
+        Valid records get invoice numbers from one contiguous block and are
+        inserted in chunks by a thread pool, each chunk with one unordered
+        insert_many. progress(n) is called as records are processed.
+
+        Returns:
+            dict: {'total', 'succeeded', 'failed', 'created': [...], 'errors': [...]}
+        """
+        config = current_app.config
+        workers = workers or config['BULK_INVOICE_WORKERS']
+        chunk_size = chunk_size or config['BULK_INVOICE_CHUNK_SIZE']
+
+        prepared, errors = BulkInvoiceService.prepare(records, issue)
+        BulkInvoiceService._report(progress, job_id, len(errors), 0, errors)
+
+        invoice_nos = InvoiceService.allocate_invoice_nos(len(prepared)) if prepared else []
+        for (record, invoice_doc), invoice_no in zip(prepared, invoice_nos):
+            invoice_doc['invoice_no'] = invoice_no
+
+        chunks = [prepared[i:i + chunk_size] for i in range(0, len(prepared), chunk_size)]
+        created = []
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(Invoice.create_many, [doc for _, doc in chunk]): chunk
+                for chunk in chunks
+            }
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    inserted, failed = future.result()
+                except Exception as e:
+                    inserted, failed = {}, {index: str(e) for index in range(len(chunk))}
+
+                chunk_errors = []
+                for index, (record, invoice_doc) in enumerate(chunk):
+                    if index in inserted:
+                        created.append({'row': record['row'], 'ref': record['ref'],
+                                        'invoice_id': inserted[index],
+                                        'invoice_no': invoice_doc['invoice_no']})
+                    else:
+                        chunk_errors.append({'row': record['row'], 'ref': record['ref'],
+                                             'error': failed.get(index, 'Insert failed')})
+                errors.extend(chunk_errors)
+                BulkInvoiceService._report(progress, job_id, len(chunk), len(inserted), chunk_errors)
+
+        created.sort(key=lambda entry: entry['row'])
+        errors.sort(key=lambda entry: entry['row'])
+        return {
+            'total': len(records),
+            'succeeded': len(created),
+            'failed': len(errors),
+            'created': created,
+            'errors': errors
+        }
+
+    @staticmethod
+    def _report(progress, job_id, processed, succeeded, errors):
+        """Forward progress to the callback and the job record"""
+        if not processed:
+            return
+        if progress:
+            progress(processed)
+        if job_id:
+            BulkJob.record_progress(job_id, processed=processed, succeeded=succeeded,
+                                    failed=len(errors), errors=errors)
+
+    @staticmethod
+    def start_job(records, issue=False, created_by=None):
+        """Run a batch in a background thread, returning the BulkJob ID"""
+        app = current_app._get_current_object()
+        job_id = BulkJob.create('invoices', len(records), created_by)
+
+        def target():
+            with app.app_context():
+                BulkJob.start(job_id)
+                try:
+                    result = BulkInvoiceService.run(records, issue=issue, job_id=job_id)
+                    BulkJob.finish(job_id, result={
+                        'succeeded': result['succeeded'],
+                        'failed': result['failed'],
+                        'created': result['created']
+                    })
+                except Exception as e:
+                    app.logger.exception('Bulk invoice job %s failed', job_id)
+                    BulkJob.finish(job_id, BulkJob.STATUS_FAILED, {'error': str(e)})
+
+        threading.Thread(target=target, name=f'bulk-invoices-{job_id}', daemon=True).start()
+        return job_id
@@ -5,6 +5,7 @@ from app.models.client import Client
 from app.models.product import Product
 from app.services.tax_service import TaxService
 from app.services.snapshot_service import SnapshotService
+from app.utils.gst import place_of_supply
 
 
 class InvoiceService:
@@ -22,25 +23,13 @@ class InvoiceService:
             raise ValueError('Client not found')
         
         # Build items with product snapshots
-        items = []
-        for item_data in items_data:
-            product = Product.get_by_id(item_data['product_id'])
-            if not product:
-                raise ValueError(f"Product {item_data['product_id']} not found")
-            
-            item_snapshot = SnapshotService.create_item_snapshot(
-                product, 
-                item_data['quantity']
-            )
-            items.append(item_snapshot)
+        items = InvoiceService.build_items(items_data)
         
         # Calculate totals
         totals = TaxService.calculate_invoice_totals(items)
         
         # Generate invoice number
-        invoice_no = Invoice.get_next_invoice_no(
-            current_app.config['INVOICE_PREFIX']
-        )
+        invoice_no = InvoiceService.next_invoice_no()
         
         # Create draft invoice
         invoice_id = Invoice.create(
@@ -55,6 +44,50 @@ class InvoiceService:
         
         return invoice_id
     
+    @staticmethod
+    def build_items(items_data, products=None):
+        """Build item snapshots, resolving all products in one batch
+        
+        products: optional pre-loaded {str(id): product} map
+        """
+        if products is None:
+            products = Product.get_many(item['product_id'] for item in items_data)
+        
+        items = []
+        for item_data in items_data:
+            product = products.get(str(item_data['product_id']))
+            if not product:
+                raise ValueError(f"Product {item_data['product_id']} not found")
+            
+            item_snapshot = SnapshotService.create_item_snapshot(
+                product, 
+                item_data['quantity']
+            )
+            items.append(item_snapshot)
+        return items
+    
+    @staticmethod
+    def next_invoice_no():
+        """Allocate the next invoice number using the configured series"""
+        config = current_app.config
+        financial_year = Invoice.financial_year() if config['INVOICE_NUMBER_PER_FY'] else None
+        return Invoice.get_next_invoice_no(
+            config['INVOICE_PREFIX'],
+            financial_year=financial_year,
+            block_size=config['INVOICE_NUMBER_BLOCK_SIZE']
+        )
+    
+    @staticmethod
+    def allocate_invoice_nos(count):
+        """Allocate a contiguous block of invoice numbers for bulk creation"""
+        config = current_app.config
+        financial_year = Invoice.financial_year() if config['INVOICE_NUMBER_PER_FY'] else None
+        return Invoice.allocate_invoice_nos(
+            count,
+            config['INVOICE_PREFIX'],
+            financial_year=financial_year
+        )
+    
     @staticmethod
     def issue_invoice(invoice_id, issue_date=None, due_date=None):
         """Issue a draft invoice"""
@@ -65,12 +98,43 @@ class InvoiceService:
         if invoice['status'] != Invoice.STATUS_DRAFT:
             raise ValueError('Only draft invoices can be issued')
         
+        client = Client.get_by_id(str(invoice['client_id']))
+        supply = InvoiceService.place_of_supply(client)
+        
+        # Recompute totals so the frozen GST lines match the stored tax_breakup
+        totals = TaxService.calculate_invoice_totals(invoice['items'], inter_state=supply['inter_state'])
+        
+        # Update invoice
+        Invoice.update(
+            invoice_id,
+            subtotal=totals['subtotal'],
+            tax_breakup=totals['tax_breakup'],
+            total=totals['total'],
+            **InvoiceService.build_issue_fields(client, totals, supply, issue_date, due_date)
+        )
+        
+        return invoice_id
+    
+    @staticmethod
+    def place_of_supply(client):
+        """Place of supply for a client, from its GSTIN and the company's"""
+        return place_of_supply(current_app.config['COMPANY_GSTIN'], client.get('gstin'))
+    
+    @staticmethod
+    def build_issue_fields(client, totals, supply, issue_date=None, due_date=None):
+        """Build status, frozen snapshot and dates for issuing an invoice
+        
+        supply is InvoiceService.place_of_supply(client) and totals come from
+        TaxService.calculate_invoice_totals() with its inter_state flag. The
+        CGST/SGST or IGST lines per rate are frozen into the snapshot, so
+        views and reports read them as stored.
+        """
         # Create snapshot
         snapshot = SnapshotService.create_snapshot()
         
         # Get client snapshot
-        client = Client.get_by_id(str(invoice['client_id']))
         snapshot['client'] = SnapshotService.create_client_snapshot(client)
+        snapshot['gst'] = TaxService.gst_summary(totals, supply)
         
         # Set dates
         if not issue_date:
@@ -78,16 +142,12 @@ class InvoiceService:
         if not due_date:
             due_date = issue_date + timedelta(days=30)
         
-        # Update invoice
-        Invoice.update(
-            invoice_id,
-            status=Invoice.STATUS_ISSUED,
-            snapshot=snapshot,
-            issue_date=issue_date,
-            due_date=due_date
-        )
-        
-        return invoice_id
+        return {
+            'status': Invoice.STATUS_ISSUED,
+            'snapshot': snapshot,
+            'issue_date': issue_date,
+            'due_date': due_date
+        }
     
     @staticmethod
     def mark_as_paid(invoice_id, paid_on=None):
@@ -116,17 +176,7 @@ class InvoiceService:
             raise ValueError('Only draft invoices can be updated')
         
         # Build items with product snapshots
-        items = []
-        for item_data in items_data:
-            product = Product.get_by_id(item_data['product_id'])
-            if not product:
-                raise ValueError(f"Product {item_data['product_id']} not found")
-            
-            item_snapshot = SnapshotService.create_item_snapshot(
-                product, 
-                item_data['quantity']
-            )
-            items.append(item_snapshot)
+        items = InvoiceService.build_items(items_data)
         
         # Calculate totals
         totals = TaxService.calculate_invoice_totals(items)
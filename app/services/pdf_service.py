@@ -0,0 +1,136 @@
+import hashlib
+import os
+import tempfile
+import time
+from flask import current_app, render_template
+from app.models.invoice import Invoice
+from app.models.client import Client
+
+
+class PdfService:
+    """Service for rendering invoices to HTML/PDF with a content-addressed cache"""
+
+    TEMPLATE = 'invoices/invoice_v1.html'
+    # {template name: (source digest, Jinja's uptodate check)}
+    _template_digests = {}
+
+    @staticmethod
+    def is_immutable(invoice):
+        """Issued and paid invoices render from their frozen snapshot"""
+        return invoice['status'] in [Invoice.STATUS_ISSUED, Invoice.STATUS_PAID] and bool(invoice.get('snapshot'))
+
+    @staticmethod
+    def template_fingerprint(name=TEMPLATE):
+        """Digest of a template's source, re-read only when the file changes"""
+        cached = PdfService._template_digests.get(name)
+        if cached and cached[1]():
+            return cached[0]
+
+        env = current_app.jinja_env
+        source, _, uptodate = env.loader.get_source(env, name)
+        digest = hashlib.sha256(source.encode('utf-8')).hexdigest()[:16]
+        PdfService._template_digests[name] = (digest, uptodate or (lambda: False))
+        return digest
+
+    @staticmethod
+    def cache_key(invoice):
+        """Content key for an immutable invoice
+
+        Covers (invoice_id, template_version, template source, updated_at), so
+        an edited invoice template gets new PDFs and ETags.
+        """
+        template_version = invoice['snapshot'].get(
+            'template_version', current_app.config['INVOICE_TEMPLATE_VERSION']
+        )
+        updated_at = invoice.get('updated_at')
+        source = (f"{invoice['_id']}:{template_version}:{PdfService.template_fingerprint()}:"
+                  f"{updated_at.isoformat() if updated_at else ''}")
+        return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def render_html(invoice):
+        """Render the printable invoice page"""
+        # Get client from snapshot if issued, otherwise get current
+        if PdfService.is_immutable(invoice):
+            client = invoice['snapshot']['client']
+            company_info = {
+                'name': invoice['snapshot']['company_name'],
+                'gstin': invoice['snapshot']['company_gstin'],
+                'address': invoice['snapshot']['company_address'],
+                'email': invoice['snapshot']['company_email'],
+                'phone': invoice['snapshot']['company_phone']
+            }
+        else:
+            # For draft invoices or merged invoices without snapshot
+            client = Client.get_by_id(str(invoice['client_id']))
+            company_info = {
+                'name': current_app.config['COMPANY_NAME'],
+                'gstin': current_app.config['COMPANY_GSTIN'],
+                'address': current_app.config['COMPANY_ADDRESS'],
+                'email': current_app.config['COMPANY_EMAIL'],
+                'phone': current_app.config['COMPANY_PHONE']
+            }
+
+        return render_template(PdfService.TEMPLATE,
+                               invoice=invoice,
+                               client=client,
+                               company_info=company_info)
+
+    @staticmethod
+    def render_pdf(invoice):
+        """Render invoice to PDF bytes"""
+        try:
+            from weasyprint import HTML
+        except ImportError:
+            raise RuntimeError('PDF rendering requires WeasyPrint to be installed')
+
+        return HTML(string=PdfService.render_html(invoice)).write_pdf()
+
+    @staticmethod
+    def get_cached_pdf(invoice):
+        """Path to the invoice PDF, rendering it only on the first request
+
+        Only call for immutable invoices; files are named by cache key so a
+        changed invoice simply gets a new file.
+        """
+        key = PdfService.cache_key(invoice)
+        directory = os.path.join(current_app.config['PDF_CACHE_DIR'], key[:2])
+        path = os.path.join(directory, f'{key}.pdf')
+        if os.path.exists(path):
+            # Mark it as used so prune_cache() keeps it
+            os.utime(path)
+            return path
+
+        pdf = PdfService.render_pdf(invoice)
+        os.makedirs(directory, exist_ok=True)
+        # Write atomically so concurrent requests never serve a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf)
+        os.replace(tmp_path, path)
+        return path
+
+    @staticmethod
+    def prune_cache(max_age_days=None):
+        """Delete cached PDFs not served for max_age_days (default PDF_CACHE_MAX_AGE_DAYS)
+
+        Files for superseded keys (edited invoices, changed templates) are
+        never served again, so they age out here.
+
+        Returns:
+            int: number of files deleted
+        """
+        if max_age_days is None:
+            max_age_days = current_app.config['PDF_CACHE_MAX_AGE_DAYS']
+        cutoff = time.time() - max_age_days * 86400
+        deleted = 0
+        for directory, _, filenames in os.walk(current_app.config['PDF_CACHE_DIR']):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        deleted += 1
+                except FileNotFoundError:
+                    continue
+        return deleted
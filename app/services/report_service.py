@@ -0,0 +1,103 @@
+import csv
+import io
+import json
+from datetime import datetime, time, timedelta, timezone
+from flask import current_app
+from app.models.invoice import Invoice
+from app.services.tax_service import TaxService
+from app.utils import money
+from app.utils.gst import gstin_state_code
+
+
+class ReportService:
+    """Service for GST reports streamed from MongoDB aggregations"""
+    
+    # Report columns, in CSV order
+    GST_COLUMNS = ('supply_type', 'hsn', 'tax_rate', 'lines', 'quantity', 'taxable',
+                   'igst', 'cgst', 'sgst', 'total_tax')
+    AMOUNT_COLUMNS = ('taxable', 'igst', 'cgst', 'sgst', 'total_tax')
+    
+    @staticmethod
+    def parse_period(start=None, end=None):
+        """Inclusive YYYY-MM-DD dates to (first day, last day)
+        
+        Days are IST calendar days. Defaults to the current month up to today.
+        """
+        today = datetime.now(Invoice.IST).date()
+        start = datetime.strptime(start, '%Y-%m-%d').date() if start else today.replace(day=1)
+        end = datetime.strptime(end, '%Y-%m-%d').date() if end else today
+        if end < start:
+            raise ValueError('The end date is before the start date')
+        return start, end
+    
+    @staticmethod
+    def utc_bounds(first_day, last_day):
+        """[start, end) UTC datetimes covering IST days first_day to last_day, as issue_date is stored"""
+        start = datetime.combine(first_day, time.min, Invoice.IST)
+        end = datetime.combine(last_day + timedelta(days=1), time.min, Invoice.IST)
+        return (start.astimezone(timezone.utc).replace(tzinfo=None),
+                end.astimezone(timezone.utc).replace(tzinfo=None))
+    
+    @staticmethod
+    def gst_rows(first_day, last_day):
+        """Yield one row per HSN, tax rate and supply type (B2B/B2C) as the aggregation returns them
+        
+        Tax is rounded per invoice and rate by the configured policy (or
+        taken from the invoice's frozen GST lines), so the rows add up to
+        the invoices as issued.
+        """
+        company_state_code = gstin_state_code(current_app.config['COMPANY_GSTIN'])
+        start, end = ReportService.utc_bounds(first_day, last_day)
+        groups = Invoice.aggregate_gst(start, end, company_state_code, TaxService.rounding_policy())
+        for group in groups:
+            igst, cgst, sgst = group['igst'], group['cgst'], group['sgst']
+            yield {
+                'supply_type': 'B2B' if group['_id']['b2b'] else 'B2C',
+                'hsn': group['_id']['hsn'],
+                'tax_rate': group['_id']['basis_points'] / 100,
+                'lines': group['lines'],
+                'quantity': group['quantity'],
+                'taxable': money.to_rupees(group['taxable']),
+                'igst': money.to_rupees(igst),
+                'cgst': money.to_rupees(cgst),
+                'sgst': money.to_rupees(sgst),
+                'total_tax': money.to_rupees(igst + cgst + sgst)
+            }
+    
+    @staticmethod
+    def totals(rows):
+        """Line count and amount totals of report rows"""
+        lines = 0
+        amounts = dict.fromkeys(ReportService.AMOUNT_COLUMNS, 0)
+        for row in rows:
+            lines += row['lines']
+            for column in amounts:
+                amounts[column] += money.to_paise(row[column])
+        
+        totals = {column: money.to_rupees(paise) for column, paise in amounts.items()}
+        totals['lines'] = lines
+        return totals
+    
+    @staticmethod
+    def csv_lines(rows):
+        """Yield report rows as CSV text, header first, one line at a time"""
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=ReportService.GST_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    
+    @staticmethod
+    def json_chunks(rows, first_day, last_day):
+        """Yield {"from", "to", "rows": [...]} JSON text one row at a time"""
+        header = {'from': first_day.isoformat(), 'to': last_day.isoformat()}
+        yield json.dumps(header)[:-1] + ', "rows": ['
+        separator = ''
+        for row in rows:
+            yield separator + json.dumps(row)
+            separator = ', '
+        yield ']}'
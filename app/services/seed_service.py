@@ -0,0 +1,195 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from flask import current_app
+from app.models.client import Client
+from app.models.coupon import Coupon
+from app.models.invoice import Invoice
+from app.models.product import Product
+from app.models.user import User
+from app.services.invoice_service import InvoiceService
+
+
+class SeedService:
+    """Service for generating synthetic datasets through the real model constructors"""
+    
+    # Presets for `flask db seed --size`
+    SIZES = {
+        '1k': {'clients': 50, 'products': 40, 'invoices': 1000},
+        '100k': {'clients': 2000, 'products': 300, 'invoices': 100000},
+        '1m': {'clients': 20000, 'products': 1000, 'invoices': 1000000},
+    }
+    
+    # Share of invoices ending in each status
+    STATUS_MIX = ((Invoice.STATUS_DRAFT, 0.08), (Invoice.STATUS_ISSUED, 0.30), (Invoice.STATUS_PAID, 0.62))
+    # Invoices per client fall off as 1 / rank ** CLIENT_SKEW, so a few
+    # large clients own most invoices, as in production
+    CLIENT_SKEW = 1.1
+    # Line items per invoice and their weights
+    ITEM_COUNTS = ((1, 45), (2, 25), (3, 15), (4, 10), (5, 5))
+    TAX_RATES = ((0, 5), (5, 15), (12, 15), (18, 55), (28, 10))
+    # Issue dates go back about this many days, most of them recent
+    HISTORY_DAYS = 540
+    
+    EMAIL_DOMAIN = 'seed.test'
+    OWNER_EMAIL = f'owner@{EMAIL_DOMAIN}'
+    
+    # (code, description, value, type, max_uses, expired)
+    COUPONS = (
+        ('SEED10', '10% off, unlimited', 10, Coupon.TYPE_PERCENTAGE, None, False),
+        ('SEEDFLAT500', 'Flat 500 off', 500, Coupon.TYPE_FIXED, None, False),
+        ('SEEDLIMITED', '15% off, first 100 uses', 15, Coupon.TYPE_PERCENTAGE, 100, False),
+        ('SEEDEXPIRED', 'Expired 20% off', 20, Coupon.TYPE_PERCENTAGE, None, True),
+    )
+    
+    # GST state code, state, city
+    STATES = (
+        ('27', 'Maharashtra', 'Mumbai'), ('29', 'Karnataka', 'Bengaluru'),
+        ('07', 'Delhi', 'New Delhi'), ('33', 'Tamil Nadu', 'Chennai'),
+        ('24', 'Gujarat', 'Ahmedabad'), ('36', 'Telangana', 'Hyderabad'),
+        ('09', 'Uttar Pradesh', 'Lucknow'), ('19', 'West Bengal', 'Kolkata'),
+    )
+    
+    # Invoices handed to the worker pool at a time
+    BATCH_SIZE = 1000
+    
+    @staticmethod
+    def client_email(index):
+        """Login of the index-th seeded client (0 is the largest)"""
+        return f'client{index}@{SeedService.EMAIL_DOMAIN}'
+    
+    @staticmethod
+    def run(clients, products, invoices, users=20, password='seed-password', seed=42,
+            workers=8, progress=None):
+        """Add a synthetic dataset to the current database
+        
+        Creates an owner login, `products` products, `clients` clients (the
+        `users` largest with logins), the seed coupons and `invoices`
+        invoices. Invoices go through create_draft_invoice, issue_invoice
+        and mark_as_paid on `workers` threads. The same seed produces the
+        same data. progress(n) is called as invoices are created.
+        
+        Returns:
+            dict: counts of what was created
+        """
+        rng = random.Random(seed)
+        created = {'users': 0, 'products': 0, 'clients': 0, 'coupons': 0, 'invoices': 0}
+        
+        if not User.get_by_email(SeedService.OWNER_EMAIL):
+            User.create('Seed Owner', SeedService.OWNER_EMAIL, password, User.ROLE_OWNER)
+            created['users'] += 1
+        
+        product_ids = []
+        for index in range(products):
+            product_ids.append(Product.create(**SeedService._product(rng, index)))
+        created['products'] = len(product_ids)
+        
+        client_ids = []
+        for index in range(clients):
+            client_id = Client.create(**SeedService._client(rng, index))
+            client_ids.append(client_id)
+            email = SeedService.client_email(index)
+            if index < users and not User.get_by_email(email):
+                User.create(f'Seed Client {index}', email, password, User.ROLE_CLIENT,
+                            client_id=client_id)
+                created['users'] += 1
+        created['clients'] = len(client_ids)
+        
+        now = datetime.utcnow()
+        for code, description, value, discount_type, max_uses, expired in SeedService.COUPONS:
+            if Coupon.get_by_code(code):
+                continue
+            Coupon.create(code, description, value, discount_type=discount_type, max_uses=max_uses,
+                          valid_until=now - timedelta(days=1) if expired else None)
+            created['coupons'] += 1
+        
+        if not client_ids or not product_ids:
+            return created
+        
+        client_weights = []
+        total = 0.0
+        for rank in range(1, len(client_ids) + 1):
+            total += 1 / rank ** SeedService.CLIENT_SKEW
+            client_weights.append(total)
+        
+        app = current_app._get_current_object()
+        
+        def create(plan):
+            with app.app_context():
+                SeedService._create_invoice(plan)
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            remaining = invoices
+            while remaining > 0:
+                count = min(SeedService.BATCH_SIZE, remaining)
+                plans = [
+                    SeedService._invoice_plan(rng, client_ids, client_weights, product_ids, now)
+                    for _ in range(count)
+                ]
+                # list() re-raises the first failure
+                list(pool.map(create, plans))
+                created['invoices'] += count
+                remaining -= count
+                if progress:
+                    progress(count)
+        
+        return created
+    
+    @staticmethod
+    def _product(rng, index):
+        kind = rng.choice(('Cloud Hosting', 'Managed VPS', 'Support Retainer', 'Web Design',
+                           'Domain Renewal', 'SSL Certificate', 'DevOps Hours', 'Backup Storage'))
+        tier = rng.choice(('Starter', 'Standard', 'Pro', 'Business', 'Enterprise'))
+        return {
+            'name': f'{kind} {tier} {index:04d}',
+            'description': f'{tier} {kind.lower()} plan',
+            'hsn': rng.choice(('998315', '998314', '998313', '997331', '998361')),
+            'rate': round(rng.lognormvariate(7.5, 1.0), 2),
+            'tax_rate': rng.choices([rate for rate, _ in SeedService.TAX_RATES],
+                                    [weight for _, weight in SeedService.TAX_RATES])[0],
+        }
+    
+    @staticmethod
+    def _client(rng, index):
+        state_code, state, city = rng.choice(SeedService.STATES)
+        pan = ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(5))
+        pan += f'{rng.randint(0, 9999):04d}' + rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ')
+        name = rng.choice(('Apex', 'Blue', 'Nova', 'Vertex', 'Lotus', 'Indus', 'Zenith', 'Orbit'))
+        suffix = rng.choice(('Technologies', 'Retail', 'Logistics', 'Foods', 'Labs', 'Traders'))
+        return {
+            'company_name': f'{name} {suffix} {index}',
+            'gstin': f'{state_code}{pan}1Z{rng.choice("0123456789")}',
+            'billing_address': f'{rng.randint(1, 400)} Market Road, {city}, {state}',
+            'contact_person': f'Seed Contact {index}',
+            'contact_email': SeedService.client_email(index),
+            'contact_phone': f'+91 9{rng.randint(0, 999999999):09d}',
+        }
+    
+    @staticmethod
+    def _invoice_plan(rng, client_ids, client_weights, product_ids, now):
+        status = rng.choices([status for status, _ in SeedService.STATUS_MIX],
+                             [share for _, share in SeedService.STATUS_MIX])[0]
+        item_count = rng.choices([count for count, _ in SeedService.ITEM_COUNTS],
+                                 [weight for _, weight in SeedService.ITEM_COUNTS])[0]
+        issue_date = now - timedelta(days=min(rng.expovariate(1 / 90), SeedService.HISTORY_DAYS),
+                                     seconds=rng.randint(0, 86399))
+        return {
+            'client_id': rng.choices(client_ids, cum_weights=client_weights)[0],
+            'items': [
+                {'product_id': rng.choice(product_ids), 'quantity': rng.randint(1, 10)}
+                for _ in range(item_count)
+            ],
+            'status': status,
+            'issue_date': issue_date,
+            'paid_on': min(now, issue_date + timedelta(days=rng.randint(0, 45))),
+        }
+    
+    @staticmethod
+    def _create_invoice(plan):
+        invoice_id = InvoiceService.create_draft_invoice(plan['client_id'], plan['items'])
+        if plan['status'] == Invoice.STATUS_DRAFT:
+            return
+        InvoiceService.issue_invoice(invoice_id, issue_date=plan['issue_date'],
+                                     due_date=plan['issue_date'] + timedelta(days=30))
+        if plan['status'] == Invoice.STATUS_PAID:
+            InvoiceService.mark_as_paid(invoice_id, paid_on=plan['paid_on'])
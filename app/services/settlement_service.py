@@ -0,0 +1,129 @@
+from datetime import datetime, timezone
+from flask import current_app
+from pymongo.errors import OperationFailure
+from app import get_db
+from app.models.invoice import Invoice
+from app.models.invoice_stats import InvoiceStats
+from app.models.coupon import Coupon
+from app.models.payment_request import PaymentRequest
+
+
+class SettlementService:
+    """Service for settling a client payment request in a fixed number of round trips"""
+    
+    OUTCOME_PAID = 'PAID'
+    OUTCOME_ALREADY_PAID = 'ALREADY_PAID'
+    OUTCOME_NOT_PAYABLE = 'NOT_PAYABLE'
+    OUTCOME_NOT_FOUND = 'NOT_FOUND'
+    
+    # Server error code for transactions on a standalone mongod
+    ILLEGAL_OPERATION = 20
+    
+    @staticmethod
+    def settle(payment_id, client_id=None):
+        """Complete a pending payment request and mark its invoices paid
+        
+        The request's PENDING -> COMPLETED transition, the coupon redemption
+        and one update_many over its ISSUED invoices run in one transaction
+        when PAYMENT_SETTLEMENT_TRANSACTIONS is on and the server supports it.
+        
+        Returns:
+            dict: {'payment': request as it was while pending,
+                   'outcomes': [{'invoice_id', 'outcome'}], 'paid': int},
+            or None if the request was missing, expired or already completed
+        
+        Raises:
+            ValueError: if the request's coupon can no longer be redeemed;
+            the request is left PENDING and nothing is paid
+        """
+        paid_on = datetime.now(timezone.utc)
+        
+        result = None
+        if current_app.config['PAYMENT_SETTLEMENT_TRANSACTIONS']:
+            try:
+                with get_db().client.start_session() as session:
+                    result = session.with_transaction(
+                        lambda s: SettlementService._settle(payment_id, client_id, paid_on, s)
+                    )
+            except OperationFailure as e:
+                if e.code != SettlementService.ILLEGAL_OPERATION:
+                    raise
+                current_app.logger.warning(
+                    'MongoDB does not support transactions here; settling %s without one', payment_id
+                )
+                result = SettlementService._settle(payment_id, client_id, paid_on)
+        else:
+            result = SettlementService._settle(payment_id, client_id, paid_on)
+        
+        if not result:
+            return None
+        
+        # Stats live outside the transaction so a retried attempt is not counted twice
+        InvoiceStats.record_status_change(result.pop('settled'), Invoice.STATUS_PAID)
+        return result
+    
+    @staticmethod
+    def _settle(payment_id, client_id, paid_on, session=None):
+        """One settlement attempt; returns None if the request cannot be completed"""
+        payment = PaymentRequest.mark_completed(payment_id, client_id=client_id, session=session)
+        if not payment:
+            return None
+        
+        invoice_ids = payment.get('invoice_ids', [])
+        invoices = Invoice.get_statuses(invoice_ids, payment['client_id'], session=session)
+        payable = [
+            invoice_id for invoice_id in invoice_ids
+            if invoice_id in invoices and invoices[invoice_id]['status'] == Invoice.STATUS_ISSUED
+        ]
+        
+        if payable and payment.get('coupon_id'):
+            try:
+                Coupon.consume(payment['coupon_id'], user_id=payment.get('client_id'), session=session)
+            except ValueError:
+                if session is None:
+                    # No transaction to roll back, so undo the completion
+                    PaymentRequest.reopen(payment)
+                raise
+        
+        paid = set()
+        if payable:
+            modified = Invoice.mark_paid_many(payable, payment['client_id'], paid_on, session=session)
+            if modified == len(payable):
+                paid = set(payable)
+            else:
+                # Without a transaction another request may have settled some
+                # of them in between; only the ones stamped now are ours
+                after = Invoice.get_statuses(payable, payment['client_id'], session=session)
+                paid = {
+                    invoice_id for invoice_id, invoice in after.items()
+                    if invoice['status'] == Invoice.STATUS_PAID
+                    and SettlementService._same_instant(invoice.get('paid_on'), paid_on)
+                }
+        
+        outcomes = []
+        for invoice_id in invoice_ids:
+            if invoice_id in paid:
+                outcome = SettlementService.OUTCOME_PAID
+            elif invoice_id not in invoices:
+                outcome = SettlementService.OUTCOME_NOT_FOUND
+            elif invoices[invoice_id]['status'] in (Invoice.STATUS_PAID, Invoice.STATUS_ISSUED):
+                outcome = SettlementService.OUTCOME_ALREADY_PAID
+            else:
+                outcome = SettlementService.OUTCOME_NOT_PAYABLE
+            outcomes.append({'invoice_id': invoice_id, 'outcome': outcome})
+        
+        return {
+            'payment': payment,
+            'outcomes': outcomes,
+            'paid': len(paid),
+            'settled': [invoices[invoice_id] for invoice_id in paid]
+        }
+    
+    @staticmethod
+    def _same_instant(stored, paid_on):
+        """Compare a stored timestamp (millisecond precision, maybe naive) with paid_on"""
+        if stored is None:
+            return False
+        if stored.tzinfo is None:
+            stored = stored.replace(tzinfo=timezone.utc)
+        return abs((stored - paid_on).total_seconds()) < 0.001
@@ -1,64 +1,88 @@
-from datetime import datetime
 from flask import current_app
+from app.utils import money
 
 
 class TaxService:
     """Tax calculation service"""
     
+    @staticmethod
+    def rounding_policy():
+        """Configured tax rounding policy (money.ROUND_PER_RATE or money.ROUND_PER_LINE)"""
+        return current_app.config['TAX_ROUNDING']
+    
     @staticmethod
     def calculate_item_tax(rate, quantity, tax_rate):
         """Calculate tax for a single item"""
-        subtotal = float(rate) * float(quantity)
-        tax_amount = subtotal * (float(tax_rate) / 100)
-        total = subtotal + tax_amount
+        subtotal = money.line_amount(money.to_paise(rate), money.to_milli(quantity))
+        tax_amount = money.tax_amount(subtotal, money.to_basis_points(tax_rate))
         
         return {
-            'subtotal': round(subtotal, 2),
-            'tax_amount': round(tax_amount, 2),
-            'total': round(total, 2)
+            'subtotal': money.to_rupees(subtotal),
+            'tax_amount': money.to_rupees(tax_amount),
+            'total': money.to_rupees(subtotal + tax_amount)
         }
     
     @staticmethod
-    def calculate_invoice_totals(items):
-        """Calculate invoice totals with tax breakup"""
-        subtotal = 0
-        tax_breakup = {}  # {tax_rate: amount}
+    def calculate_invoice_totals(items, rounding=None, inter_state=False):
+        """Calculate invoice totals with tax breakup
         
-        for item in items:
-            item_subtotal = float(item['rate']) * float(item['quantity'])
-            subtotal += item_subtotal
-            
-            tax_rate = float(item.get('tax_rate', 0))
-            if tax_rate > 0:
-                tax_amount = item_subtotal * (tax_rate / 100)
-                if tax_rate not in tax_breakup:
-                    tax_breakup[tax_rate] = 0
-                tax_breakup[tax_rate] += tax_amount
+        Amounts are summed in integer paise and rounded by the configured
+        policy unless `rounding` is given. Besides subtotal, tax_breakup
+        ({str(tax_rate): amount}), total_tax and total, the result has the
+        CGST/SGST (or IGST when inter_state) totals and their split per rate
+        under gst_split.
+        """
+        return money.invoice_totals(items, rounding or TaxService.rounding_policy(), inter_state)
+    
+    @staticmethod
+    def calculate_batch_totals(item_lists, rounding=None, inter_state=None):
+        """calculate_invoice_totals() for many invoices at once
         
-        total_tax = sum(tax_breakup.values())
-        total = subtotal + total_tax
+        Uses NumPy array arithmetic when it is installed and gives the same
+        results either way. inter_state is None or one flag per invoice.
+        """
+        return money.batch_totals(item_lists, rounding or TaxService.rounding_policy(), inter_state)
+    
+    @staticmethod
+    def gst_summary(totals, place_of_supply):
+        """CGST/SGST or IGST lines per tax rate for an invoice's frozen snapshot
         
-        # Round all values
-        subtotal = round(subtotal, 2)
-        tax_breakup = {k: round(v, 2) for k, v in tax_breakup.items()}
-        total = round(total, 2)
+        totals must come from calculate_invoice_totals() (or the batch
+        version) with inter_state set from this place of supply; its
+        gst_split is copied as is.
+        """
+        inter_state = place_of_supply['inter_state']
+        lines = []
+        for key, split in totals['gst_split'].items():
+            basis_points = money.to_basis_points(key)
+            lines.append({
+                'tax_rate': basis_points / 100,
+                'taxable': split['taxable'],
+                'cgst_rate': 0.0 if inter_state else basis_points / 200,
+                'cgst': split['cgst'],
+                'sgst_rate': 0.0 if inter_state else basis_points / 200,
+                'sgst': split['sgst'],
+                'igst_rate': basis_points / 100 if inter_state else 0.0,
+                'igst': split['igst']
+            })
         
         return {
-            'subtotal': subtotal,
-            'tax_breakup': tax_breakup,
-            'total_tax': round(total_tax, 2),
-            'total': total
+            'place_of_supply': place_of_supply,
+            'lines': lines,
+            'cgst': totals['cgst'],
+            'sgst': totals['sgst'],
+            'igst': totals['igst']
         }
     
     @staticmethod
     def split_gst(tax_rate, tax_amount):
         """Split GST into CGST and SGST"""
-        half_rate = tax_rate / 2
-        half_amount = tax_amount / 2
+        cgst, sgst, _ = money.split_tax(money.to_paise(tax_amount))
+        half_rate = money.to_basis_points(tax_rate) / 2
         
         return {
-            'cgst_rate': round(half_rate, 2),
-            'cgst_amount': round(half_amount, 2),
-            'sgst_rate': round(half_rate, 2),
-            'sgst_amount': round(half_amount, 2)
+            'cgst_rate': round(half_rate / 100, 2),
+            'cgst_amount': money.to_rupees(cgst),
+            'sgst_rate': round(half_rate / 100, 2),
+            'sgst_amount': money.to_rupees(sgst)
         }
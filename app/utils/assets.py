@@ -0,0 +1,286 @@
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from flask import current_app, request, url_for
+
+
+MANIFEST_NAME = 'manifest.json'
+
+# Source stylesheet under static/, bundled as 'app.css'
+SOURCE_CSS = 'css/app.css'
+
+# Inter weights the templates use (same set the Google Fonts link loaded)
+INTER_WEIGHTS = (400, 500, 600, 700, 800)
+# Google Fonts' "latin" subset
+LATIN_RANGE = ('U+0000-00FF, U+0131, U+0152-0153, U+02BB-02BC, U+02C6, U+02DA, '
+               'U+02DC, U+0304, U+0308, U+0329, U+2000-206F, U+2074, U+20AC, '
+               'U+2122, U+2191, U+2193, U+2212, U+2215, U+FEFF, U+FFFD')
+
+ICON_CLASS = re.compile(r'\bfa-[a-z0-9]+(?:-[a-z0-9]+)*')
+# One icon rule in Font Awesome's all.css: `.fa-check::before { content: "\f00c"; }`
+ICON_RULE = re.compile(r'((?:\.fa-[a-z0-9-]+::?before\s*,?\s*)+)\{\s*content:\s*"\\([0-9a-f]+)";?\s*\}')
+FONT_FACE = re.compile(r'@font-face\s*\{[^}]*\}')
+FONT_URL = re.compile(r'url\("\.\./webfonts/([a-z0-9-]+)\.woff2"\)\s*format\("woff2"\)')
+
+
+class AssetBuildError(RuntimeError):
+    """Raised when the asset bundle cannot be built"""
+
+
+class AssetManifest:
+    """Map of logical asset names to fingerprinted paths under static/"""
+
+    def __init__(self, path, auto_reload=False):
+        self.path = path
+        self.auto_reload = auto_reload
+        self.entries = {}
+        self._files = frozenset()
+        self._mtime = None
+        self._load()
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        entries = {}
+        if mtime is not None:
+            with open(self.path, encoding='utf-8') as f:
+                entries = json.load(f)
+        self.entries = entries
+        self._files = frozenset(entries.values())
+        self._mtime = mtime
+
+    def get(self, name):
+        """Fingerprinted path of an asset, or None if it has not been built"""
+        if self.auto_reload:
+            self._load()
+        return self.entries.get(name)
+
+    def is_fingerprinted(self, filename):
+        """Whether a static filename is a built (content-addressed) asset"""
+        return filename in self._files
+
+
+def asset_url(name, **values):
+    """url_for('static') for a built asset by its logical name; None if not built"""
+    path = current_app.extensions['asset_manifest'].get(name)
+    if path is None:
+        return None
+    return url_for('static', filename=path, **values)
+
+
+def init_assets(app):
+    """Load the asset manifest, expose asset_url() to templates and cache built files forever"""
+    manifest = AssetManifest(
+        os.path.join(app.static_folder, app.config['ASSETS_DIST'], MANIFEST_NAME),
+        auto_reload=app.debug
+    )
+    app.extensions['asset_manifest'] = manifest
+    app.jinja_env.globals['asset_url'] = asset_url
+
+    if not manifest.entries and not app.debug and not app.testing:
+        app.logger.warning('No asset manifest at %s; pages fall back to CDN styles. '
+                           'Run `flask assets build`.', manifest.path)
+
+    cache_control = f"public, max-age={app.config['ASSETS_MAX_AGE']}, immutable"
+
+    @app.after_request
+    def cache_built_assets(response):
+        """Fingerprinted names change with their content, so never revalidate them"""
+        if (request.endpoint == 'static' and response.status_code in (200, 206, 304)
+                and manifest.is_fingerprinted((request.view_args or {}).get('filename'))):
+            response.headers['Cache-Control'] = cache_control
+        return response
+
+
+def used_icons(paths):
+    """Font Awesome class names (fa-*) that appear in the given files"""
+    names = set()
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            names.update(ICON_CLASS.findall(f.read()))
+    return names
+
+
+def purge_icon_css(css, names):
+    """Drop icon rules for classes not in names
+
+    Returns:
+        tuple: (css, set of codepoints still referenced)
+    """
+    codepoints = set()
+
+    def keep(match):
+        selectors = re.findall(r'\.(fa-[a-z0-9-]+)', match.group(1))
+        if not names.intersection(selectors):
+            return ''
+        codepoints.add(int(match.group(2), 16))
+        return match.group(0)
+
+    return ICON_RULE.sub(keep, css), codepoints
+
+
+def subset_font(source, dest, unicodes=None, unicode_range=None):
+    """Write a woff2 of source limited to the given characters
+
+    Returns:
+        bool: False if fontTools (with brotli) is missing and the whole font was copied
+    """
+    try:
+        from fontTools import subset
+        import brotli  # noqa: F401  (needed for woff2 output)
+    except ImportError:
+        shutil.copyfile(source, dest)
+        return False
+    args = [source, f'--output-file={dest}', '--flavor=woff2', '--layout-features=*',
+            '--no-hinting', '--desubroutinize']
+    if unicodes is not None:
+        args.append('--unicodes=' + (','.join(f'{c:x}' for c in sorted(unicodes)) or '20'))
+    if unicode_range is not None:
+        args.append('--unicodes=' + unicode_range.replace('U+', '').replace(' ', ''))
+    subset.main(args)
+    return True
+
+
+def fingerprint(path, digest_size=10):
+    """Content hash used in built file names"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:digest_size]
+
+
+def _add(work_dir, dist_dir, logical, manifest, dist):
+    """Move a built file into dist under a fingerprinted name and record it"""
+    stem, ext = os.path.splitext(logical)
+    built = os.path.join(work_dir, logical)
+    name = f'{stem}.{fingerprint(built)}{ext}'
+    os.makedirs(os.path.dirname(os.path.join(dist_dir, name)), exist_ok=True)
+    shutil.move(built, os.path.join(dist_dir, name))
+    manifest[logical] = f'{dist}/{name}'
+    return os.path.basename(name)
+
+
+def _tailwind(app):
+    binary = app.config['TAILWIND_BIN'] or os.path.join(
+        app.config['ASSETS_NODE_MODULES'], '.bin', 'tailwindcss')
+    if not shutil.which(binary):
+        raise AssetBuildError(f'Tailwind CLI not found at {binary}; run `npm install` or set TAILWIND_BIN')
+    return binary
+
+
+def _package(app, *parts):
+    path = os.path.join(app.config['ASSETS_NODE_MODULES'], *parts)
+    if not os.path.exists(path):
+        raise AssetBuildError(f'{path} is missing; run `npm install`')
+    return path
+
+
+def build_assets(app):
+    """Build the CSS bundle with self-hosted, subsetted fonts into static/ASSETS_DIST
+
+    Tailwind compiles only the classes used in templates and minifies the
+    result; Font Awesome keeps just the icons used and its fonts are
+    subsetted to them; Inter is limited to the Latin range. Every file is
+    named by its content hash and listed in the manifest.
+
+    Returns:
+        dict: {'manifest': {logical name: static path}, 'icons': int, 'subsetted': bool}
+    """
+    root = os.path.dirname(app.root_path)
+    dist = app.config['ASSETS_DIST']
+    dist_dir = os.path.join(app.static_folder, dist)
+    tailwind = _tailwind(app)
+    fa_dir = _package(app, '@fortawesome', 'fontawesome-free')
+    inter_dir = _package(app, '@fontsource', 'inter', 'files')
+
+    sources = glob.glob(os.path.join(app.root_path, 'templates', '**', '*.html'), recursive=True)
+    sources += glob.glob(os.path.join(app.static_folder, 'js', '**', '*.js'), recursive=True)
+    icons = used_icons(sources)
+
+    manifest = {}
+    subsetted = True
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.makedirs(os.path.join(work_dir, 'fonts'))
+        faces = []
+
+        # Inter, Latin only
+        for weight in INTER_WEIGHTS:
+            logical = f'fonts/inter-latin-{weight}-normal.woff2'
+            subsetted &= subset_font(os.path.join(inter_dir, f'inter-latin-{weight}-normal.woff2'),
+                                     os.path.join(work_dir, logical), unicode_range=LATIN_RANGE)
+            name = _add(work_dir, dist_dir, logical, manifest, dist)
+            faces.append(
+                "@font-face{font-family:'Inter';font-style:normal;font-display:swap;"
+                f"font-weight:{weight};src:url(fonts/{name}) format('woff2');"
+                f"unicode-range:{LATIN_RANGE}}}"
+            )
+
+        # Font Awesome, only the icons the templates use
+        with open(os.path.join(fa_dir, 'css', 'all.css'), encoding='utf-8') as f:
+            icon_css, codepoints = purge_icon_css(f.read(), icons)
+        fonts = {}
+        for face in FONT_FACE.findall(icon_css):
+            match = FONT_URL.search(face)
+            if not match or match.group(1) in fonts:
+                continue
+            logical = f'fonts/{match.group(1)}.woff2'
+            subsetted &= subset_font(os.path.join(fa_dir, 'webfonts', f'{match.group(1)}.woff2'),
+                                     os.path.join(work_dir, logical), unicodes=codepoints)
+            fonts[match.group(1)] = _add(work_dir, dist_dir, logical, manifest, dist)
+
+        def rewrite(face):
+            match = FONT_URL.search(face.group(0))
+            if not match:
+                return ''
+            # Drop the .ttf fallbacks; every supported browser takes woff2
+            src = f'url(fonts/{fonts[match.group(1)]}) format("woff2")'
+            return re.sub(r'src:[^;}]*', f'src: {src}', face.group(0))
+
+        icon_css = FONT_FACE.sub(rewrite, icon_css)
+
+        with open(os.path.join(app.static_folder, SOURCE_CSS), encoding='utf-8') as f:
+            app_css = f.read()
+        entry = os.path.join(work_dir, 'entry.css')
+        with open(entry, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(faces) + '\n' + icon_css + '\n' + app_css)
+
+        result = subprocess.run(
+            [tailwind, '-c', os.path.join(root, 'tailwind.config.js'),
+             '-i', entry, '-o', os.path.join(work_dir, 'app.css'), '--minify'],
+            cwd=root, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise AssetBuildError(f'Tailwind failed:\n{result.stderr}')
+        _add(work_dir, dist_dir, 'app.css', manifest, dist)
+
+    _write_manifest(dist_dir, dist, manifest)
+    return {'manifest': manifest, 'icons': len(codepoints), 'subsetted': subsetted}
+
+
+def _write_manifest(dist_dir, dist, manifest):
+    """Swap in the new manifest and delete files that neither it nor the previous one uses
+
+    The previous build is kept so pages rendered just before a deploy still load.
+    """
+    path = os.path.join(dist_dir, MANIFEST_NAME)
+    keep = set(manifest.values())
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            keep.update(json.load(f).values())
+
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+    for file in glob.glob(os.path.join(dist_dir, '**', '*'), recursive=True):
+        rel = f'{dist}/' + os.path.relpath(file, dist_dir).replace(os.sep, '/')
+        if os.path.isfile(file) and file != path and rel not in keep:
+            os.remove(file)
@@ -1,5 +1,5 @@
 from functools import wraps
-from flask import session, redirect, url_for, flash, abort
+from flask import session, redirect, url_for, flash, abort, g
 from app.models.user import User
 
 
@@ -11,7 +11,7 @@ def login_required(f):
             flash('Please login to access this page', 'warning')
             return redirect(url_for('auth.login'))
         
-        user = User.get_by_id(session['user_id'])
+        user = get_current_user()
         if not user or not user.get('is_active'):
             session.clear()
             flash('Your account is not active', 'error')
@@ -29,7 +29,7 @@ def owner_required(f):
             flash('Please login to access this page', 'warning')
             return redirect(url_for('auth.login'))
         
-        user = User.get_by_id(session['user_id'])
+        user = get_current_user()
         if not user or not user.get('is_active'):
             session.clear()
             flash('Your account is not active', 'error')
@@ -50,7 +50,7 @@ def client_or_owner_required(f):
             flash('Please login to access this page', 'warning')
             return redirect(url_for('auth.login'))
         
-        user = User.get_by_id(session['user_id'])
+        user = get_current_user()
         if not user or not user.get('is_active'):
             session.clear()
             flash('Your account is not active', 'error')
@@ -61,11 +61,19 @@ def client_or_owner_required(f):
 
 
 def get_current_user():
-    """Get current logged in user"""
+    """Get current logged in user, loaded at most once per request"""
     user_id = session.get('user_id')
-    if user_id:
-        return User.get_by_id(user_id)
-    return None
+    if not user_id:
+        return None
+    
+    # Decorators, views and context processors all share the request copy
+    cached = g.get('current_user')
+    if cached is not None and str(cached['_id']) == str(user_id):
+        return cached
+    
+    user = User.get_cached(user_id)
+    g.current_user = user
+    return user
 
 
 def is_authenticated():
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Bounded, thread-safe LRU cache whose entries expire after a TTL
+
+    Entries are process-local, so every Gunicorn worker keeps its own copy.
+    Explicit invalidation only reaches the current process; the TTL bounds
+    how long other workers may serve a stale value.
+    """
+
+    def __init__(self, maxsize=1024, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def configure(self, maxsize=None, ttl=None):
+        """Change size/TTL limits and drop current entries"""
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+            if ttl is not None:
+                self.ttl = ttl
+            self._data.clear()
+
+    def get(self, key, default=None):
+        """Return cached value or default if missing/expired"""
+        if self.ttl <= 0:
+            return default
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """Store value, evicting the least recently used entry if full"""
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """Invalidate a single entry"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """Invalidate all entries"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,76 @@
+import re
+
+
+# GST state codes, the first two digits of a GSTIN. 25 (Daman and Diu) was
+# merged into 26 in 2020 but still appears on older registrations.
+STATE_CODES = {
+    '01': 'Jammu and Kashmir',
+    '02': 'Himachal Pradesh',
+    '03': 'Punjab',
+    '04': 'Chandigarh',
+    '05': 'Uttarakhand',
+    '06': 'Haryana',
+    '07': 'Delhi',
+    '08': 'Rajasthan',
+    '09': 'Uttar Pradesh',
+    '10': 'Bihar',
+    '11': 'Sikkim',
+    '12': 'Arunachal Pradesh',
+    '13': 'Nagaland',
+    '14': 'Manipur',
+    '15': 'Mizoram',
+    '16': 'Tripura',
+    '17': 'Meghalaya',
+    '18': 'Assam',
+    '19': 'West Bengal',
+    '20': 'Jharkhand',
+    '21': 'Odisha',
+    '22': 'Chhattisgarh',
+    '23': 'Madhya Pradesh',
+    '24': 'Gujarat',
+    '25': 'Daman and Diu',
+    '26': 'Dadra and Nagar Haveli and Daman and Diu',
+    '27': 'Maharashtra',
+    '28': 'Andhra Pradesh (Before Division)',
+    '29': 'Karnataka',
+    '30': 'Goa',
+    '31': 'Lakshadweep',
+    '32': 'Kerala',
+    '33': 'Tamil Nadu',
+    '34': 'Puducherry',
+    '35': 'Andaman and Nicobar Islands',
+    '36': 'Telangana',
+    '37': 'Andhra Pradesh',
+    '38': 'Ladakh',
+    '97': 'Other Territory',
+}
+
+_STATE_PREFIX = re.compile(r'\s*(\d{2})')
+
+
+def gstin_state_code(gstin):
+    """State code of a GSTIN, or None if it has no known one"""
+    match = _STATE_PREFIX.match(gstin or '')
+    if match and match.group(1) in STATE_CODES:
+        return match.group(1)
+    return None
+
+
+def place_of_supply(supplier_gstin, recipient_gstin):
+    """Place of supply of an invoice and whether it is an inter-state supply
+
+    A registered recipient's state is the place of supply. For an
+    unregistered recipient only the supplier's state is known, so the supply
+    is treated as intra-state. Without a supplier state nothing can be
+    compared and CGST/SGST applies.
+
+    Returns:
+        dict: {'state_code', 'state', 'inter_state'}
+    """
+    supplier = gstin_state_code(supplier_gstin)
+    state_code = gstin_state_code(recipient_gstin) or supplier
+    return {
+        'state_code': state_code,
+        'state': STATE_CODES.get(state_code),
+        'inter_state': bool(supplier and state_code != supplier),
+    }
@@ -0,0 +1,108 @@
+from pymongo.errors import OperationFailure
+
+
+# Index options that change how an index behaves; anything else reported by
+# index_information() (v, ns, background...) is ignored when comparing
+COMPARED_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression')
+
+
+def declared_indexes(app):
+    """Collect {collection: [IndexModel]} from models that declare INDEXES"""
+    from app.models.user import User
+    from app.models.client import Client
+    from app.models.product import Product
+    from app.models.invoice import Invoice
+    from app.models.coupon import Coupon
+    from app.models.coupon_redemption import CouponRedemption
+    from app.models.magic_link import MagicLink
+    from app.models.payment_request import PaymentRequest
+    from app.models.login_attempt import LoginAttempt
+    from app.utils.sessions import MongoSessionInterface
+
+    declared = {}
+    for model in (User, Client, Product, Invoice, Coupon, CouponRedemption, MagicLink,
+                  PaymentRequest, LoginAttempt):
+        declared.setdefault(model.COLLECTION, []).extend(model.INDEXES)
+
+    if app.config['SESSION_TYPE'] == 'mongodb':
+        declared.setdefault(app.config['SESSION_MONGODB_COLLECTION'], []).extend(
+            MongoSessionInterface.INDEXES
+        )
+    return declared
+
+
+def _spec(document):
+    """Comparable (key, options) for an IndexModel document or index_information() entry"""
+    key = document['key']
+    pairs = key.items() if hasattr(key, 'items') else key
+    # The server may report directions as floats (1.0) depending on the client that built them
+    key = tuple((field, int(direction) if isinstance(direction, float) else direction)
+                for field, direction in pairs)
+    options = {name: document[name] for name in COMPARED_OPTIONS
+               if document.get(name) not in (None, False)}
+    return key, options
+
+
+def plan(db, declared, prune=False):
+    """Work out what it takes to make the database match the declarations
+
+    An existing index whose key or options differ from its declaration is
+    dropped and recreated. Undeclared indexes are only dropped with prune.
+
+    Returns:
+        list: [{'collection', 'name', 'action'}] where action is one of
+        'create', 'rebuild', 'drop', 'undeclared' or 'ok'
+    """
+    actions = []
+    for collection, models in sorted(declared.items()):
+        existing = db[collection].index_information()
+        existing_specs = {name: _spec(info) for name, info in existing.items() if name != '_id_'}
+        wanted = set()
+
+        for model in models:
+            name = model.document['name']
+            key, options = _spec(model.document)
+            wanted.add(name)
+
+            # An index on the same key under another name blocks creation
+            for other, (other_key, _) in existing_specs.items():
+                if other != name and other_key == key and other not in wanted:
+                    actions.append({'collection': collection, 'name': other, 'action': 'drop'})
+                    wanted.add(other)
+
+            if name not in existing_specs:
+                action = 'create'
+            elif existing_specs[name] != (key, options):
+                action = 'rebuild'
+            else:
+                action = 'ok'
+            actions.append({'collection': collection, 'name': name, 'action': action, 'model': model})
+
+        for name in sorted(set(existing_specs) - wanted):
+            actions.append({'collection': collection, 'name': name,
+                            'action': 'drop' if prune else 'undeclared'})
+
+    return actions
+
+
+def apply(db, actions):
+    """Execute a plan from plan(); drops run before creates per collection"""
+    for action in actions:
+        if action['action'] in ('drop', 'rebuild'):
+            try:
+                db[action['collection']].drop_index(action['name'])
+            except OperationFailure:
+                # Already gone, e.g. dropped by another deploy
+                pass
+
+    for action in actions:
+        if action['action'] in ('create', 'rebuild'):
+            db[action['collection']].create_indexes([action['model']])
+
+
+def ensure_indexes(app, db, prune=False, dry_run=False):
+    """Reconcile declared indexes with the database, returning the plan"""
+    actions = plan(db, declared_indexes(app), prune=prune)
+    if not dry_run:
+        apply(db, actions)
+    return actions
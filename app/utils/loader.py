@@ -0,0 +1,52 @@
+from flask import g
+
+
+class DataLoader:
+    """Request-scoped loader that dedupes and batches lookups by ID
+
+    Every ID is fetched at most once per request; IDs requested together
+    are fetched with a single get_many ($in) call.
+    """
+
+    def __init__(self, batch_fn):
+        self.batch_fn = batch_fn
+        self._cache = {}
+
+    def load_many(self, ids):
+        """Load documents for ids, returning {str(id): document or None}"""
+        keys = [str(i) for i in ids if i]
+        missing = list({k for k in keys if k not in self._cache})
+        if missing:
+            found = self.batch_fn(missing)
+            for key in missing:
+                self._cache[key] = found.get(key)
+        return {key: self._cache[key] for key in keys}
+
+    def load(self, id_):
+        """Load a single document by ID"""
+        if not id_:
+            return None
+        return self.load_many([id_]).get(str(id_))
+
+    def prime(self, document):
+        """Seed the loader with an already fetched document"""
+        self._cache[str(document['_id'])] = document
+
+
+def _batch_functions():
+    from app.models.client import Client
+    from app.models.product import Product
+    from app.models.user import User
+    return {
+        'client': Client.get_many,
+        'product': Product.get_many,
+        'user': User.get_many
+    }
+
+
+def get_loader(kind):
+    """Get the current request's loader for 'client', 'product' or 'user'"""
+    loaders = g.setdefault('_loaders', {})
+    if kind not in loaders:
+        loaders[kind] = DataLoader(_batch_functions()[kind])
+    return loaders[kind]
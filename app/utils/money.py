@@ -0,0 +1,291 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Amounts are integer paise, quantities thousandths and tax rates basis
+# points (18% is 1800), so sums are exact and only the policy rounds:
+# per_rate sums each rate's lines and rounds its tax once (as the GST return
+# reports it), per_line rounds every line's tax. Halves round away from zero.
+# Inputs convert with round(x * 100) / round(x * 1000) in both the scalar and
+# the NumPy path, so the two agree to the paisa.
+ROUND_PER_LINE = 'per_line'
+ROUND_PER_RATE = 'per_rate'
+ROUNDING_POLICIES = (ROUND_PER_LINE, ROUND_PER_RATE)
+
+# Largest invoice subtotal or taxable value (Rs 1 lakh crore) and tax rate
+# (100%) accepted. They keep every intermediate product of the NumPy path,
+# including div_round's doubling, under 2**63.
+MAX_PAISE = 10 ** 14
+MAX_BASIS_POINTS = 10000
+OUT_OF_RANGE = 'Rates, quantities and tax rates must be finite numbers within range'
+
+
+def to_paise(amount):
+    """Rupees to integer paise"""
+    return int(round(float(amount) * 100))
+
+
+def to_rupees(paise):
+    """Integer paise to rupees"""
+    # A correctly rounded division is already the nearest float to the
+    # two-decimal amount, and NumPy's division gives the same float
+    return paise / 100
+
+
+def to_basis_points(tax_rate):
+    """Percent tax rate to integer basis points"""
+    return int(round(float(tax_rate) * 100))
+
+
+def to_milli(quantity):
+    """Quantity to integer thousandths"""
+    return int(round(float(quantity) * 1000))
+
+
+def rate_key(basis_points):
+    """tax_breakup key of a rate: '18.0' for 1800 (BSON keys must be strings)"""
+    return str(basis_points / 100)
+
+
+def div_round(numerator, denominator):
+    """Integer numerator / denominator, halves rounded away from zero"""
+    if numerator < 0:
+        return -((-2 * numerator + denominator) // (2 * denominator))
+    return (2 * numerator + denominator) // (2 * denominator)
+
+
+def line_amount(rate_paise, quantity_milli):
+    """Amount of a line in paise"""
+    return div_round(rate_paise * quantity_milli, 1000)
+
+
+def tax_amount(amount_paise, basis_points):
+    """Tax on an amount in paise"""
+    return div_round(amount_paise * basis_points, 10000)
+
+
+def split_tax(tax_paise, inter_state=False):
+    """(cgst, sgst, igst) paise of a tax amount
+
+    Inter-state supplies carry IGST only. Otherwise the tax is halved
+    between CGST and SGST; an odd paisa goes to CGST so they add up.
+    """
+    if inter_state:
+        return 0, 0, tax_paise
+    cgst = div_round(tax_paise, 2)
+    return cgst, tax_paise - cgst, 0
+
+
+def check_rounding(rounding):
+    """Raise ValueError for an unknown rounding policy"""
+    if rounding not in ROUNDING_POLICIES:
+        raise ValueError(f'Unknown tax rounding policy {rounding!r}; use one of {ROUNDING_POLICIES}')
+
+
+def invoice_totals(items, rounding=ROUND_PER_RATE, inter_state=False):
+    """Totals of one invoice's items (dicts with rate, quantity and tax_rate)
+
+    Raises ValueError for non-finite inputs, or amounts above MAX_PAISE or
+    tax rates above MAX_BASIS_POINTS.
+
+    Returns:
+        dict: rupee subtotal, tax_breakup, total_tax, total, cgst/sgst/igst
+            and gst_split ({rate key: {'taxable', 'cgst', 'sgst', 'igst'}})
+    """
+    check_rounding(rounding)
+    per_line = rounding == ROUND_PER_LINE
+    subtotal = 0
+    taxable = {}  # {basis points: line amounts}
+    line_tax = {}  # {basis points: rounded line taxes}, per_line only
+    rate_basis_points = {}  # {tax_rate as stored: basis points}; few distinct values
+    try:
+        for item in items:
+            # line_amount(to_paise(rate), to_milli(quantity)), inlined: this
+            # loop is the per-invoice hot path
+            product = round(float(item['rate']) * 100) * round(float(item['quantity']) * 1000)
+            amount = (2 * product + 1000) // 2000 if product >= 0 else -((1000 - 2 * product) // 2000)
+            subtotal += amount
+            tax_rate = item.get('tax_rate', 0)
+            basis_points = rate_basis_points.get(tax_rate)
+            if basis_points is None:
+                basis_points = rate_basis_points[tax_rate] = round(float(tax_rate) * 100)
+            if basis_points > 0:
+                taxable[basis_points] = taxable.get(basis_points, 0) + amount
+                if per_line:
+                    line_tax[basis_points] = line_tax.get(basis_points, 0) + tax_amount(amount, basis_points)
+    except OverflowError:
+        # round() of an infinity; a NaN raises ValueError itself
+        raise ValueError(OUT_OF_RANGE)
+    _check_range(subtotal, taxable.values(), rate_basis_points.values())
+
+    if per_line:
+        taxes = line_tax
+    else:
+        taxes = {basis_points: tax_amount(amount, basis_points) for basis_points, amount in taxable.items()}
+    return _result(subtotal, [(basis_points, taxable[basis_points], taxes[basis_points])
+                              for basis_points in sorted(taxes)], inter_state)
+
+
+def batch_totals(item_lists, rounding=ROUND_PER_RATE, inter_state=None):
+    """invoice_totals() for many invoices at once, as array arithmetic when NumPy is installed
+
+    Args:
+        item_lists: one list of items per invoice
+        inter_state: None (all intra-state) or one bool per invoice
+
+    Returns:
+        list: an invoice_totals() result per invoice, in order
+    """
+    check_rounding(rounding)
+    item_lists = list(item_lists)
+    inter_state = list(inter_state) if inter_state is not None else [False] * len(item_lists)
+    if len(inter_state) != len(item_lists):
+        raise ValueError('inter_state needs one flag per invoice')
+    if np is None or not item_lists:
+        return [invoice_totals(items, rounding, flag) for items, flag in zip(item_lists, inter_state)]
+
+    counts = np.fromiter((len(items) for items in item_lists), dtype=np.int64, count=len(item_lists))
+    total_items = int(counts.sum())
+    flat = [item for items in item_lists for item in items]
+    invoice_index = np.repeat(np.arange(len(item_lists), dtype=np.int64), counts)
+    rates = np.fromiter((float(item['rate']) for item in flat), dtype=np.float64, count=total_items)
+    quantities = np.fromiter((float(item['quantity']) for item in flat), dtype=np.float64, count=total_items)
+    tax_rates = np.fromiter((float(item.get('tax_rate', 0)) for item in flat), dtype=np.float64,
+                            count=total_items)
+
+    rate_paise = np.rint(rates * 100)
+    quantity_milli = np.rint(quantities * 1000)
+    line_basis_points = np.rint(tax_rates * 100)
+    # Bound the int64 arithmetic before doing it: each invoice's gross
+    # amount, estimated in floats, must be within twice the exact limit
+    # applied to the results below
+    line_products = np.abs(rate_paise * quantity_milli)
+    if not (np.isfinite(line_products).all() and np.isfinite(line_basis_points).all()):
+        raise ValueError(OUT_OF_RANGE)
+    if (np.bincount(invoice_index, weights=line_products, minlength=len(item_lists)).max() > 2000 * MAX_PAISE
+            or np.abs(line_basis_points).max(initial=0) > MAX_BASIS_POINTS):
+        raise ValueError(OUT_OF_RANGE)
+
+    subtotals, basis_points, taxable, taxes, present = batch_arrays(
+        invoice_index, len(item_lists),
+        rate_paise.astype(np.int64),
+        quantity_milli.astype(np.int64),
+        line_basis_points.astype(np.int64),
+        rounding
+    )
+    if np.abs(subtotals).max() > MAX_PAISE or np.abs(taxable).max(initial=0) > MAX_PAISE:
+        raise ValueError(OUT_OF_RANGE)
+
+    inter_state = np.array(inter_state, dtype=bool)[:, None]
+    cgst = np.where(inter_state, 0, _div_round_array(taxes, 2))
+    sgst = np.where(inter_state, 0, taxes - cgst)
+    igst = np.where(inter_state, taxes, 0)
+    keys = [rate_key(int(rate)) for rate in basis_points]
+    columns = [(part / 100).tolist() for part in (taxable, taxes, cgst, sgst, igst)]
+    totals = [(part.sum(axis=1) / 100).tolist() for part in (taxes, cgst, sgst, igst)]
+    subtotal_rupees = (subtotals / 100).tolist()
+    grand_totals = ((subtotals + taxes.sum(axis=1)) / 100).tolist()
+
+    results = []
+    for row, row_present in enumerate(present.tolist()):
+        rate_taxable, rate_tax, rate_cgst, rate_sgst, rate_igst = (column[row] for column in columns)
+        indexes = [index for index, has_rate in enumerate(row_present) if has_rate]
+        results.append({
+            'subtotal': subtotal_rupees[row],
+            'tax_breakup': {keys[index]: rate_tax[index] for index in indexes},
+            'total_tax': totals[0][row],
+            'total': grand_totals[row],
+            'cgst': totals[1][row],
+            'sgst': totals[2][row],
+            'igst': totals[3][row],
+            'gst_split': {
+                keys[index]: {'taxable': rate_taxable[index], 'cgst': rate_cgst[index],
+                              'sgst': rate_sgst[index], 'igst': rate_igst[index]}
+                for index in indexes
+            },
+        })
+    return results
+
+
+def batch_arrays(invoice_index, invoice_count, rate_paise, quantity_milli, basis_points, rounding=ROUND_PER_RATE):
+    """Vectorised core of batch_totals() over flat per-line int64 arrays (NumPy required)
+
+    Returns:
+        tuple: (subtotal paise per invoice, distinct positive basis points,
+            invoice x rate matrices of taxable paise and of tax paise, and an
+            invoice x rate matrix that is True where the invoice has a line
+            at that rate)
+    """
+    check_rounding(rounding)
+    amounts = _div_round_array(rate_paise * quantity_milli, 1000)
+    subtotals = np.zeros(invoice_count, dtype=np.int64)
+    _group_sum(invoice_index, amounts, subtotals)
+
+    taxed = basis_points > 0
+    rates, rate_index = np.unique(basis_points[taxed], return_inverse=True)
+    groups = invoice_index[taxed] * len(rates) + rate_index
+    taxable = np.zeros(invoice_count * len(rates), dtype=np.int64)
+    _group_sum(groups, amounts[taxed], taxable)
+    taxable = taxable.reshape(invoice_count, len(rates))
+    if rounding == ROUND_PER_LINE:
+        taxes = np.zeros(invoice_count * len(rates), dtype=np.int64)
+        _group_sum(groups, _div_round_array(amounts[taxed] * basis_points[taxed], 10000), taxes)
+        taxes = taxes.reshape(invoice_count, len(rates))
+    else:
+        taxes = _div_round_array(taxable * rates, 10000)
+
+    present = np.bincount(groups, minlength=invoice_count * len(rates)).reshape(invoice_count, len(rates)) > 0
+    return subtotals, rates, taxable, taxes, present
+
+
+def _group_sum(groups, values, out):
+    """out[g] += sum of values in group g, exactly in int64"""
+    if not len(groups):
+        return
+    order = np.argsort(groups, kind='stable')
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.concatenate(([True], sorted_groups[1:] != sorted_groups[:-1])))
+    out[sorted_groups[starts]] += np.add.reduceat(values[order], starts)
+
+
+def _div_round_array(numerators, denominator):
+    """div_round() over an int64 array"""
+    magnitudes = (2 * np.abs(numerators) + denominator) // (2 * denominator)
+    return np.where(numerators < 0, -magnitudes, magnitudes)
+
+
+def _check_range(subtotal, taxable, basis_points):
+    """Raise ValueError when an invoice is beyond MAX_PAISE or MAX_BASIS_POINTS"""
+    if (abs(subtotal) > MAX_PAISE or any(abs(amount) > MAX_PAISE for amount in taxable)
+            or any(abs(rate) > MAX_BASIS_POINTS for rate in basis_points)):
+        raise ValueError(OUT_OF_RANGE)
+
+
+def _result(subtotal, taxes, inter_state):
+    """Rupee totals from subtotal paise and [(basis points, taxable paise, tax paise)]"""
+    total_tax = 0
+    split_totals = [0, 0, 0]
+    tax_breakup = {}
+    gst_split = {}
+    for basis_points, taxable, tax in taxes:
+        key = rate_key(basis_points)
+        split = split_tax(tax, inter_state)
+        total_tax += tax
+        for index, part in enumerate(split):
+            split_totals[index] += part
+        tax_breakup[key] = to_rupees(tax)
+        gst_split[key] = {'taxable': to_rupees(taxable), 'cgst': to_rupees(split[0]),
+                          'sgst': to_rupees(split[1]), 'igst': to_rupees(split[2])}
+
+    return {
+        'subtotal': to_rupees(subtotal),
+        'tax_breakup': tax_breakup,
+        'total_tax': to_rupees(total_tax),
+        'total': to_rupees(subtotal + total_tax),
+        'cgst': to_rupees(split_totals[0]),
+        'sgst': to_rupees(split_totals[1]),
+        'igst': to_rupees(split_totals[2]),
+        'gst_split': gst_split,
+    }
@@ -0,0 +1,87 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from functools import wraps
+from flask import current_app, make_response, request, session
+from app.utils.cache import TTLCache
+
+
+# Config that public templates render (see inject_company)
+COMPANY_KEYS = ('COMPANY_NAME', 'COMPANY_GSTIN', 'COMPANY_ADDRESS', 'COMPANY_EMAIL', 'COMPANY_PHONE')
+
+
+class PageCache:
+    """Rendered HTML of public pages for visitors without a session
+
+    Pages are keyed by URL and by a version hash of the company config and
+    built asset names, the only inputs besides the templates themselves.
+    None of them change without a restart, so a hit never touches MongoDB.
+    """
+
+    def __init__(self, maxsize=256, ttl=3600):
+        self.pages = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.version = ''
+
+    def configure(self, maxsize=None, ttl=None, version=None):
+        """Change limits and version; drops cached pages"""
+        self.pages.configure(maxsize=maxsize, ttl=ttl)
+        if version is not None:
+            self.version = version
+
+    def get(self, url):
+        return self.pages.get((self.version, url))
+
+    def set(self, url, page):
+        self.pages.set((self.version, url), page)
+
+    def clear(self):
+        self.pages.clear()
+
+
+page_cache = PageCache()
+
+
+def content_version(app):
+    """Hash of the non-template inputs of a public page"""
+    company = {key: app.config[key] for key in COMPANY_KEYS}
+    assets = app.extensions['asset_manifest'].entries
+    data = json.dumps([company, assets], sort_keys=True).encode('utf-8')
+    return hashlib.sha256(data).hexdigest()[:16]
+
+
+def cached_page(view):
+    """Serve a view from page_cache to anonymous GETs, answering conditional requests
+
+    Requests carrying a session cookie may be signed in (the navbar differs),
+    so they are rendered as usual and never cached.
+    """
+    @wraps(view)
+    def decorated_function(*args, **kwargs):
+        if (request.method not in ('GET', 'HEAD')
+                or current_app.config['SESSION_COOKIE_NAME'] in request.cookies):
+            return view(*args, **kwargs)
+
+        page = page_cache.get(request.url)
+        if page is None:
+            response = make_response(view(*args, **kwargs))
+            if (response.status_code != 200 or response.direct_passthrough
+                    or getattr(session, 'modified', False)):
+                return response
+            body = response.get_data()
+            page = {
+                'body': body,
+                'content_type': response.content_type,
+                'etag': hashlib.sha256(body).hexdigest()[:32],
+                'last_modified': datetime.now(timezone.utc).replace(microsecond=0)
+            }
+            page_cache.set(request.url, page)
+
+        response = current_app.response_class(page['body'], content_type=page['content_type'])
+        response.set_etag(page['etag'])
+        response.last_modified = page['last_modified']
+        # Browsers revalidate every time (a 304 when nothing changed); shared
+        # caches must not hand the anonymous page to signed-in users
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Cookie')
+        return response.make_conditional(request)
+    return decorated_function
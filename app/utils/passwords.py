@@ -0,0 +1,103 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import bcrypt
+
+
+class PasswordHasherBusy(RuntimeError):
+    """Raised when too many password hashes are already queued"""
+
+
+class PasswordHasher:
+    """bcrypt hashing on a small, bounded thread pool
+
+    bcrypt releases the GIL, so hashes run in parallel with request threads
+    (gthread workers keep serving other routes during a login). At most
+    `workers` hashes run and `max_pending` wait per process; beyond that
+    callers get PasswordHasherBusy straight away instead of piling up, so
+    a login spike cannot take every CPU and thread. A hash that does not
+    finish within `timeout` seconds also raises PasswordHasherBusy.
+    """
+
+    def __init__(self, rounds=12, workers=2, max_pending=16, timeout=10):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def configure(self, rounds=None, workers=None, max_pending=None, timeout=None):
+        """Change cost/pool limits; the pool is rebuilt on next use"""
+        with self._lock:
+            if rounds is not None:
+                self.rounds = rounds
+            if workers is not None:
+                self.workers = workers
+            if max_pending is not None:
+                self.max_pending = max_pending
+            if timeout is not None:
+                self.timeout = timeout
+            self._slots = threading.BoundedSemaphore(self.workers + self.max_pending)
+            self._shutdown()
+
+    def _shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def reset_after_fork(self):
+        """Forked workers must not reuse the parent's pool threads"""
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.workers + self.max_pending)
+
+    def _run(self, fn, *args):
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise PasswordHasherBusy('Too many logins in progress, please try again')
+        try:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                        thread_name_prefix='bcrypt')
+                executor = self._executor
+            future = executor.submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+        # The slot is held until the hash finishes, even if the caller
+        # stops waiting, so the pool backlog stays bounded
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise PasswordHasherBusy('Too many logins in progress, please try again')
+
+    def hash(self, password):
+        """Hash a password at the configured cost"""
+        return self._run(lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(self.rounds)))
+
+    def verify(self, password, password_hash):
+        """Check a password against a stored hash"""
+        if isinstance(password_hash, str):
+            password_hash = password_hash.encode('utf-8')
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), password_hash)
+
+    def needs_rehash(self, password_hash):
+        """Whether a stored hash was made at a different cost than configured"""
+        if isinstance(password_hash, str):
+            password_hash = password_hash.encode('utf-8')
+        try:
+            # $2b$12$<salt+hash>
+            return int(password_hash.split(b'$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+
+password_hasher = PasswordHasher()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=password_hasher.reset_after_fork)
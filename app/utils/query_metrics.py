@@ -0,0 +1,184 @@
+import json
+import re
+import threading
+import time
+import traceback
+from flask import g, request
+from pymongo import monitoring
+
+
+# Fields dropped from commands quoted in slow-query logs
+NOISE_FIELDS = {'lsid', 'txnNumber', '$db', '$clusterTime', '$readPreference'}
+
+# Longest command text quoted in a slow-query log
+MAX_COMMAND_LENGTH = 1000
+
+# Top-level command options quoted as they are; every other value in a
+# logged command is replaced by its type, so filters, updates and inserted
+# documents (password hashes, session data) never reach the logs
+VERBATIM_FIELDS = {'sort', 'projection', 'hint', 'limit', 'skip', 'batchSize', 'ordered',
+                   'allowDiskUse', 'new', 'remove'}
+
+NON_TOKEN = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class QueryMetrics(monitoring.CommandListener):
+    """Command listener that totals MongoDB commands and time on the current thread
+
+    Listeners run on the thread that issued the command, so each request
+    thread sees only its own commands. Nothing is recorded outside start()/stop().
+    """
+
+    def __init__(self, slow_query_ms=None, on_slow_query=None):
+        self.slow_query_ms = slow_query_ms
+        self.on_slow_query = on_slow_query
+        self._local = threading.local()
+
+    def start(self):
+        self._local.stats = {'count': 0, 'time_ms': 0.0, 'collections': {}}
+        self._local.pending = {}
+
+    def stop(self):
+        stats = getattr(self._local, 'stats', None)
+        self._local.stats = None
+        self._local.pending = None
+        return stats
+
+    def started(self, event):
+        pending = getattr(self._local, 'pending', None)
+        if pending is None:
+            return
+        command = event.command
+        collection = command.get(event.command_name)
+        if event.command_name == 'getMore':
+            collection = command.get('collection')
+        if not isinstance(collection, str):
+            collection = event.command_name
+        pending[event.request_id] = (collection, command)
+
+    def succeeded(self, event):
+        self._finish(event)
+
+    def failed(self, event):
+        self._finish(event)
+
+    def _finish(self, event):
+        stats = getattr(self._local, 'stats', None)
+        if stats is None:
+            return
+        collection, command = self._local.pending.pop(event.request_id, (event.command_name, None))
+        duration_ms = event.duration_micros / 1000
+        stats['count'] += 1
+        stats['time_ms'] += duration_ms
+        per_collection = stats['collections'].setdefault(collection, {'count': 0, 'time_ms': 0.0})
+        per_collection['count'] += 1
+        per_collection['time_ms'] += duration_ms
+
+        if (self.slow_query_ms is not None and duration_ms >= self.slow_query_ms
+                and self.on_slow_query is not None):
+            # Still on the caller's thread, so the stack shows who issued it
+            self.on_slow_query(event.command_name, collection, command, duration_ms,
+                               traceback.extract_stack()[:-3])
+
+
+query_metrics = QueryMetrics()
+
+
+def command_shape(value, key=None):
+    """value with its keys and operators kept and other values replaced by <type>"""
+    if isinstance(value, dict):
+        return {k: command_shape(v, k) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        if key == 'pipeline':
+            return [command_shape(stage) for stage in value]
+        shape = [command_shape(item) for item in value[:1]]
+        if len(value) > 1:
+            shape.append(f'... {len(value)} items')
+        return shape
+    return f'<{type(value).__name__}>'
+
+
+def format_command(command):
+    """Short, readable shape of a command for logs, without its values"""
+    if command is None:
+        return ''
+    fields = [(key, value) for key, value in command.items() if key not in NOISE_FIELDS]
+    # The first field names the command and its collection
+    shape = {key: value if index == 0 or key in VERBATIM_FIELDS else command_shape(value, key)
+             for index, (key, value) in enumerate(fields)}
+    if 'documents' in shape:
+        shape['documents'] = f"<{len(command['documents'])} documents>"
+    text = str(shape)
+    if len(text) > MAX_COMMAND_LENGTH:
+        text = text[:MAX_COMMAND_LENGTH] + '...'
+    return text
+
+
+def server_timing(stats, total_ms):
+    """Server-Timing header value: request time, DB time and DB time per collection"""
+    metrics = [
+        f'app;dur={total_ms:.1f}',
+        f'db;dur={stats["time_ms"]:.1f};desc="{stats["count"]} queries"',
+    ]
+    for collection, entry in sorted(stats['collections'].items(),
+                                    key=lambda item: item[1]['time_ms'], reverse=True):
+        metrics.append(f'db.{NON_TOKEN.sub("_", collection)};dur={entry["time_ms"]:.1f};'
+                       f'desc="{entry["count"]}"')
+    return ', '.join(metrics)
+
+
+def init_query_metrics(app):
+    """Count each request's MongoDB commands and time; log and expose them
+
+    The client must have been created with query_metrics as an event
+    listener (DB_METRICS).
+    """
+    slow_request_ms = app.config['SLOW_REQUEST_MS']
+
+    def log_slow_query(command_name, collection, command, duration_ms, stack):
+        frames = [frame for frame in stack if frame.filename.startswith(app.root_path)]
+        app.logger.warning(
+            'Slow MongoDB %s on %s (%.1f ms) during %s %s: %s\n%s',
+            command_name, collection, duration_ms, request.method, request.path,
+            format_command(command), ''.join(traceback.format_list(frames or stack[-8:]))
+        )
+
+    query_metrics.slow_query_ms = app.config['SLOW_QUERY_MS']
+    query_metrics.on_slow_query = log_slow_query
+
+    @app.before_request
+    def start_query_metrics():
+        g.request_started = time.perf_counter()
+        query_metrics.start()
+
+    @app.after_request
+    def report_query_metrics(response):
+        stats = query_metrics.stop()
+        if stats is None:
+            return response
+        total_ms = (time.perf_counter() - g.request_started) * 1000
+        if app.config['DB_METRICS_SERVER_TIMING']:
+            response.headers['Server-Timing'] = server_timing(stats, total_ms)
+
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(total_ms, 1),
+            'db_count': stats['count'],
+            'db_ms': round(stats['time_ms'], 1),
+            'db_collections': {
+                collection: {'count': entry['count'], 'ms': round(entry['time_ms'], 1)}
+                for collection, entry in stats['collections'].items()
+            },
+        }
+        if slow_request_ms is not None and total_ms >= slow_request_ms:
+            app.logger.warning('Slow request %s', json.dumps(record))
+        else:
+            app.logger.info('Request %s', json.dumps(record))
+        return response
+
+    @app.teardown_request
+    def stop_query_metrics(exc):
+        query_metrics.stop()
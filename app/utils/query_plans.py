@@ -0,0 +1,133 @@
+import copy
+import threading
+from contextlib import contextmanager
+from pymongo import monitoring
+
+
+# Pass as `comment=` on queries that are meant to read a whole collection
+FULL_SCAN = 'full-scan'
+
+# Commands that read through the query planner and can be explained
+EXPLAINABLE = {'find', 'aggregate', 'count', 'distinct', 'findAndModify', 'update', 'delete'}
+
+# Session/transaction fields that explain rejects
+STRIPPED_FIELDS = {'lsid', 'txnNumber', 'autocommit', 'startTransaction', 'readConcern',
+                   'writeConcern', '$db', '$clusterTime', '$readPreference'}
+
+
+class QueryPlanError(AssertionError):
+    """Raised when a captured query is planned as a collection scan"""
+
+    def __init__(self, violations):
+        self.violations = violations
+        lines = [f"{v['collection']}: {v['command']}" for v in violations]
+        super().__init__('Queries without a usable index (COLLSCAN):\n  ' + '\n  '.join(lines))
+
+
+class QueryRecorder(monitoring.CommandListener):
+    """Command listener that captures explainable commands on the current thread"""
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def start(self):
+        self._local.commands = []
+
+    def stop(self):
+        commands = getattr(self._local, 'commands', None) or []
+        self._local.commands = None
+        return commands
+
+    def started(self, event):
+        commands = getattr(self._local, 'commands', None)
+        if commands is None or event.command_name not in EXPLAINABLE:
+            return
+        command = event.command
+        if command.get('comment') == FULL_SCAN:
+            return
+        commands.append((event.database_name, {
+            key: copy.deepcopy(value) for key, value in command.items()
+            if key not in STRIPPED_FIELDS
+        }))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+query_recorder = QueryRecorder()
+
+
+def _statements(command):
+    """Split multi-statement update/delete commands; explain takes one at a time"""
+    for field in ('updates', 'deletes'):
+        if field in command:
+            for statement in command[field]:
+                single = {key: value for key, value in command.items() if key != field}
+                single[field] = [statement]
+                yield single
+            return
+    yield command
+
+
+def _has_collscan(plan):
+    """Whether any chosen stage in an explain document is a COLLSCAN"""
+    if isinstance(plan, dict):
+        if plan.get('stage') == 'COLLSCAN':
+            return True
+        return any(_has_collscan(value) for key, value in plan.items() if key != 'rejectedPlans')
+    if isinstance(plan, list):
+        return any(_has_collscan(value) for value in plan)
+    return False
+
+
+def find_collscans(client, commands):
+    """Explain captured commands, returning the ones planned as collection scans"""
+    violations = []
+    for database_name, command in commands:
+        for statement in _statements(command):
+            explain = client[database_name].command(
+                {'explain': statement, 'verbosity': 'queryPlanner'}
+            )
+            if _has_collscan(explain):
+                name = next(iter(statement))
+                violations.append({'collection': statement[name], 'command': statement})
+    return violations
+
+
+@contextmanager
+def assert_indexed(client):
+    """Fail with QueryPlanError if any query in the block scans a collection
+
+    Requires the client to have been created with query_recorder as an event
+    listener (QUERY_PLAN_CHECK).
+    """
+    query_recorder.start()
+    try:
+        yield
+    finally:
+        commands = query_recorder.stop()
+    violations = find_collscans(client, commands)
+    if violations:
+        raise QueryPlanError(violations)
+
+
+def init_query_plan_check(app, client):
+    """Explain every query a request makes and fail it on a COLLSCAN"""
+
+    @app.before_request
+    def start_query_capture():
+        query_recorder.start()
+
+    @app.after_request
+    def check_query_plans(response):
+        violations = find_collscans(client, query_recorder.stop())
+        if violations:
+            raise QueryPlanError(violations)
+        return response
+
+    @app.teardown_request
+    def stop_query_capture(exc):
+        query_recorder.stop()
@@ -0,0 +1,125 @@
+import re
+import unicodedata
+
+
+# Longest prefix stored per word; longer query words are matched on this
+# prefix and then checked against the full word
+MAX_PREFIX_LENGTH = 20
+
+# Results returned by a search, and candidates fetched for ranking from
+# each of the two candidate queries
+DEFAULT_LIMIT = 50
+CANDIDATE_LIMIT = 200
+
+_NON_WORD = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(text):
+    """Lower-case, accent-free text with punctuation folded to single spaces"""
+    if not text:
+        return ''
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_WORD.sub(' ', text.casefold()).strip()
+
+
+def words(*texts):
+    """Distinct normalized words across texts, in order of appearance"""
+    seen = []
+    for text in texts:
+        for word in normalize(text).split():
+            if word not in seen:
+                seen.append(word)
+    return seen
+
+
+def prefixes(*texts):
+    """Every word prefix (up to MAX_PREFIX_LENGTH) of the given field values
+
+    Stored on the document as `search_prefixes` and indexed, so a search
+    is an index lookup on the query's words instead of a regex scan.
+    """
+    keys = set()
+    for word in words(*texts):
+        for length in range(1, min(len(word), MAX_PREFIX_LENGTH) + 1):
+            keys.add(word[:length])
+    return sorted(keys)
+
+
+def search_keys(*texts):
+    """Search fields stored on a document; texts are its searchable fields, primary first
+
+    search_prefixes holds every word prefix, search_name the normalized
+    primary field, so names equal to or starting with a query are found
+    by an indexed prefix scan.
+    """
+    return {'search_prefixes': prefixes(*texts), 'search_name': normalize(texts[0] if texts else '')}
+
+
+def query_terms(query):
+    """Normalized query words, truncated to the stored prefix length"""
+    return sorted({word[:MAX_PREFIX_LENGTH] for word in words(query)})
+
+
+def build_filter(query, **extra):
+    """Mongo filter matching documents whose words start with every query word
+
+    Returns None when the query has no searchable characters.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return None
+    return {'search_prefixes': {'$all': terms}, **extra}
+
+
+def find_candidates(collection, query, **extra):
+    """Documents of a collection matching the query, to be ranked
+
+    Documents whose primary field equals or starts with the query come
+    first (up to CANDIDATE_LIMIT, exact match first), so rank() always sees
+    them. Up to CANDIDATE_LIMIT other matches follow, in no particular
+    order: among those, ranking is best-effort.
+    """
+    query_filter = build_filter(query, **extra)
+    if query_filter is None:
+        return []
+    # Normalized text is only [0-9a-z ], so the anchored regex needs no
+    # escaping and stays a simple prefix scan on the search_name index
+    phrase = ' '.join(words(query))
+    leading = list(collection.find({'search_name': {'$regex': f'^{phrase}'}, **extra})
+                   .sort('search_name', 1).limit(CANDIDATE_LIMIT))
+    query_filter['_id'] = {'$nin': [document['_id'] for document in leading]}
+    return leading + list(collection.find(query_filter).limit(CANDIDATE_LIMIT))
+
+
+def rank(documents, query, fields, limit=DEFAULT_LIMIT):
+    """Order candidates by relevance to the query and keep the best `limit`
+
+    The first field is the primary one (e.g. the name): an exact match beats
+    a match at its start, which beats word-prefix matches elsewhere.
+    """
+    query_words = words(query)
+    phrase = ' '.join(query_words)
+    scored = []
+
+    for document in documents:
+        values = [normalize(document.get(field)) for field in fields]
+        doc_words = words(*values)
+        # Long words are only indexed up to MAX_PREFIX_LENGTH
+        if not all(any(w.startswith(q) for w in doc_words) for q in query_words):
+            continue
+
+        primary = values[0]
+        score = 0
+        if primary == phrase:
+            score += 100
+        elif primary.startswith(phrase):
+            score += 50
+        primary_words = primary.split()
+        score += 10 * sum(1 for q in query_words if q in primary_words)
+        score += 5 * sum(1 for q in query_words if any(w.startswith(q) for w in primary_words))
+        score += sum(1 for q in query_words if q in doc_words)
+        scored.append((-score, primary, document))
+
+    scored.sort(key=lambda entry: entry[:2])
+    return [document for _, _, document in scored[:limit]]
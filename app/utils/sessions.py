@@ -0,0 +1,162 @@
+import pickle
+import secrets
+from datetime import datetime, timezone
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import Signer, BadSignature, want_bytes
+from pymongo import ASCENDING, IndexModel
+from werkzeug.datastructures import CallbackDict
+from app.utils.cache import TTLCache
+
+
+class MongoSession(CallbackDict, SessionMixin):
+    """Server-side session that tracks whether it was modified"""
+
+    def __init__(self, initial=None, sid=None, expiration=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        CallbackDict.__init__(self, initial, on_update)
+        self.sid = sid
+        self.expiration = expiration
+        self.new = new
+        self.modified = False
+
+
+class MongoSessionInterface(SessionInterface):
+    """MongoDB session store that only writes when it has to
+
+    - Unmodified sessions are not written back; their expiry is only
+      pushed out once it would move by more than refresh_after.
+    - Empty sessions are never stored, so anonymous pages cost nothing.
+    - Expired documents are purged by a TTL index on `expiration`.
+    - An optional process-local front cache serves repeat reads; keep it
+      small/short since other workers' writes only reach it via the TTL.
+
+    Documents keep the Flask-Session layout ({'id', 'val', 'expiration'},
+    pickled values, same signer salt), so existing sessions stay valid.
+    """
+
+    serializer = pickle
+    session_class = MongoSession
+
+    # Reconciled by `flask db ensure-indexes`
+    INDEXES = [
+        IndexModel([('id', ASCENDING)], unique=True),
+        IndexModel([('expiration', ASCENDING)], expireAfterSeconds=0),
+    ]
+
+    def __init__(self, collection, key_prefix='session:', use_signer=True,
+                 permanent=True, refresh_after=None, cache_size=0, cache_ttl=5):
+        self.store = collection
+        self.key_prefix = key_prefix
+        self.use_signer = use_signer
+        self.permanent = permanent
+        self.refresh_after = refresh_after
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl) if cache_size else None
+
+    def _get_signer(self, app):
+        return Signer(app.secret_key, salt='flask-session', key_derivation='hmac')
+
+    def _new_session(self):
+        return self.session_class(sid=secrets.token_urlsafe(32), new=True)
+
+    @staticmethod
+    def _as_utc(value):
+        if value is not None and value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value
+
+    def _load(self, store_id):
+        """Return (serialized value, expiration) from cache or MongoDB"""
+        if self.cache:
+            record = self.cache.get(store_id)
+            if record is not None:
+                return record
+
+        document = self.store.find_one({'id': store_id}, {'val': 1, 'expiration': 1})
+        if not document:
+            return None
+
+        record = (document.get('val'), self._as_utc(document.get('expiration')))
+        if self.cache:
+            self.cache.set(store_id, record)
+        return record
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return self._new_session()
+
+        sid = cookie
+        if self.use_signer:
+            try:
+                sid = self._get_signer(app).unsign(want_bytes(cookie)).decode('utf-8')
+            except (BadSignature, UnicodeDecodeError):
+                return self._new_session()
+
+        record = self._load(self.key_prefix + sid)
+        if record is None:
+            return self._new_session()
+
+        val, expiration = record
+        # The TTL monitor runs about once a minute, so check expiry here too
+        if expiration is None or expiration <= datetime.now(timezone.utc):
+            return self._new_session()
+
+        try:
+            data = self.serializer.loads(want_bytes(val))
+        except Exception:
+            return self._new_session()
+        return self.session_class(data, sid=sid, expiration=expiration)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        store_id = self.key_prefix + session.sid
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete_one({'id': store_id})
+                if self.cache:
+                    self.cache.delete(store_id)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.new and self.permanent and '_permanent' not in session:
+            session.permanent = True
+
+        now = datetime.now(timezone.utc)
+        cookie_expires = self.get_expiration_time(app, session)
+        # Non-permanent sessions still need a server-side expiry
+        expiration = cookie_expires or now + app.permanent_session_lifetime
+
+        if session.modified:
+            val = self.serializer.dumps(dict(session))
+            self.store.replace_one(
+                {'id': store_id},
+                {'id': store_id, 'val': val, 'expiration': expiration},
+                upsert=True
+            )
+            if self.cache:
+                self.cache.set(store_id, (val, expiration))
+        elif self.refresh_after is not None and session.expiration \
+                and expiration - session.expiration > self.refresh_after:
+            self.store.update_one({'id': store_id}, {'$set': {'expiration': expiration}})
+            if self.cache:
+                self.cache.delete(store_id)
+        else:
+            return
+
+        cookie_value = session.sid
+        if self.use_signer:
+            cookie_value = self._get_signer(app).sign(want_bytes(session.sid)).decode('utf-8')
+        response.set_cookie(
+            name, cookie_value,
+            expires=cookie_expires,
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
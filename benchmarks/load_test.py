@@ -0,0 +1,282 @@
+"""HTTP load test for the main owner and client flows
+
+Runs against a server started on a dataset from `flask db seed` (the seeded
+logins and coupons are assumed) and reports latency percentiles and
+throughput per route:
+
+    flask --app run.py db seed --size 100k --yes
+    gunicorn -c gunicorn_config.py wsgi:application
+    python benchmarks/load_test.py --base-url http://127.0.0.1:8000 --duration 60 \\
+        --json results.json --compare baseline.json
+
+Owners log in and cycle through the dashboard, invoice list and invoice
+print view. Clients cycle through the invoice list, print view, payment
+summary and coupon validation, and check out one invoice every
+--checkout-every iterations. Every virtual user logs in again every
+--relogin-every iterations. With --compare, the exit status is 1 when a
+route's p95 grew by more than --max-regression over the baseline file.
+Only the standard library is used.
+"""
+import argparse
+import http.client
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+
+INVOICE_LINK = re.compile(r'/invoices/([0-9a-f]{24})"')
+PAYABLE_INVOICE = re.compile(r'value="([0-9a-f]{24})"\s+data-amount="([0-9.]+)"')
+
+COUPON_CODE = 'SEED10'
+
+
+class Session:
+    """One keep-alive connection with its own cookies; redirects are not followed"""
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self._connect = lambda: connection_class(parts.netloc, timeout=timeout)
+        self._connection = self._connect()
+        self.cookies = {}
+
+    def request(self, method, path, form=None, json_body=None):
+        """Send a request, returning (status, body)"""
+        headers = {}
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif json_body is not None:
+            body = json.dumps(json_body)
+            headers['Content-Type'] = 'application/json'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+
+        for attempt in (1, 2):
+            try:
+                self._connection.request(method, path, body=body, headers=headers)
+                response = self._connection.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                # The server closed an idle keep-alive connection; retry once
+                self._connection.close()
+                self._connection = self._connect()
+                if attempt == 2:
+                    raise
+
+        for header in response.msg.get_all('Set-Cookie') or []:
+            cookie = SimpleCookie(header)
+            for name, morsel in cookie.items():
+                if morsel['expires'] and 'Thu, 01 Jan 1970' in morsel['expires']:
+                    self.cookies.pop(name, None)
+                else:
+                    self.cookies[name] = morsel.value
+        return response.status, data.decode('utf-8', 'replace')
+
+
+class Recorder:
+    """Thread-safe latency samples per route"""
+
+    def __init__(self):
+        self._samples = {}
+        self._errors = {}
+        self._lock = threading.Lock()
+        self.recording = False
+
+    def timed(self, route, call, ok=lambda status, body: status < 400):
+        """Run call(), recording its latency under route; returns its result"""
+        started = time.perf_counter()
+        try:
+            status, body = call()
+            success = ok(status, body)
+        except (OSError, http.client.HTTPException):
+            status, body, success = 0, '', False
+        elapsed = time.perf_counter() - started
+        if self.recording:
+            with self._lock:
+                self._samples.setdefault(route, []).append(elapsed)
+                if not success:
+                    self._errors[route] = self._errors.get(route, 0) + 1
+        return status, body
+
+    def summary(self, duration):
+        """{route: {'count', 'errors', 'rps', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms'}}"""
+        results = {}
+        for route, samples in sorted(self._samples.items()):
+            samples = sorted(samples)
+            results[route] = {
+                'count': len(samples),
+                'errors': self._errors.get(route, 0),
+                'rps': round(len(samples) / duration, 2),
+                'p50_ms': round(percentile(samples, 50) * 1000, 1),
+                'p95_ms': round(percentile(samples, 95) * 1000, 1),
+                'p99_ms': round(percentile(samples, 99) * 1000, 1),
+                'max_ms': round(samples[-1] * 1000, 1),
+            }
+        return results
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of sorted samples"""
+    if not samples:
+        return 0.0
+    rank = max(0, min(len(samples) - 1, round(pct / 100 * len(samples) + 0.5) - 1))
+    return samples[rank]
+
+
+def json_field(body, field):
+    """A field of a JSON response body, or None"""
+    try:
+        return json.loads(body).get(field)
+    except (ValueError, AttributeError):
+        return None
+
+
+def login(session, recorder, email, password):
+    session.cookies.clear()
+    status, _ = recorder.timed(
+        'login',
+        lambda: session.request('POST', '/login', form={'email': email, 'password': password}),
+        ok=lambda status, body: status == 302
+    )
+    return status == 302
+
+
+def print_invoice(session, recorder, rng, list_body):
+    invoice_ids = INVOICE_LINK.findall(list_body)
+    if invoice_ids:
+        invoice_id = rng.choice(invoice_ids)
+        recorder.timed('print', lambda: session.request('GET', f'/invoices/{invoice_id}/print'))
+
+
+def owner_iteration(session, recorder, rng, iteration, options):
+    recorder.timed('dashboard', lambda: session.request('GET', '/dashboard'))
+    _, body = recorder.timed('invoice_list', lambda: session.request('GET', '/invoices/'))
+    print_invoice(session, recorder, rng, body)
+
+
+def client_iteration(session, recorder, rng, iteration, options):
+    _, body = recorder.timed('invoice_list', lambda: session.request('GET', '/invoices/'))
+    print_invoice(session, recorder, rng, body)
+
+    _, body = recorder.timed('payment_summary', lambda: session.request('GET', '/invoices/payments/summary'))
+    payable = PAYABLE_INVOICE.findall(body)
+    amount = float(payable[0][1]) if payable else 1000.0
+    recorder.timed(
+        'validate_coupon',
+        lambda: session.request('POST', '/invoices/payments/validate-coupon',
+                                json_body={'coupon_code': COUPON_CODE, 'amount': amount})
+    )
+
+    if payable and options.checkout_every and iteration % options.checkout_every == 0:
+        invoice_id, amount = rng.choice(payable)
+        _, body = recorder.timed(
+            'checkout.process',
+            lambda: session.request('POST', '/invoices/payments/process', json_body={
+                'invoice_ids': [invoice_id], 'payment_type': 'selected', 'amount': float(amount)
+            }),
+            ok=lambda status, body: status == 200 and json_field(body, 'success')
+        )
+        payment_id = json_field(body, 'payment_id')
+        if payment_id:
+            recorder.timed('checkout.confirm',
+                           lambda: session.request('GET', f'/invoices/payments/confirm/{payment_id}'))
+            recorder.timed('checkout.settle',
+                           lambda: session.request('GET', f'/invoices/payments/success?payment_id={payment_id}'))
+
+
+def virtual_user(index, email, iteration_fn, recorder, deadline, options):
+    rng = random.Random(options.seed + index)
+    session = Session(options.base_url)
+    iteration = 0
+    while time.monotonic() < deadline:
+        if iteration % options.relogin_every == 0 and not login(session, recorder, email, options.password):
+            time.sleep(1)
+            iteration += 1
+            continue
+        iteration += 1
+        iteration_fn(session, recorder, rng, iteration, options)
+        if options.think_time:
+            time.sleep(rng.expovariate(1 / options.think_time))
+
+
+def compare(results, baseline, max_regression):
+    """Routes whose p95 regressed beyond the allowed fraction"""
+    regressions = []
+    for route, result in results.items():
+        before = baseline.get(route)
+        if before and before['p95_ms'] and result['p95_ms'] > before['p95_ms'] * (1 + max_regression):
+            regressions.append((route, before['p95_ms'], result['p95_ms']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    parser.add_argument('--owners', type=int, default=2, help='Owner virtual users (default 2)')
+    parser.add_argument('--clients', type=int, default=8,
+                        help='Client virtual users, logging in as client0..N-1@seed.test (default 8)')
+    parser.add_argument('--password', default='seed-password')
+    parser.add_argument('--duration', type=float, default=60, help='Measured seconds (default 60)')
+    parser.add_argument('--warmup', type=float, default=10, help='Unmeasured seconds first (default 10)')
+    parser.add_argument('--think-time', type=float, default=0,
+                        help='Mean pause between iterations in seconds (default 0, closed loop)')
+    parser.add_argument('--checkout-every', type=int, default=10,
+                        help='Client iterations per checkout; 0 disables (default 10)')
+    parser.add_argument('--relogin-every', type=int, default=50,
+                        help='Iterations between logins (default 50)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', dest='json_path', help='Write results to this file')
+    parser.add_argument('--compare', dest='baseline_path', help='Baseline results to compare p95 against')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='Allowed p95 growth over the baseline (default 0.2 = 20%%)')
+    options = parser.parse_args(argv)
+
+    recorder = Recorder()
+    deadline = time.monotonic() + options.warmup + options.duration
+    users = [('owner@seed.test', owner_iteration)] * options.owners
+    users += [(f'client{i}@seed.test', client_iteration) for i in range(options.clients)]
+    threads = [
+        threading.Thread(target=virtual_user, daemon=True,
+                         args=(index, email, iteration_fn, recorder, deadline, options))
+        for index, (email, iteration_fn) in enumerate(users)
+    ]
+    for thread in threads:
+        thread.start()
+
+    time.sleep(options.warmup)
+    recorder.recording = True
+    started = time.monotonic()
+    for thread in threads:
+        thread.join()
+    results = recorder.summary(time.monotonic() - started)
+
+    print(f"{'route':<18}{'count':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for route, r in results.items():
+        print(f"{route:<18}{r['count']:>8}{r['errors']:>8}{r['rps']:>9}{r['p50_ms']:>9}"
+              f"{r['p95_ms']:>9}{r['p99_ms']:>9}{r['max_ms']:>9}")
+
+    if options.json_path:
+        with open(options.json_path, 'w', encoding='utf-8') as f:
+            json.dump({'options': vars(options), 'routes': results}, f, indent=2)
+
+    if options.baseline_path:
+        with open(options.baseline_path, encoding='utf-8') as f:
+            baseline = json.load(f)['routes']
+        regressions = compare(results, baseline, options.max_regression)
+        for route, before, after in regressions:
+            print(f'REGRESSION {route}: p95 {before} ms -> {after} ms', file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
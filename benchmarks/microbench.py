@@ -0,0 +1,217 @@
+"""Microbenchmarks for the per-invoice CPU path
+
+Times tax totals, item/client snapshots, coupon validation and rendering of
+invoices/invoice_v1.html across line-item counts and numbers of distinct tax
+rates. No database is needed: invoices are built in memory and the coupon
+comes from a primed coupon cache.
+
+    python benchmarks/microbench.py                                # print timings
+    python benchmarks/microbench.py --save benchmarks/baseline.json
+    python benchmarks/microbench.py --compare benchmarks/baseline.json
+
+With --compare, the exit status is 1 when a case's best time grew by more
+than --threshold over the baseline. Baselines are only comparable on the
+machine that recorded them; re-record benchmarks/baseline.json there
+after an intended change.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bson import ObjectId  # noqa: E402
+
+
+ITEM_COUNTS = (1, 10, 100, 1000, 5000)
+RENDER_ITEM_COUNTS = (1, 10, 100, 1000)
+# Distinct tax rates on an invoice
+RATE_SETS = {
+    1: (18,),
+    3: (5, 12, 18),
+    5: (0, 5, 12, 18, 28),
+}
+QUICK_ITEM_COUNTS = (1, 100)
+
+
+def make_products(count, rates, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            '_id': ObjectId(),
+            'name': f'Product {index}',
+            'description': f'Description of product {index}',
+            'hsn': rng.choice(('998315', '998314', '997331')),
+            'rate': round(rng.uniform(50, 50000), 2),
+            'tax_rate': float(rng.choice(rates)),
+        }
+        for index in range(count)
+    ]
+
+
+def make_client():
+    return {
+        '_id': ObjectId(),
+        'company_name': 'Apex Technologies',
+        'gstin': '27ABCDE1234F1Z5',
+        'billing_address': '12 Market Road, Mumbai, Maharashtra',
+        'contact_person': 'A. Person',
+        'contact_email': 'accounts@apex.test',
+        'contact_phone': '+91 9000000000',
+    }
+
+
+def make_invoice(items, client, totals, snapshot):
+    issue_date = datetime(2026, 4, 1)
+    snapshot = dict(snapshot, client=client)
+    return {
+        '_id': ObjectId(),
+        'invoice_no': 'INV/26-27/00042',
+        'client_id': ObjectId(client['client_id']),
+        'items': items,
+        'subtotal': totals['subtotal'],
+        'tax_breakup': totals['tax_breakup'],
+        'total': totals['total'],
+        'status': 'ISSUED',
+        'snapshot': snapshot,
+        'issue_date': issue_date,
+        'due_date': issue_date + timedelta(days=30),
+        'paid_on': None,
+        'updated_at': issue_date,
+    }
+
+
+def build_cases(app, quick=False):
+    """[(name, callable)] for every benchmark case"""
+    from app.models.coupon import Coupon
+    from app.services.pdf_service import PdfService
+    from app.services.snapshot_service import SnapshotService
+    from app.services.tax_service import TaxService
+
+    item_counts = QUICK_ITEM_COUNTS if quick else ITEM_COUNTS
+    render_counts = QUICK_ITEM_COUNTS if quick else RENDER_ITEM_COUNTS
+    cases = []
+
+    for rate_count, rates in RATE_SETS.items():
+        for count in item_counts:
+            products = make_products(count, rates)
+            items = [SnapshotService.create_item_snapshot(p, 1 + i % 7) for i, p in enumerate(products)]
+            cases.append((f'tax.calculate_invoice_totals items={count} rates={rate_count}',
+                          lambda items=items: TaxService.calculate_invoice_totals(items)))
+
+    for count in item_counts:
+        products = make_products(count, RATE_SETS[5])
+        cases.append((f'snapshot.create_item_snapshot items={count}',
+                      lambda products=products: [SnapshotService.create_item_snapshot(p, 3) for p in products]))
+
+    client = make_client()
+    cases.append(('snapshot.create_client_snapshot', lambda: SnapshotService.create_client_snapshot(client)))
+
+    # The cases run for minutes; keep the primed coupons from expiring
+    Coupon.cache.configure(ttl=24 * 3600)
+    now = datetime.now(timezone.utc)
+    for code, discount_type, value in (('BENCHPCT', Coupon.TYPE_PERCENTAGE, 10),
+                                       ('BENCHFLAT', Coupon.TYPE_FIXED, 500)):
+        Coupon.cache.set(code, {
+            '_id': ObjectId(), 'code': code, 'description': 'Benchmark coupon',
+            'discount_type': discount_type, 'discount_value': float(value),
+            'max_uses': 1000, 'used_count': 10, 'is_active': True,
+            'valid_from': now - timedelta(days=1), 'valid_until': now + timedelta(days=30),
+            'min_amount': 100.0,
+        })
+        cases.append((f'coupon.validate_coupon {discount_type.lower()}',
+                      lambda code=code: Coupon.validate_coupon(code, 25000.0)))
+
+    with app.app_context():
+        snapshot = SnapshotService.create_snapshot()
+    client_snapshot = SnapshotService.create_client_snapshot(client)
+    for rate_count in (1, 5):
+        for count in render_counts:
+            products = make_products(count, RATE_SETS[rate_count])
+            items = [SnapshotService.create_item_snapshot(p, 1 + i % 7) for i, p in enumerate(products)]
+            totals = TaxService.calculate_invoice_totals(items)
+            invoice_snapshot = dict(snapshot, gst=TaxService.gst_summary(totals, {
+                'state_code': '27', 'state': 'Maharashtra', 'inter_state': False
+            }))
+            invoice = make_invoice(items, client_snapshot, totals, invoice_snapshot)
+            cases.append((f'render.invoice_v1 items={count} rates={rate_count}',
+                          lambda invoice=invoice: PdfService.render_html(invoice)))
+
+    return cases
+
+
+def measure(fn, repeat=5, min_time=0.2):
+    """Best and median seconds per call over `repeat` rounds of at least min_time"""
+    timer = timeit.Timer(fn)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+    rounds = sorted(t / number for t in timer.repeat(repeat=repeat, number=number))
+    return {'best_us': round(rounds[0] * 1e6, 2), 'median_us': round(rounds[len(rounds) // 2] * 1e6, 2),
+            'loops': number}
+
+
+def compare(results, baseline, threshold):
+    """Cases whose best time grew by more than threshold over the baseline"""
+    slower = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before and result['best_us'] > before['best_us'] * (1 + threshold):
+            slower.append((name, before['best_us'], result['best_us']))
+    return slower
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--filter', default='', help='Only run cases whose name contains this')
+    parser.add_argument('--quick', action='store_true', help='Fewer, smaller cases (1 and 100 items)')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing rounds per case (default 5)')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Seconds per round (default 0.2)')
+    parser.add_argument('--save', help='Write results as a baseline file')
+    parser.add_argument('--compare', help='Baseline file to compare against')
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help='Allowed slowdown over the baseline (default 0.15 = 15%%)')
+    options = parser.parse_args(argv)
+
+    from app import create_app
+    app = create_app('production')
+
+    results = {}
+    with app.test_request_context():
+        for name, fn in build_cases(app, quick=options.quick):
+            if options.filter not in name:
+                continue
+            results[name] = measure(fn, repeat=options.repeat, min_time=options.min_time)
+            print(f"{name:<52}{results[name]['best_us']:>14.2f} us{results[name]['median_us']:>14.2f} us")
+
+    if options.save:
+        with open(options.save, 'w', encoding='utf-8') as f:
+            json.dump({
+                'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                            'processor': platform.processor() or platform.machine(),
+                            'cpus': os.cpu_count()},
+                'cases': results
+            }, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if options.compare:
+        with open(options.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['cases']
+        slower = compare(results, baseline, options.threshold)
+        for name, before, after in slower:
+            print(f'SLOWER {name}: {before} us -> {after} us ({after / before - 1:+.0%})', file=sys.stderr)
+        if slower:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,14 +11,35 @@ class Config:
     MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/quprdigital')
     
     # Session configuration
-    SESSION_TYPE = 'mongodb'
+    # 'mongodb' for server-side sessions, 'cookie' for signed stateless cookies
+    SESSION_TYPE = os.getenv('SESSION_TYPE', 'mongodb')
     SESSION_PERMANENT = True
     SESSION_USE_SIGNER = True
     SESSION_KEY_PREFIX = 'qupr:'
+    SESSION_MONGODB_COLLECTION = 'sessions'
+    # Unmodified sessions only get their expiry pushed out after this long
+    SESSION_REFRESH_AFTER = timedelta(hours=1)
+    # Optional process-local front cache for session reads (0 disables)
+    SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', 0))
+    SESSION_CACHE_TTL = 5
     PERMANENT_SESSION_LIFETIME = timedelta(days=7)
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
     
+    # Password hashing: bcrypt cost (hashes at another cost are upgraded at
+    # login) and the per-process pool that bounds concurrent hashing
+    BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_PENDING = 16
+    
+    # Failed login throttling, per window of LOGIN_THROTTLE_WINDOW seconds
+    LOGIN_THROTTLE_WINDOW = 900
+    LOGIN_MAX_FAILURES_PER_IP = 20
+    LOGIN_MAX_FAILURES_PER_EMAIL = 5
+    # Proxies in front of the app whose X-Forwarded-For is trusted, so the
+    # per-IP throttle sees client addresses rather than Nginx's
+    TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', 0))
+    
     # Company details
     COMPANY_NAME = os.getenv('COMPANY_NAME', 'Qupr Digital')
     COMPANY_GSTIN = os.getenv('COMPANY_GSTIN', '')
@@ -28,16 +49,93 @@ class Config:
     
     # Database
     DB_NAME = 'quprdigital'
+    # Indexes are normally reconciled at deploy time (`flask db ensure-indexes`)
+    ENSURE_INDEXES_ON_STARTUP = os.getenv('ENSURE_INDEXES_ON_STARTUP', 'false').lower() == 'true'
+    # Explain every query a request makes and fail it on a COLLSCAN (tests only)
+    QUERY_PLAN_CHECK = os.getenv('QUERY_PLAN_CHECK', 'false').lower() == 'true'
+    # Per-request MongoDB command counts and time: a log line per request and,
+    # optionally, a Server-Timing header. Off means no listener is installed.
+    DB_METRICS = os.getenv('DB_METRICS', 'false').lower() == 'true'
+    DB_METRICS_SERVER_TIMING = os.getenv('DB_METRICS_SERVER_TIMING', 'false').lower() == 'true'
+    # With DB_METRICS, log slower commands with their stack, and slower requests (ms)
+    SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 100))
+    SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 1000))
+    
+    # Process-local user cache (seconds; 0 disables)
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 30))
+    USER_CACHE_SIZE = 1024
+    
+    # Process-local product catalog cache (seconds; 0 disables)
+    PRODUCT_CACHE_TTL = int(os.getenv('PRODUCT_CACHE_TTL', 300))
+    PRODUCT_CACHE_SIZE = 5000
+    
+    # Process-local coupon-by-code cache (seconds; 0 disables)
+    COUPON_CACHE_TTL = int(os.getenv('COUPON_CACHE_TTL', 30))
+    COUPON_CACHE_SIZE = 1024
+    
+    # Rendered public pages for anonymous visitors (seconds; 0 disables)
+    PUBLIC_PAGE_CACHE_TTL = int(os.getenv('PUBLIC_PAGE_CACHE_TTL', 3600))
+    PUBLIC_PAGE_CACHE_SIZE = 256
+    
+    # Front-end assets built by `flask assets build` into static/ASSETS_DIST;
+    # fingerprinted files there are served with a far-future immutable TTL
+    ASSETS_DIST = 'dist'
+    ASSETS_MAX_AGE = 31536000
+    # npm packages used by the build (`npm install`) and an optional standalone
+    # Tailwind binary to use instead of node_modules/.bin/tailwindcss
+    ASSETS_NODE_MODULES = os.getenv('ASSETS_NODE_MODULES', os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'node_modules'))
+    TAILWIND_BIN = os.getenv('TAILWIND_BIN')
     
     # Invoice
     INVOICE_PREFIX = 'INV'
     INVOICE_TEMPLATE_VERSION = 'v1'
+    # Restart numbering each financial year as PREFIX/YY-YY/00001
+    INVOICE_NUMBER_PER_FY = os.getenv('INVOICE_NUMBER_PER_FY', 'false').lower() == 'true'
+    # Numbers reserved per worker at a time; >1 avoids a round trip per
+    # invoice but leaves gaps when a worker exits
+    INVOICE_NUMBER_BLOCK_SIZE = int(os.getenv('INVOICE_NUMBER_BLOCK_SIZE', 1))
+    # GST rounding: 'per_rate' rounds the tax on each rate's total once,
+    # 'per_line' rounds the tax on every line (see app/utils/money.py)
+    TAX_ROUNDING = os.getenv('TAX_ROUNDING', 'per_rate')
+    
+    # Rendered PDFs of issued/paid invoices, keyed by content hash
+    PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'instance', 'pdf_cache'))
+    # `flask invoices prune-pdf-cache` deletes PDFs not served for this many days
+    PDF_CACHE_MAX_AGE_DAYS = int(os.getenv('PDF_CACHE_MAX_AGE_DAYS', 30))
+    
+    # Unpaid checkouts are purged after this many hours
+    PAYMENT_REQUEST_TTL_HOURS = 24
+    # Settle payments in a MongoDB transaction (needs a replica set; falls
+    # back to ordered single writes on a standalone server)
+    PAYMENT_SETTLEMENT_TRANSACTIONS = os.getenv('PAYMENT_SETTLEMENT_TRANSACTIONS', 'true').lower() == 'true'
+    
+    # Bulk invoice generation
+    BULK_INVOICE_WORKERS = 4
+    BULK_INVOICE_CHUNK_SIZE = 200
+    BULK_INVOICE_MAX_RECORDS = 5000
+    
+    # Owner dashboard stats are rebuilt from scratch after this many seconds
+    INVOICE_STATS_MAX_AGE = 3600
 
 
 class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
     SESSION_COOKIE_SECURE = False
+    # Show template edits without a restart
+    PUBLIC_PAGE_CACHE_TTL = int(os.getenv('PUBLIC_PAGE_CACHE_TTL', 0))
+    DB_METRICS = os.getenv('DB_METRICS', 'true').lower() == 'true'
+    DB_METRICS_SERVER_TIMING = os.getenv('DB_METRICS_SERVER_TIMING', 'true').lower() == 'true'
+
+
+class TestingConfig(Config):
+    """Testing configuration"""
+    TESTING = True
+    DB_NAME = os.getenv('TEST_DB_NAME', 'quprdigital_test')
+    ENSURE_INDEXES_ON_STARTUP = True
+    QUERY_PLAN_CHECK = True
 
 
 class ProductionConfig(Config):
@@ -45,10 +143,12 @@ class ProductionConfig(Config):
     DEBUG = False
     SESSION_COOKIE_SECURE = True
     SESSION_COOKIE_SAMESITE = 'Strict'
+    TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', 1))
 
 
 config = {
     'development': DevelopmentConfig,
+    'testing': TestingConfig,
     'production': ProductionConfig,
     'default': DevelopmentConfig
 }
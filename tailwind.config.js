@@ -0,0 +1,27 @@
+/** @type {import('tailwindcss').Config} */
+module.exports = {
+    content: [
+        './app/templates/**/*.html',
+        './app/static/js/**/*.js',
+    ],
+    theme: {
+        extend: {
+            colors: {
+                primary: {
+                    50: '#eef2ff',
+                    100: '#e0e7ff',
+                    200: '#c7d2fe',
+                    300: '#a5b4fc',
+                    400: '#818cf8',
+                    500: '#6366f1',
+                    600: '#4f46e5',
+                    700: '#4338ca',
+                    800: '#3730a3',
+                }
+            },
+            boxShadow: {
+                soft: '0 10px 40px rgba(0,0,0,0.06)'
+            }
+        }
+    }
+}